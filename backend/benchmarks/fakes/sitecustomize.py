@@ -0,0 +1,28 @@
+"""
+Fake Google Play Store for load tests.
+
+google_play_scraper has no configurable endpoint, so load_test.py puts this directory
+on PYTHONPATH and Python imports this module at start-up. When SENTIFY_FAKE_PLAYSTORE_URL
+is set, google_play_scraper.reviews fetches canned reviews from the stub server there
+instead of scraping play.google.com. It has no effect otherwise.
+"""
+import json
+import os
+import urllib.parse
+import urllib.request
+
+FAKE_PLAYSTORE_URL = os.getenv('SENTIFY_FAKE_PLAYSTORE_URL')
+
+if FAKE_PLAYSTORE_URL:
+    try:
+        import google_play_scraper
+    except ImportError:
+        google_play_scraper = None
+
+    if google_play_scraper is not None:
+        def reviews(app_id, count=100, **kwargs):
+            query = urllib.parse.urlencode({'app_id': app_id, 'count': count})
+            with urllib.request.urlopen(f"{FAKE_PLAYSTORE_URL}/reviews?{query}", timeout=30) as response:
+                return json.load(response), None
+
+        google_play_scraper.reviews = reviews
@@ -0,0 +1,631 @@
+"""
+End-to-end load test of the Express API with every external service stubbed out.
+
+Starts local stub servers for NewsAPI, Reddit, Nominatim, Gemini and the Play Store,
+then starts the API (backend/index.js) pointed at them. The real analysis models
+still run, so this measures our own ceiling rather than the upstream APIs'. Each
+endpoint is driven at each concurrency level with a closed loop of clients. The
+report records:
+  * latency p50/p95/p99, throughput and error rate;
+  * CPU seconds and peak RSS of the Node server and of the Python processes it
+    spawns, in total, per script and per process.
+
+Reports are JSON, so runs in different execution modes can be compared:
+  * sync vs --api jobs;
+  * with a latency --budget;
+  * with --env overrides such as SENTIFY_TORCH_THREADS.
+
+Usage:
+    python backend/benchmarks/load_test.py --concurrency 1,4,8 --requests 16 --label baseline
+    python backend/benchmarks/load_test.py --api jobs --budget 10 --label jobs-budget10
+    python backend/benchmarks/load_test.py --compare reports/load-baseline-*.json reports/load-jobs-budget10-*.json
+
+Needs node (with the backend's npm dependencies installed) and the Python requirements.
+"""
+import argparse
+import glob
+import json
+import math
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+FAKES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fakes')
+REPORTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'reports')
+
+# Scheduler limits high enough that the stubs, not the client-side quotas, set the pace
+UNLIMITED_RATES = 'newsapi=1000/1000,reddit=1000/1000,nominatim=1000/1000,gemini=1000/1000,playstore=1000/1000'
+
+SAMPLE_SENTENCES = [
+    "The price is fair and the features work well.",
+    "Support was slow to respond and the service felt unreliable.",
+    "Local officials praised the quick response to residents' concerns.",
+    "Public opinion is split on the impact of the new policy.",
+    "Great quality overall, although the update broke a few things.",
+    "I love how reliable it has been, the support team is excellent.",
+    "Prices keep going up while the quality gets worse.",
+    "The app keeps crashing after the latest update, really frustrating.",
+]
+
+
+def sample_text(rng, sentences=3):
+    return " ".join(rng.choice(SAMPLE_SENTENCES) for _ in range(sentences))
+
+
+class StubServer:
+    """
+    A local HTTP server standing in for one external API.
+
+    `respond(method, path, query, body)` returns the JSON payload to send back; every
+    response is delayed by about `latency` seconds to mimic the upstream round trip.
+    """
+
+    def __init__(self, name, respond, latency=0.05):
+        self.name = name
+        self.requests = 0
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def handle_request(self, method):
+                parsed = urllib.parse.urlparse(self.path)
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length) if length else b''
+                with stub.lock:
+                    stub.requests += 1
+                time.sleep(latency * random.uniform(0.5, 1.5))
+                payload = json.dumps(respond(method, parsed.path, urllib.parse.parse_qs(parsed.query), body)).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self):
+                self.handle_request('GET')
+
+            def do_POST(self):
+                self.handle_request('POST')
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def news_response(method, path, query, body):
+    rng = random.Random(query.get('q', [''])[0])
+    now = time.time()
+    return {
+        'status': 'ok',
+        'articles': [{
+            'title': f"Headline {i} about {query.get('q', [''])[0][:40]}",
+            'description': sample_text(rng),
+            'url': f"https://news.example/{i}",
+            'publishedAt': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(now - rng.randint(0, 6) * 86400))
+        } for i in range(20)]
+    }
+
+
+def reddit_response(method, path, query, body):
+    if path.endswith('/access_token'):
+        return {'access_token': 'stub-token', 'token_type': 'bearer', 'expires_in': 3600, 'scope': '*'}
+    rng = random.Random(path + query.get('q', [''])[0])
+    limit = int(query.get('limit', ['10'])[0])
+    return {
+        'kind': 'Listing',
+        'data': {
+            'after': None,
+            'before': None,
+            'children': [{
+                'kind': 't3',
+                'data': {
+                    'id': f"stub{i}",
+                    'name': f"t3_stub{i}",
+                    'title': f"Thread {i}: {rng.choice(SAMPLE_SENTENCES)}",
+                    'selftext': sample_text(rng, 5),
+                    'permalink': f"/r/stub/comments/stub{i}/",
+                    'score': rng.randint(0, 500),
+                    'subreddit': 'stub'
+                }
+            } for i in range(min(limit, 10))]
+        }
+    }
+
+
+def nominatim_response(method, path, query, body):
+    place = query.get('q', ['Somewhere'])[0]
+    return [{
+        'lat': '48.8566',
+        'lon': '2.3522',
+        'display_name': f"{place}, Stub Region, France",
+        'address': {'city': place, 'state': 'Stub Region', 'country': 'France', 'country_code': 'fr'}
+    }]
+
+
+def gemini_response(method, path, query, body):
+    return {
+        'candidates': [{
+            'content': {'role': 'model', 'parts': [{'text': (
+                "Coverage is mixed: people value the price and features, while support "
+                "and reliability draw complaints. Recent updates are a recurring theme."
+            )}]},
+            # STOP, enum-encoded as int like the real REST API
+            'finishReason': 1,
+            'index': 0
+        }]
+    }
+
+
+def playstore_response(method, path, query, body):
+    rng = random.Random(query.get('app_id', [''])[0])
+    count = int(query.get('count', ['50'])[0])
+    return [{'content': sample_text(rng, 2), 'score': rng.randint(1, 5)} for _ in range(count)]
+
+
+def start_stubs(latency):
+    return {
+        'newsapi': StubServer('newsapi', news_response, latency),
+        'reddit': StubServer('reddit', reddit_response, latency),
+        'nominatim': StubServer('nominatim', nominatim_response, latency),
+        'gemini': StubServer('gemini', gemini_response, latency * 10),
+        'playstore': StubServer('playstore', playstore_response, latency * 4),
+    }
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(port, stubs, extra_env, state_dir, keep_rate_limits=False, log=None):
+    """
+    Start the Express app pointed at the stubs; returns the process once it accepts connections.
+
+    The scripts keep their rate-limit buckets and summary cache under `state_dir`
+    rather than the host's, so stub summaries never become the cached fallback of
+    real requests, and the load test does not drain the real quotas.
+    """
+    env = dict(os.environ)
+    env.update({
+        'PORT': str(port),
+        'NEWS_API_URL': f"{stubs['newsapi'].url}/v2/everything",
+        'NEWS_API_KEY': 'stub',
+        'REDDIT_CLIENT_ID': 'stub',
+        'REDDIT_CLIENT_SECRET': 'stub',
+        'REDDIT_USER_AGENT': 'sentify-load-test',
+        'REDDIT_OAUTH_URL': stubs['reddit'].url,
+        'REDDIT_URL': stubs['reddit'].url,
+        'NOMINATIM_DOMAIN': stubs['nominatim'].url.split('://', 1)[1],
+        'NOMINATIM_SCHEME': 'http',
+        'GEMINI_API_KEY': 'stub',
+        'GEMINI_API_ENDPOINT': stubs['gemini'].url,
+        'SENTIFY_FAKE_PLAYSTORE_URL': stubs['playstore'].url,
+        'PYTHONPATH': os.pathsep.join(filter(None, [FAKES_DIR, os.environ.get('PYTHONPATH')])),
+        'SENTIFY_RATE_STATE_DIR': os.path.join(state_dir, 'ratelimit'),
+        'SENTIFY_SUMMARY_CACHE_DIR': os.path.join(state_dir, 'summary_cache'),
+    })
+    if not keep_rate_limits:
+        env['SENTIFY_RATE_LIMITS'] = UNLIMITED_RATES
+    env.update(extra_env)
+
+    process = subprocess.Popen(['node', 'index.js'], cwd=BACKEND_DIR, env=env,
+                               stdout=log or subprocess.DEVNULL, stderr=log or subprocess.DEVNULL)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"API server exited with code {process.returncode} (is `npm install` done?)")
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError("API server did not start listening within 30s")
+
+
+def _read_stat(pid):
+    """
+    (ppid, utime, stime, cutime, cstime) in clock ticks from /proc/<pid>/stat.
+    """
+    with open(f'/proc/{pid}/stat') as f:
+        fields = f.read().rsplit(')', 1)[1].split()
+    return int(fields[1]), int(fields[11]), int(fields[12]), int(fields[13]), int(fields[14])
+
+
+def _read_rss_kb(pid):
+    with open(f'/proc/{pid}/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1])
+    return 0
+
+
+def _classify(pid):
+    """
+    'python:playstore' or 'python:sentiment' for an analysis script's interpreter, else
+    'other' (including the shell that exec runs the sync routes' command through).
+    """
+    try:
+        with open(f'/proc/{pid}/cmdline', 'rb') as f:
+            argv = f.read().decode(errors='replace').split('\0')
+    except OSError:
+        return 'other'
+    if not os.path.basename(argv[0]).startswith('python'):
+        return 'other'
+    scripts = {os.path.basename(arg) for arg in argv[1:]}
+    if 'playstore_sentiment_analysis.py' in scripts:
+        return 'python:playstore'
+    if 'sentiment.py' in scripts:
+        return 'python:sentiment'
+    return 'other'
+
+
+class ProcessSampler:
+    """
+    Samples the API server and its descendant processes from /proc.
+
+    Total CPU comes from the server's own and its reaped children's counters, so it is
+    exact even for short-lived Python processes. CPU per process is the last value
+    sampled for each pid, so up to one interval of a process's last work can be missed;
+    the difference to the exact total is reported as unattributed. RSS is the peak
+    seen across samples.
+    """
+
+    def __init__(self, root_pid, interval=0.2):
+        self.root_pid = root_pid
+        self.interval = interval
+        self.ticks = os.sysconf('SC_CLK_TCK')
+        self.stop_event = threading.Event()
+        self.peak_rss_kb = {}
+        self.cpu_ticks = {}
+        self.cpu_baseline = {}
+        self.kinds = {}
+        self.peak_tree_rss_kb = 0
+        self.peak_python_processes = 0
+        self.thread = None
+
+    def _descendants(self):
+        children = {}
+        for entry in os.listdir('/proc'):
+            if entry.isdigit():
+                try:
+                    children.setdefault(_read_stat(int(entry))[0], []).append(int(entry))
+                except (OSError, IndexError, ValueError):
+                    continue
+        found, stack = [], [self.root_pid]
+        while stack:
+            pid = stack.pop()
+            for child in children.get(pid, []):
+                found.append(child)
+                stack.append(child)
+        return found
+
+    def _sample(self):
+        tree_rss = 0
+        python_processes = 0
+        for pid in [self.root_pid] + self._descendants():
+            try:
+                rss = _read_rss_kb(pid)
+                utime, stime = _read_stat(pid)[1:3]
+            except (OSError, IndexError, ValueError):
+                continue
+            # Own CPU only: reaped grandchildren (e.g. spaCy processes) are sampled themselves
+            self.cpu_ticks[pid] = utime + stime
+            if pid not in self.kinds:
+                self.kinds[pid] = 'node' if pid == self.root_pid else _classify(pid)
+            if self.kinds[pid].startswith('python'):
+                python_processes += 1
+            self.peak_rss_kb[pid] = max(self.peak_rss_kb.get(pid, 0), rss)
+            tree_rss += rss
+        self.peak_tree_rss_kb = max(self.peak_tree_rss_kb, tree_rss)
+        self.peak_python_processes = max(self.peak_python_processes, python_processes)
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            self._sample()
+
+    def start(self):
+        self.started = time.monotonic()
+        self.cpu_start = _read_stat(self.root_pid)[1:]
+        # Processes already running only count the CPU they use from now on
+        for pid in self._descendants():
+            try:
+                self.cpu_baseline[pid] = sum(_read_stat(pid)[1:3])
+            except (OSError, IndexError, ValueError):
+                continue
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+        wall = time.monotonic() - self.started
+        utime, stime, cutime, cstime = (end - start for end, start in zip(_read_stat(self.root_pid)[1:], self.cpu_start))
+        server_cpu = (utime + stime) / self.ticks
+        children_cpu = (cutime + cstime) / self.ticks
+
+        cpu_seconds = {
+            pid: max(0, ticks - self.cpu_baseline.get(pid, 0)) / self.ticks
+            for pid, ticks in self.cpu_ticks.items() if pid != self.root_pid
+        }
+        # Children still running at the end are not in the reaped counters yet
+        running_cpu = sum(seconds for pid, seconds in cpu_seconds.items() if os.path.exists(f'/proc/{pid}'))
+        per_process = [
+            {'pid': pid, 'kind': self.kinds[pid], 'cpu_seconds': round(seconds, 3),
+             'peak_rss_mb': round(self.peak_rss_kb.get(pid, 0) / 1024, 1)}
+            for pid, seconds in sorted(cpu_seconds.items())
+        ]
+
+        python_peaks = {kind: [rss for pid, rss in self.peak_rss_kb.items() if self.kinds[pid] == kind]
+                        for kind in ('python:sentiment', 'python:playstore')}
+        python_cpu = {kind: [seconds for pid, seconds in cpu_seconds.items() if self.kinds[pid] == kind]
+                      for kind in python_peaks}
+        return {
+            'server_cpu_seconds': round(server_cpu, 3),
+            'children_cpu_seconds': round(children_cpu, 3),
+            'unattributed_children_cpu_seconds': round(
+                max(0.0, children_cpu + running_cpu - sum(cpu_seconds.values())), 3),
+            'cpu_utilization': round((server_cpu + children_cpu) / wall, 3) if wall else None,
+            'server_peak_rss_mb': round(self.peak_rss_kb.get(self.root_pid, 0) / 1024, 1),
+            'peak_tree_rss_mb': round(self.peak_tree_rss_kb / 1024, 1),
+            'peak_python_processes': self.peak_python_processes,
+            'python_processes': {
+                kind: {
+                    'seen': len(peaks),
+                    'cpu_seconds': round(sum(python_cpu[kind]), 3),
+                    'mean_cpu_seconds': round(sum(python_cpu[kind]) / len(python_cpu[kind]), 3),
+                    'max_cpu_seconds': round(max(python_cpu[kind]), 3),
+                    'mean_peak_rss_mb': round(sum(peaks) / len(peaks) / 1024, 1),
+                    'max_peak_rss_mb': round(max(peaks) / 1024, 1)
+                }
+                for kind, peaks in python_peaks.items() if peaks
+            },
+            'per_process': per_process
+        }
+
+
+def percentile(sorted_values, fraction):
+    """
+    Nearest-rank percentile of an already sorted list.
+    """
+    if not sorted_values:
+        return None
+    return sorted_values[max(0, math.ceil(fraction * len(sorted_values)) - 1)]
+
+
+def endpoint_path(endpoint, index, args):
+    query = args.queries[index % len(args.queries)]
+    if endpoint == 'normal':
+        path = f"analyze-normal/{urllib.parse.quote(query)}"
+    elif endpoint == 'location':
+        location = args.locations[index % len(args.locations)]
+        path = f"analyze-with-location/{urllib.parse.quote(query)}/{urllib.parse.quote(location)}"
+    else:
+        path = f"analyze-playstore/{urllib.parse.quote(args.apps[index % len(args.apps)])}"
+    if args.api == 'jobs':
+        path = f"jobs/{path}"
+
+    params = {}
+    if args.budget:
+        params['budget'] = args.budget
+    if args.format and endpoint != 'playstore':
+        params['format'] = args.format
+    return f"/api/sentiment/{path}" + (f"?{urllib.parse.urlencode(params)}" if params else '')
+
+
+def call_json(method, url, timeout):
+    request = urllib.request.Request(url, method=method, data=b'' if method == 'POST' else None)
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return response.status, json.load(response)
+
+
+def run_request(base_url, endpoint, index, args):
+    """
+    Issue one analysis request and wait for its result; returns (seconds, error or None).
+    """
+    started = time.monotonic()
+    url = base_url + endpoint_path(endpoint, index, args)
+    try:
+        status, body = call_json('POST', url, args.timeout)
+        if args.api == 'jobs':
+            job_url = f"{base_url}/api/sentiment/jobs/{body['jobId']}"
+            while body.get('status') in ('running', 'cancelling'):
+                if time.monotonic() - started > args.timeout:
+                    raise TimeoutError("job did not finish in time")
+                time.sleep(args.poll_interval)
+                status, body = call_json('GET', job_url, args.timeout)
+            if body.get('status') != 'completed':
+                return time.monotonic() - started, f"job {body.get('status')}: {body.get('error')}"
+            body = body['result']
+        if isinstance(body, dict) and body.get('error'):
+            return time.monotonic() - started, f"analysis error: {str(body['error'])[:200]}"
+        return time.monotonic() - started, None
+    except urllib.error.HTTPError as e:
+        return time.monotonic() - started, f"HTTP {e.code}"
+    except Exception as e:
+        return time.monotonic() - started, f"{type(e).__name__}: {e}"
+
+
+def run_scenario(base_url, server_pid, endpoint, concurrency, args):
+    """
+    Send args.requests requests to one endpoint from `concurrency` closed-loop clients.
+    """
+    sampler = ProcessSampler(server_pid)
+    sampler.start()
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        outcomes = list(executor.map(lambda i: run_request(base_url, endpoint, i, args), range(args.requests)))
+    wall = time.monotonic() - started
+    processes = sampler.stop()
+
+    latencies = sorted(seconds for seconds, error in outcomes if error is None)
+    errors = [error for _, error in outcomes if error is not None]
+    return {
+        'endpoint': endpoint,
+        'concurrency': concurrency,
+        'requests': len(outcomes),
+        'succeeded': len(latencies),
+        'failed': len(errors),
+        'error_rate': round(len(errors) / len(outcomes), 4) if outcomes else 0.0,
+        'wall_seconds': round(wall, 3),
+        'throughput_rps': round(len(latencies) / wall, 4) if wall else 0.0,
+        'latency_seconds': {
+            'p50': percentile(latencies, 0.50),
+            'p95': percentile(latencies, 0.95),
+            'p99': percentile(latencies, 0.99),
+            'mean': round(sum(latencies) / len(latencies), 3) if latencies else None,
+            'max': latencies[-1] if latencies else None
+        },
+        'sample_errors': sorted(set(errors))[:5],
+        'processes': processes
+    }
+
+
+def format_row(label, scenario):
+    latency = scenario['latency_seconds']
+    fmt = lambda value: '-' if value is None else f"{value:.2f}"
+    return (f"{label:<20} {scenario['endpoint']:<9} {scenario['concurrency']:>4} "
+            f"{fmt(latency['p50']):>7} {fmt(latency['p95']):>7} {fmt(latency['p99']):>7} "
+            f"{scenario['throughput_rps']:>8.3f} {scenario['error_rate']:>6.1%} "
+            f"{scenario['processes']['cpu_utilization'] or 0:>6.2f} {scenario['processes']['peak_tree_rss_mb']:>9.1f}")
+
+
+def print_table(rows, stream=sys.stderr):
+    print(f"{'run':<20} {'endpoint':<9} {'conc':>4} {'p50 s':>7} {'p95 s':>7} {'p99 s':>7} "
+          f"{'req/s':>8} {'errors':>6} {'cpus':>6} {'peak MB':>9}", file=stream)
+    for label, scenario in rows:
+        print(format_row(label, scenario), file=stream)
+
+
+def compare(paths):
+    rows = []
+    for pattern in paths:
+        for path in sorted(glob.glob(pattern)) or [pattern]:
+            with open(path) as f:
+                report = json.load(f)
+            rows.extend((report['label'], scenario) for scenario in report['scenarios'])
+    print_table(rows, sys.stdout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--endpoints', default='normal,location,playstore',
+                        help="Comma-separated endpoints to drive: normal, location, playstore")
+    parser.add_argument('--concurrency', default='1,4', help="Comma-separated concurrency levels")
+    parser.add_argument('--requests', type=int, default=8, help="Requests per endpoint and concurrency level")
+    parser.add_argument('--warmup', type=int, default=1, help="Unmeasured requests per endpoint before the runs")
+    parser.add_argument('--api', choices=['sync', 'jobs'], default='sync',
+                        help="Call the synchronous endpoints or submit and poll async jobs")
+    parser.add_argument('--budget', type=float, help="Latency budget in seconds passed as ?budget=")
+    parser.add_argument('--format', choices=['records', 'columns'], help="Result format passed as ?format=")
+    parser.add_argument('--queries', default='electric cars,coffee prices,city transit',
+                        help="Comma-separated queries, used round-robin")
+    parser.add_argument('--locations', default='Paris,Lyon', help="Comma-separated locations, used round-robin")
+    parser.add_argument('--apps', default='com.example.one,com.example.two', help="Comma-separated Play Store app ids")
+    parser.add_argument('--stub-latency', type=float, default=0.05,
+                        help="Base stub response time in seconds (Gemini x10, Play Store x4)")
+    parser.add_argument('--env', action='append', default=[], metavar='KEY=VALUE',
+                        help="Extra environment for the API server and its scripts (repeatable)")
+    parser.add_argument('--keep-rate-limits', action='store_true',
+                        help="Keep the scripts' default API rate limits instead of lifting them for the stubs")
+    parser.add_argument('--timeout', type=float, default=600, help="Per-request timeout in seconds")
+    parser.add_argument('--poll-interval', type=float, default=0.5, help="Job polling interval with --api jobs")
+    parser.add_argument('--label', default='default', help="Name of this run in the report")
+    parser.add_argument('--report', help="Report path (default: benchmarks/reports/load-<label>-<time>.json)")
+    parser.add_argument('--server-log', help="Write the API server's output to this file")
+    parser.add_argument('--compare', nargs='+', metavar='REPORT', help="Print a comparison of saved reports and exit")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(args.compare)
+        return
+
+    args.queries = [q.strip() for q in args.queries.split(',') if q.strip()]
+    args.locations = [l.strip() for l in args.locations.split(',') if l.strip()]
+    args.apps = [a.strip() for a in args.apps.split(',') if a.strip()]
+    endpoints = [e.strip() for e in args.endpoints.split(',') if e.strip()]
+    levels = [int(c) for c in args.concurrency.split(',')]
+    extra_env = dict(item.split('=', 1) for item in args.env)
+
+    stubs = start_stubs(args.stub_latency)
+    port = free_port()
+    log = open(args.server_log, 'w') if args.server_log else None
+    state_dir = tempfile.mkdtemp(prefix='sentify-load-')
+    try:
+        server = start_server(port, stubs, extra_env, state_dir, args.keep_rate_limits, log)
+    except Exception:
+        shutil.rmtree(state_dir, ignore_errors=True)
+        raise
+    base_url = f"http://127.0.0.1:{port}"
+
+    scenarios = []
+    try:
+        for endpoint in endpoints:
+            for i in range(args.warmup):
+                _, error = run_request(base_url, endpoint, i, args)
+                if error:
+                    print(f"warm-up {endpoint}: {error}", file=sys.stderr)
+            for concurrency in levels:
+                scenario = run_scenario(base_url, server.pid, endpoint, concurrency, args)
+                scenarios.append(scenario)
+                print_table([(args.label, scenario)])
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+        for stub in stubs.values():
+            stub.close()
+        if log:
+            log.close()
+        shutil.rmtree(state_dir, ignore_errors=True)
+
+    report = {
+        'label': args.label,
+        'started_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'host': {'cpus': os.cpu_count(), 'platform': sys.platform},
+        'config': {
+            'api': args.api,
+            'budget': args.budget,
+            'format': args.format,
+            'requests': args.requests,
+            'concurrency': levels,
+            'stub_latency': args.stub_latency,
+            'rate_limits_lifted': not args.keep_rate_limits,
+            'env': extra_env
+        },
+        'stub_requests': {name: stub.requests for name, stub in stubs.items()},
+        'scenarios': scenarios
+    }
+    path = args.report or os.path.join(REPORTS_DIR, f"load-{args.label}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=4)
+    print(f"\nReport written to {path}", file=sys.stderr)
+    print_table([(args.label, scenario) for scenario in scenarios])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Throughput and memory of the pre-fork worker pool versus worker count.
+
+The parent loads the models once, then runs the same jobs with 1, 2, 4, ...
+forked workers and reports jobs/s together with RSS, PSS and USS per worker.
+RSS counts the copy-on-write pages shared with the parent in full; PSS and USS
+show what each extra worker actually costs.
+
+Usage:
+    # Real models and APIs (needs the .env credentials):
+    python backend/benchmarks/prefork_bench.py --script sentiment --jobs jobs.jsonl --workers 1,2,4
+    python backend/benchmarks/prefork_bench.py --script playstore --jobs apps.jsonl
+
+    # Synthetic stand-in (a large read-only "weights" buffer plus CPU work), no dependencies:
+    python backend/benchmarks/prefork_bench.py --synthetic --model-mb 512 --num-jobs 64
+"""
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+
+import batch  # noqa: E402
+import prefork  # noqa: E402
+
+
+def synthetic_handler(model_mb):
+    """
+    Load a read-only buffer standing in for model weights and return a job handler using it.
+    """
+    weights = os.urandom(model_mb * 1024 * 1024)
+    chunk = min(len(weights), 32 * 1024 * 1024)
+
+    def handler(job):
+        offset = (int(job['id']) * 4096) % max(1, len(weights) - chunk)
+        digest = hashlib.sha256(weights[offset:offset + chunk]).hexdigest()
+        return {'digest': digest[:12]}
+
+    return handler
+
+
+def script_handler(script):
+    """
+    Build the real analyzer of one of the analysis scripts and return a job handler using it.
+    """
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        if script == 'sentiment':
+            import sentiment
+            analyzer = sentiment.LocationBasedAnalyzer(*sentiment.load_credentials())
+            return lambda job: sentiment.run_job(analyzer, job)
+
+        import playstore_sentiment_analysis as playstore
+        playstore.load_dotenv(playstore.find_dotenv())
+        analyzer = playstore.GooglePlaySentimentAnalyzer(os.getenv('GEMINI_API_KEY'))
+        return lambda job: playstore.run_job(analyzer, job)
+
+
+def mean_kb(stats, key):
+    values = [w[key] for w in stats if key in w]
+    return round(sum(values) / len(values) / 1024, 1) if values else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--script', choices=['sentiment', 'playstore'], help="Benchmark a real analysis script")
+    parser.add_argument('--jobs', help="JSONL jobs file for --script")
+    parser.add_argument('--synthetic', action='store_true', help="Use the synthetic model instead of a script")
+    parser.add_argument('--model-mb', type=int, default=256, help="Synthetic model size in MB")
+    parser.add_argument('--num-jobs', type=int, default=32, help="Number of synthetic jobs")
+    parser.add_argument('--workers', default='1,2,4', help="Comma-separated worker counts to compare")
+    parser.add_argument('--max-jobs-per-worker', type=int, default=100)
+    parser.add_argument('--report', help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    if args.script:
+        if not args.jobs:
+            parser.error("--script needs --jobs")
+        jobs = batch.read_jobs(args.jobs)
+        handler = script_handler(args.script)
+    else:
+        jobs = [{'id': i} for i in range(args.num_jobs)]
+        handler = synthetic_handler(args.model_mb)
+
+    parent_memory = prefork.memory_usage()
+    rows = []
+    for workers in [int(n) for n in args.workers.split(',')]:
+        with open(os.devnull, 'w') as devnull:
+            summary = prefork.run_prefork(jobs, handler, devnull, workers=workers,
+                                          max_jobs_per_worker=args.max_jobs_per_worker)
+        stats = summary['worker_memory']
+        rows.append({
+            'workers': workers,
+            'torch_threads_per_worker': summary['torch_threads_per_worker'],
+            'jobs_per_second': summary['jobs_per_second'],
+            'failed': summary['failed'],
+            'rss_mb_per_worker': mean_kb(stats, 'rss_kb'),
+            'pss_mb_per_worker': mean_kb(stats, 'pss_kb'),
+            'uss_mb_per_worker': mean_kb(stats, 'uss_kb'),
+        })
+
+    print(f"Parent after loading models: RSS {parent_memory.get('rss_kb', 0) / 1024:.1f} MB")
+    print(f"{'workers':>8} {'jobs/s':>8} {'RSS MB':>8} {'PSS MB':>8} {'USS MB':>8} {'failed':>7}")
+    for row in rows:
+        print(f"{row['workers']:>8} {row['jobs_per_second']:>8.2f} {row['rss_mb_per_worker'] or 0:>8.1f} "
+              f"{row['pss_mb_per_worker'] or 0:>8.1f} {row['uss_mb_per_worker'] or 0:>8.1f} {row['failed']:>7}")
+
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump({'parent_memory': parent_memory, 'runs': rows}, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""
+Throughput of queue workers versus worker count.
+
+Fills a fresh SQLite job queue, starts N independent worker processes on it, and
+reports jobs/s, speedup over one worker, and scaling efficiency (speedup / N). It
+also checks the queue's guarantees:
+  * every job is enqueued twice and the duplicates must be ignored;
+  * every job must finish exactly once;
+  * with --crash-rate, workers die mid-job and their jobs must come back after the
+    visibility timeout.
+
+Usage:
+    # Synthetic jobs (API wait plus some CPU work), no dependencies:
+    python backend/benchmarks/queue_bench.py --num-jobs 200 --job-seconds 0.2 --workers 1,2,4,8
+    python backend/benchmarks/queue_bench.py --crash-rate 0.05 --visibility-timeout 2
+
+    # Real script workers (needs the .env credentials and models):
+    python backend/benchmarks/queue_bench.py --script sentiment --jobs jobs.jsonl --workers 1,2,4
+"""
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts')
+sys.path.insert(0, SCRIPTS_DIR)
+
+import batch  # noqa: E402
+import job_queue  # noqa: E402
+
+
+def synthetic_handler(job_seconds, cpu_fraction, crash_rate):
+    """
+    A job handler that waits like an API call, hashes for its CPU share, and
+    kills its whole process with probability `crash_rate`.
+    """
+    def handler(job):
+        if random.random() < crash_rate:
+            time.sleep(job_seconds / 2)
+            os._exit(1)
+        time.sleep(job_seconds * (1 - cpu_fraction))
+        deadline = time.perf_counter() + job_seconds * cpu_fraction
+        digest = str(job['n']).encode()
+        while time.perf_counter() < deadline:
+            digest = hashlib.sha256(digest).digest()
+        return {'n': job['n'], 'pid': os.getpid()}
+
+    return handler
+
+
+def synthetic_worker(queue_url, args):
+    """
+    Worker process body: run queue jobs until terminated; the parent replaces it if it crashes.
+    """
+    backend = job_queue.open_queue(queue_url)
+    job_queue.run_worker(
+        backend, 'bench', synthetic_handler(args.job_seconds, args.cpu_fraction, args.crash_rate),
+        concurrency=args.concurrency,
+        visibility_timeout=args.visibility_timeout,
+        poll_interval=0.05,
+        retry_delay=0.1
+    )
+
+
+def start_synthetic_workers(queue_url, args, count):
+    context = multiprocessing.get_context('spawn')
+    processes = []
+    for _ in range(count):
+        process = context.Process(target=synthetic_worker, args=(queue_url, args), daemon=True)
+        process.start()
+        processes.append(process)
+    return processes
+
+
+def start_script_workers(queue_url, args, count):
+    script = 'sentiment.py' if args.script == 'sentiment' else 'playstore_sentiment_analysis.py'
+    command = [sys.executable, os.path.join(SCRIPTS_DIR, script), '--worker', '--queue-url', queue_url,
+               '--queue', 'bench', '--concurrency', str(args.concurrency),
+               '--visibility-timeout', str(args.visibility_timeout), '--poll-interval', '0.2']
+    env = dict(os.environ, SENTIFY_WORKERS=str(count))
+    return [subprocess.Popen(command, env=env, stderr=subprocess.DEVNULL) for _ in range(count)]
+
+
+def is_alive(process):
+    return process.is_alive() if hasattr(process, 'is_alive') else process.poll() is None
+
+
+def stop(process):
+    if hasattr(process, 'terminate'):
+        process.terminate()
+    if hasattr(process, 'join'):
+        process.join(10)
+    else:
+        process.wait(10)
+
+
+def run(args, jobs, workers):
+    """
+    Enqueue the jobs into a fresh queue and time `workers` processes draining it.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        queue_url = f"sqlite:///{os.path.join(directory, 'queue.db')}"
+        backend = job_queue.open_queue(queue_url)
+        created = 0
+        # Twice each: the second enqueue of a key must be a no-op
+        for job in jobs + jobs:
+            created += backend.enqueue(job, 'bench', max_attempts=args.max_attempts)[1]
+
+        started = time.perf_counter()
+        start = start_script_workers if args.script else start_synthetic_workers
+        processes = start(queue_url, args, workers)
+        crashes = 0
+        while True:
+            counts = backend.counts('bench')
+            if counts[job_queue.QUEUED] == 0 and counts[job_queue.RUNNING] == 0:
+                break
+            # Replace crashed workers, as a process supervisor would
+            for index, process in enumerate(processes):
+                if not is_alive(process):
+                    crashes += 1
+                    processes[index] = start(queue_url, args, 1)[0]
+            time.sleep(0.05)
+        wall_seconds = time.perf_counter() - started
+        for process in processes:
+            stop(process)
+
+        finished = list(backend.finished('bench'))
+        backend.close()
+
+    attempts = sum(job['attempts'] for job in finished)
+    return {
+        'workers': workers,
+        'jobs': len(jobs),
+        'created': created,
+        'done': sum(job['status'] == job_queue.DONE for job in finished),
+        'failed': sum(job['status'] == job_queue.FAILED for job in finished),
+        'attempts': attempts,
+        'worker_crashes': crashes,
+        'distinct_workers': len({job['worker'] for job in finished}),
+        'wall_seconds': round(wall_seconds, 3),
+        'jobs_per_second': round(len(jobs) / wall_seconds, 3)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--script', choices=['sentiment', 'playstore'], help="Benchmark real script workers")
+    parser.add_argument('--jobs', help="JSONL jobs file for --script")
+    parser.add_argument('--num-jobs', type=int, default=200, help="Number of synthetic jobs")
+    parser.add_argument('--job-seconds', type=float, default=0.2, help="Duration of a synthetic job")
+    parser.add_argument('--cpu-fraction', type=float, default=0.25,
+                        help="Share of a synthetic job spent on CPU rather than waiting")
+    parser.add_argument('--crash-rate', type=float, default=0.0,
+                        help="Probability that a synthetic job kills its worker process")
+    parser.add_argument('--workers', default='1,2,4', help="Comma-separated worker process counts to compare")
+    parser.add_argument('--concurrency', type=int, default=1, help="Jobs in flight per worker process")
+    parser.add_argument('--visibility-timeout', type=float, default=5.0)
+    parser.add_argument('--max-attempts', type=int, default=5)
+    parser.add_argument('--report', help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    if args.script:
+        if not args.jobs:
+            parser.error("--script needs --jobs")
+        jobs = batch.read_jobs(args.jobs)
+    else:
+        jobs = [{'id': n, 'n': n} for n in range(args.num_jobs)]
+
+    results = []
+    for workers in [int(w) for w in args.workers.split(',')]:
+        result = run(args, jobs, workers)
+        baseline = results[0] if results else result
+        result['speedup'] = round(result['jobs_per_second'] / baseline['jobs_per_second'], 2)
+        result['efficiency'] = round(result['speedup'] * baseline['workers'] / workers, 2)
+        results.append(result)
+        exactly_once = result['created'] == len(jobs) and result['done'] + result['failed'] == len(jobs)
+        print(f"{workers:>3} workers: {result['jobs_per_second']:8.2f} jobs/s  "
+              f"speedup {result['speedup']:5.2f}  efficiency {result['efficiency']:4.0%}  "
+              f"done {result['done']}/{len(jobs)}  attempts {result['attempts']}  "
+              f"crashes {result['worker_crashes']}  {'ok' if exactly_once else 'MISMATCH'}", file=sys.stderr)
+
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump({'config': {k: v for k, v in vars(args).items() if k != 'report'}, 'runs': results}, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
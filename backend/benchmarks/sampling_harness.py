@@ -0,0 +1,166 @@
+"""
+Harness for the stratified sampling estimators used by the fast analysis modes.
+
+Draws repeated samples from synthetic populations whose true aggregates are known
+and checks that:
+
+  * coverage:       the confidence intervals of the mean score and of the label
+                    shares contain the true value at about the nominal rate;
+  * missing_strata: when every sampled item of a stratum is dropped (as the
+                    deadline may do), the estimate is not biased toward 0 and the
+                    widened interval still covers the true value; with no stratum
+                    left, the estimate is reported as unavailable;
+  * sample_size:    many small strata (source x day) do not inflate the sample
+                    beyond the size the target precision needs, and a skewed pilot
+                    label distribution needs fewer items than the worst case.
+
+Usage:
+    python backend/benchmarks/sampling_harness.py [--trials 300] [--seed 1]
+
+Exits with status 1 if any check fails.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+
+import sampling  # noqa: E402
+
+# Allowed shortfall of the observed coverage below the nominal confidence
+COVERAGE_SLACK = 0.05
+
+
+def population(rng, sizes, means, spread=15.0):
+    """
+    Synthetic items: stratum key, 0-100 score and label, with a different mean score per stratum.
+    """
+    keys, scores = [], []
+    for key, (size, mean) in enumerate(zip(sizes, means)):
+        for _ in range(size):
+            keys.append(key)
+            scores.append(min(100.0, max(0.0, rng.gauss(mean, spread))))
+    labels = ['Positive' if score > 60 else 'Negative' if score < 40 else 'Neutral' for score in scores]
+    return keys, scores, labels
+
+
+def true_values(scores, labels):
+    shares = {label: labels.count(label) / len(labels) for label in set(labels)}
+    return sum(scores) / len(scores), shares
+
+
+def estimate(strata, sample, scores, labels):
+    sampled = [i for indices in sample.values() for i in indices]
+    return sampling.estimate_aggregates(strata, sample, {i: scores[i] for i in sampled},
+                                        {i: labels[i] for i in sampled})
+
+
+def covered(interval, value):
+    return interval['ci_low'] - 1e-9 <= value <= interval['ci_high'] + 1e-9
+
+
+def check_coverage(trials, seed):
+    rng = random.Random(seed)
+    hits = share_hits = share_total = 0
+    for trial in range(trials):
+        keys, scores, labels = population(rng, [120, 60, 20], [70, 45, 20])
+        mean, shares = true_values(scores, labels)
+        strata, sample = sampling.plan_sample(keys, scores, precision=0.1, seed=trial)
+        estimates = estimate(strata, sample, scores, labels)
+        hits += covered(estimates['score'], mean)
+        for label, interval in estimates['label_distribution'].items():
+            share_total += 1
+            share_hits += covered(interval, shares[label])
+
+    result = {'trials': trials, 'score_coverage': round(hits / trials, 3),
+              'share_coverage': round(share_hits / share_total, 3)}
+    failures = [f"coverage: {name} {result[name]} < {0.95 - COVERAGE_SLACK}"
+                for name in ('score_coverage', 'share_coverage') if result[name] < 0.95 - COVERAGE_SLACK]
+    return result, failures
+
+
+def check_missing_strata(trials, seed):
+    rng = random.Random(seed)
+    failures = []
+
+    # Two equal strata, the second one dropped entirely: 60 with [30, 80], not 30
+    example = sampling.stratified_mean({'a': [0, 1, 2, 3], 'b': [4, 5, 6, 7]}, {'a': [0, 1], 'b': []}, {0: 60, 1: 60})
+    if abs(example['estimate'] - 60) > 1e-9 or example['ci_low'] > 30 or example['ci_high'] < 80:
+        failures.append(f"missing_strata: two-strata example gave {example}")
+
+    unavailable = sampling.stratified_mean({'a': [0, 1]}, {'a': []}, {})
+    if unavailable['estimate'] is not None:
+        failures.append(f"missing_strata: no sampled stratum gave {unavailable}")
+
+    errors, hits = [], 0
+    for trial in range(trials):
+        keys, scores, labels = population(rng, [120, 60, 20], [70, 45, 20])
+        mean, _ = true_values(scores, labels)
+        strata, sample = sampling.plan_sample(keys, scores, precision=0.1, seed=trial)
+        dropped = {**sample, rng.choice(list(sample)): []}
+        estimates = estimate(strata, dropped, scores, labels)
+        errors.append(estimates['score']['estimate'] - mean)
+        hits += covered(estimates['score'], mean)
+
+    # Renormalizing leaves some bias toward the kept strata, far less than counting a dropped stratum as 0
+    bias = sum(errors) / trials
+    result = {'trials': trials, 'example': example, 'mean_error': round(bias, 2),
+              'score_coverage': round(hits / trials, 3)}
+    if abs(bias) > 10:
+        failures.append(f"missing_strata: mean error {bias:.1f} points")
+    if hits / trials < 0.95 - COVERAGE_SLACK:
+        failures.append(f"missing_strata: coverage {hits / trials:.3f} < {0.95 - COVERAGE_SLACK}")
+    return result, failures
+
+
+def check_sample_size(trials, seed):
+    rng = random.Random(seed)
+    failures = []
+
+    # 60 items over 3 sources x 10 days, two items per stratum
+    keys = [(source, day) for source in 'abc' for day in range(10) for _ in range(2)]
+    scores = [min(100.0, max(0.0, rng.gauss(60, 20))) for _ in keys]
+    labels = ['Positive' if score > 65 else 'Negative' if score < 35 else 'Neutral' for score in scores]
+    strata = sampling.group_strata(keys)
+    sizes = {}
+    for precision in (0.05, 0.1, 0.15):
+        required = sampling.required_sample_size(strata, scores, precision, pilot_labels=labels)
+        allocated = sum(sampling.allocate(strata, required).values())
+        sizes[str(precision)] = {'required': required, 'allocated': allocated}
+        if allocated > max(required, len(strata)):
+            failures.append(f"sample_size: {allocated} items allocated for {required} needed at +/-{precision}")
+
+    # A 90/10 pilot split needs fewer items than the p = 0.5 worst case
+    population = {0: list(range(1000))}
+    worst = sampling.required_sample_size(population, [50.0] * 1000, 0.05)
+    skewed = sampling.required_sample_size(population, [50.0] * 1000, 0.05,
+                                           pilot_labels=['Positive'] * 900 + ['Negative'] * 100)
+    if skewed >= worst:
+        failures.append(f"sample_size: skewed pilot needs {skewed} items, worst case {worst}")
+    return {'source_x_day': sizes, 'worst_case': worst, 'skewed_pilot': skewed}, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--trials', type=int, default=300, help="Samples drawn per check")
+    parser.add_argument('--seed', type=int, default=1, help="Seed of the synthetic populations")
+    args = parser.parse_args()
+
+    report, failures = {}, []
+    for name, check in (('coverage', check_coverage),
+                        ('missing_strata', check_missing_strata),
+                        ('sample_size', check_sample_size)):
+        report[name], check_failures = check(args.trials, args.seed)
+        failures.extend(check_failures)
+
+    print(json.dumps(report, indent=4))
+    if failures:
+        print("FAILED:\n  " + "\n  ".join(failures), file=sys.stderr)
+        sys.exit(1)
+    print("All sampling checks passed.", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,356 @@
+"""
+Harness for the rate-limit-aware API scheduler, driven against local fake servers.
+
+Each fake server enforces its own token-bucket quota and answers 429 (with
+Retry-After) when a client exceeds it. The harness checks that:
+
+  * quota:    callers hammering every API through the scheduler never trip a 429,
+              no sliding window exceeds burst + rate * window, and achieved
+              throughput stays close to the quota ceiling;
+  * retry:    when the server is stricter than the client configuration, throttled
+              calls are retried with backoff and all eventually succeed;
+  * priority: high-priority callers queued behind a backlog are served first;
+  * processes: separate processes, each with its own scheduler, like the per-request
+              script runs of the API server, stay within one quota together when
+              they share bucket state (the unshared case is reported for contrast);
+  * hosts:    workers on several hosts (separate bucket state dirs) started with
+              --quota-share send no more than one quota together; running each
+              host at the full quota is reported for contrast.
+
+Usage:
+    python backend/benchmarks/scheduler_harness.py [--duration 4] [--scale 5]
+
+Exits with status 1 if any check fails.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+
+import rate_limiter  # noqa: E402
+
+# Requests may reach the server slightly later than the client took its token
+ARRIVAL_JITTER = 0.02
+
+
+class FakeApiServer:
+    """
+    A local HTTP server that enforces a token-bucket quota like a real API would.
+    """
+
+    def __init__(self, name, rate, burst):
+        self.name = name
+        self.bucket = rate_limiter.TokenBucket(rate, burst)
+        self.lock = threading.Lock()
+        self.accepted = []
+        self.received = []
+        self.rejected = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with server.lock:
+                    server.received.append(time.monotonic())
+                    # Tolerate requests that were sent on time but arrived a little late
+                    allowed = server.bucket.wait_time() <= ARRIVAL_JITTER
+                    if allowed:
+                        server.bucket.take()
+                        server.accepted.append(time.monotonic())
+                    else:
+                        server.rejected += 1
+                if allowed:
+                    body = json.dumps({'api': server.name, 'ok': True}).encode()
+                    self.send_response(200)
+                else:
+                    body = b'{"error": "rate limited"}'
+                    self.send_response(429)
+                    self.send_header('Retry-After', '0.5')
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}/"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def max_in_window(self, window):
+        """
+        Largest number of accepted requests inside any sliding window of `window` seconds.
+        """
+        times = sorted(self.accepted)
+        best, start = 0, 0
+        for end in range(len(times)):
+            while times[end] - times[start] > window:
+                start += 1
+            best = max(best, end - start + 1)
+        return best
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def fetch(url):
+    with urllib.request.urlopen(url, timeout=10) as response:
+        return json.loads(response.read())
+
+
+def hammer(scheduler, api, url, threads, duration, priority=None):
+    """
+    Issue as many calls as possible from `threads` threads for `duration` seconds.
+    """
+    deadline = time.monotonic() + duration
+    results = {'ok': 0, 'failed': 0}
+    lock = threading.Lock()
+
+    def worker():
+        while time.monotonic() < deadline:
+            try:
+                scheduler.call(api, fetch, url, priority=priority)
+                outcome = 'ok'
+            except Exception:
+                outcome = 'failed'
+            with lock:
+                results[outcome] += 1
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    return results
+
+
+def check_quota(duration, scale):
+    """
+    Every API at (scaled) default limits: no 429s, windows within quota, near-max throughput.
+    """
+    limits = {name: (rate * scale, burst) for name, (rate, burst) in rate_limiter.DEFAULT_LIMITS.items()}
+    scheduler = rate_limiter.ApiScheduler(limits, max_retries=0)
+    servers = {name: FakeApiServer(name, rate, burst) for name, (rate, burst) in limits.items()}
+
+    runs = {}
+    started = time.monotonic()
+    threads = [
+        threading.Thread(target=lambda n=name: runs.__setitem__(n, hammer(scheduler, n, servers[n].url, 8, duration)))
+        for name in servers
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    # Callers still queued at the deadline finish late; judge throughput on the window itself
+    window_end = started + duration
+
+    failures = []
+    report = {}
+    for name, server in servers.items():
+        rate, burst = limits[name]
+        window = max(1.0, burst / rate)
+        allowed_in_window = burst + rate * window
+        observed = server.max_in_window(window)
+        ceiling = int(burst + rate * duration)
+        in_window = sum(1 for t in server.accepted if t <= window_end)
+        efficiency = in_window / ceiling
+        report[name] = {
+            'rate': round(rate, 3), 'burst': burst, 'calls': runs[name], 'accepted': len(server.accepted),
+            'rejected_429': server.rejected, 'max_in_window': observed,
+            'allowed_in_window': round(allowed_in_window, 2), 'efficiency': round(efficiency, 3)
+        }
+        if server.rejected:
+            failures.append(f"{name}: server returned {server.rejected} x 429")
+        if observed > allowed_in_window + 1e-9:
+            failures.append(f"{name}: {observed} requests in a {window:.2f}s window (quota {allowed_in_window:.2f})")
+        # Allow 10% (and at least one request, for slow APIs) below the theoretical ceiling
+        if ceiling - in_window > max(1, 0.1 * ceiling):
+            failures.append(f"{name}: throughput only {efficiency:.0%} of the quota ceiling")
+        server.close()
+    return report, failures
+
+
+def check_retry(scale):
+    """
+    Server stricter than the client: throttled calls back off and eventually succeed.
+    """
+    server = FakeApiServer('strict', 1.0 * scale, 1)
+    scheduler = rate_limiter.ApiScheduler({'strict': (3.0 * scale, 3)}, max_retries=10, backoff_base=0.05)
+    results = hammer(scheduler, 'strict', server.url, 4, 1.5)
+    stats = scheduler.stats['strict']
+    server.close()
+
+    failures = []
+    if results['failed']:
+        failures.append(f"retry: {results['failed']} calls failed despite retries")
+    if not stats['retries']:
+        failures.append("retry: expected throttling to trigger retries")
+    return {'calls': results, 'scheduler': stats, 'server_429': server.rejected}, failures
+
+
+def check_priority(scale):
+    """
+    A high-priority caller arriving behind a queued backlog is served before it.
+    """
+    rate = 5.0 * scale
+    server = FakeApiServer('prio', rate, 1)
+    scheduler = rate_limiter.ApiScheduler({'prio': (rate, 1)}, max_retries=0)
+    finished = []
+    lock = threading.Lock()
+
+    def call(tag, priority):
+        scheduler.call('prio', fetch, server.url, priority=priority)
+        with lock:
+            finished.append(tag)
+
+    backlog = [threading.Thread(target=call, args=(f"low{i}", rate_limiter.PRIORITY_LOW)) for i in range(8)]
+    for t in backlog:
+        t.start()
+    time.sleep(1.5 / rate)
+    urgent = threading.Thread(target=call, args=('high', rate_limiter.PRIORITY_HIGH))
+    urgent.start()
+    for t in backlog + [urgent]:
+        t.join()
+    server.close()
+
+    position = finished.index('high')
+    failures = [] if position <= 3 else [f"priority: high-priority call finished at position {position}"]
+    return {'order': finished, 'high_position': position}, failures
+
+
+def hammer_process(url, limits, state_dir, duration, results, share=None):
+    """
+    Process body for check_processes and check_hosts: a fresh scheduler hammering one
+    API, with its quota split across hosts when `share` is (hosts, host_index).
+    """
+    scheduler = rate_limiter.ApiScheduler(limits, max_retries=0, state_dir=state_dir)
+    if share:
+        scheduler.share_quota(*share, across_hosts=True)
+    results.put(hammer(scheduler, 'shared', url, 4, duration))
+
+
+def run_processes(url, limits, state_dir, processes, duration, share=None):
+    context = multiprocessing.get_context('fork')
+    results = context.Queue()
+    workers = [context.Process(target=hammer_process, args=(url, limits, state_dir, duration, results, share))
+               for _ in range(processes)]
+    for p in workers:
+        p.start()
+    outcomes = [results.get() for _ in workers]
+    for p in workers:
+        p.join()
+    return {key: sum(o[key] for o in outcomes) for key in ('ok', 'failed')}
+
+
+def check_processes(duration, scale, processes=4):
+    """
+    Several processes with their own schedulers: within quota together only with shared state.
+    """
+    rate, burst = rate_limiter.DEFAULT_LIMITS['nominatim']
+    rate *= scale
+    limits = {'shared': (rate, burst)}
+    window = max(1.0, burst / rate)
+    allowed_in_window = burst + rate * window
+
+    report, failures = {}, []
+    with tempfile.TemporaryDirectory() as state_dir:
+        for mode, directory in (('shared', state_dir), ('per_process', None)):
+            server = FakeApiServer(mode, rate, burst)
+            calls = run_processes(server.url, limits, directory, processes, duration)
+            server.close()
+            report[mode] = {
+                'processes': processes, 'calls': calls, 'accepted': len(server.accepted),
+                'rejected_429': server.rejected, 'max_in_window': server.max_in_window(window),
+                'allowed_in_window': round(allowed_in_window, 2)
+            }
+
+    shared = report['shared']
+    if shared['rejected_429']:
+        failures.append(f"processes: server returned {shared['rejected_429']} x 429 with shared bucket state")
+    if shared['max_in_window'] > allowed_in_window + 1e-9:
+        failures.append(f"processes: {shared['max_in_window']} requests in a {window:.2f}s window "
+                        f"with shared bucket state (quota {allowed_in_window:.2f})")
+    return report, failures
+
+
+def check_hosts(duration, scale, hosts=2, processes=2):
+    """
+    Workers on several hosts, each host with its own bucket state: within one quota
+    together only when each host takes its --quota-share.
+    """
+    rate, burst = rate_limiter.DEFAULT_LIMITS['nominatim']
+    rate *= scale
+    limits = {'shared': (rate, burst)}
+
+    report, failures = {}, []
+    for mode, split in (('quota_share', True), ('full_quota', False)):
+        server = FakeApiServer(mode, rate, burst)
+        context = multiprocessing.get_context('fork')
+        with tempfile.TemporaryDirectory() as root:
+            results = context.Queue()
+            workers = []
+            for host in range(hosts):
+                state_dir = os.path.join(root, f"host{host}")
+                # Every process on a host shares that host's state dir and share of the quota
+                workers.extend(context.Process(
+                    target=hammer_process,
+                    args=(server.url, limits, state_dir, duration, results, (hosts, host) if split else None)
+                ) for _ in range(processes))
+            for p in workers:
+                p.start()
+            outcomes = [results.get() for _ in workers]
+            for p in workers:
+                p.join()
+        server.close()
+        # Calls queued at the end of the run still go out, so measure over the span of arrivals:
+        # one quota, plus one request per host that a burst-0 share may send early
+        span = server.received[-1] - server.received[0]
+        allowed = burst + rate * span + hosts
+        report[mode] = {
+            'hosts': hosts, 'processes_per_host': processes,
+            'calls': {key: sum(o[key] for o in outcomes) for key in ('ok', 'failed')},
+            'sent': len(server.received), 'span_seconds': round(span, 2), 'allowed': round(allowed, 2),
+            'rejected_429': server.rejected
+        }
+
+    shared = report['quota_share']
+    if shared['sent'] > shared['allowed']:
+        failures.append(f"hosts: {shared['sent']} requests in {shared['span_seconds']}s from {hosts} hosts "
+                        f"with --quota-share {hosts} (quota {shared['allowed']})")
+    return report, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--duration', type=float, default=4.0, help="Seconds to hammer each API")
+    parser.add_argument('--scale', type=float, default=5.0, help="Multiply default rates to shorten the run")
+    args = parser.parse_args()
+
+    report, failures = {}, []
+    for name, check in (('quota', lambda: check_quota(args.duration, args.scale)),
+                        ('retry', lambda: check_retry(args.scale)),
+                        ('priority', lambda: check_priority(args.scale)),
+                        ('processes', lambda: check_processes(args.duration, args.scale)),
+                        ('hosts', lambda: check_hosts(args.duration, args.scale))):
+        report[name], check_failures = check()
+        failures.extend(check_failures)
+
+    print(json.dumps(report, indent=4))
+    if failures:
+        print("FAILED:\n  " + "\n  ".join(failures), file=sys.stderr)
+        sys.exit(1)
+    print("All scheduler checks passed.", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
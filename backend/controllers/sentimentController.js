@@ -1,5 +1,58 @@
 const { exec } = require('child_process');
 const path = require('path');
+const jobManager = require('../services/jobManager');
+
+const sentimentScriptPath = path.join(__dirname, '../scripts/sentiment.py');
+const playStoreScriptPath = path.join(__dirname, '../scripts/playstore_sentiment_analysis.py');
+
+// The sentiment script may print messages before its JSON output
+const parseSentimentOutput = (stdout) => {
+    const jsonStartIndex = stdout.indexOf('{');
+    const jsonPart = stdout.substring(jsonStartIndex);
+
+    const sentimentData = JSON.parse(jsonPart);
+
+    const messages = stdout.substring(0, jsonStartIndex).trim();
+    if (messages) {
+        sentimentData.messages = messages.split('\n');
+    }
+    return sentimentData;
+};
+
+const parsePlayStoreOutput = (stdout) => JSON.parse(stdout.trim());
+
+// Optional ?budget=<seconds> latency budget for the analysis pipeline; the scripts
+// degrade to fit it and report what they skipped. Returns null when it is invalid.
+const parseBudget = (req) => {
+    if (req.query.budget === undefined) {
+        return {};
+    }
+    const budget = Number(req.query.budget);
+    if (!Number.isFinite(budget) || budget <= 0) {
+        return null;
+    }
+    return { SENTIFY_BUDGET_SECONDS: String(budget) };
+};
+
+// Optional ?format=columns for the compact column-oriented result (see scripts/columnar.py)
+const parseFormat = (req) => (req.query.format === 'columns' ? { SENTIFY_RESULT_FORMAT: 'columns' } : {});
+
+const invalidBudget = (res) => res.status(400).json({ message: 'budget must be a positive number of seconds' });
+
+// Time a budgeted script may run past its budget before it is killed: the scripts check
+// the budget between stages, so a stage in progress (model loading, a Gemini call) can overrun it
+const BUDGET_GRACE_MS = 10000;
+
+// Kill timeout in ms for a script run with budgetEnv, or 0 (none) without a budget
+const budgetTimeoutMs = (budgetEnv) => (
+    budgetEnv.SENTIFY_BUDGET_SECONDS ? Number(budgetEnv.SENTIFY_BUDGET_SECONDS) * 1000 + BUDGET_GRACE_MS : 0
+);
+
+// Spawn time for the script, so that its budget clock also covers start-up and model loading
+const startedAtEnv = () => ({ SENTIFY_STARTED_AT: String(Date.now() / 1000) });
+
+// exec kills a script that outlives its timeout with SIGTERM
+const budgetExceeded = (error) => error.killed && error.signal === 'SIGTERM';
 
 const analyzeSentiment = (req, res) => {
     const ProductName = req.params.platform;
@@ -8,35 +61,34 @@ const analyzeSentiment = (req, res) => {
     if (!ProductName) {
         return res.status(400).json({message: 'Product name is required'});
     }
+    const budgetEnv = parseBudget(req);
+    if (!budgetEnv) {
+        return invalidBudget(res);
+    }
 
-    const scriptPath = path.join(__dirname, '../scripts/sentiment.py');
+    const scriptPath = sentimentScriptPath;
     
     const command = ProductLocation 
     ? `python3 "${scriptPath}" "${ProductName}" "${ProductLocation}"`
     : `python3 "${scriptPath}" "${ProductName}"`;
 
     const options = {
-        timeout: 6000000,
-        maxBuffer: 1024 * 1024
+        timeout: budgetTimeoutMs(budgetEnv) || 6000000,
+        maxBuffer: 1024 * 1024,
+        env: { ...process.env, ...budgetEnv, ...parseFormat(req), ...startedAtEnv() }
     };
 
     exec(command, options, (error, stdout, stderr) => {
         if (error) {
             console.error(`Error: ${error.message}`);
+            if (budgetEnv.SENTIFY_BUDGET_SECONDS && budgetExceeded(error)) {
+                return res.status(504).json({ error: 'Latency budget exceeded' });
+            }
             return res.status(500).json({ error: 'Failed to analyze sentiment' });
         }
         
         try {
-            const jsonStartIndex = stdout.indexOf('{');
-            const jsonPart = stdout.substring(jsonStartIndex);
-
-            const sentimentData = JSON.parse(jsonPart);
-
-            const messages = stdout.substring(0, jsonStartIndex).trim();
-            if (messages) {
-                sentimentData.messages = messages.split('\n');
-            }
-            res.json(sentimentData);
+            res.json(parseSentimentOutput(stdout));
         } catch (parseError) {
             console.error(`JSON Parse Error: ${parseError.message}`);
             res.status(500).json({ error: 'Invalid response from sentiment analysis script' });
@@ -50,19 +102,30 @@ const analyzePlayStoreSentiment = (req, res) => {
     if (!appName) {
         return res.status(400).json({ message: 'App name is required' });
     }
+    const budgetEnv = parseBudget(req);
+    if (!budgetEnv) {
+        return invalidBudget(res);
+    }
 
-    const scriptPath = path.join(__dirname, '../scripts/playstore_sentiment_analysis.py');
+    const scriptPath = playStoreScriptPath;
 
-    exec(`python3 "${scriptPath}" "${appName}"`, (error, stdout, stderr) => {
+    const options = {
+        timeout: budgetTimeoutMs(budgetEnv),
+        env: { ...process.env, ...budgetEnv, ...startedAtEnv() }
+    };
+
+    exec(`python3 "${scriptPath}" "${appName}"`, options, (error, stdout, stderr) => {
         if (error) {
             console.error(`Execution Error: ${error.message}`);
+            if (budgetEnv.SENTIFY_BUDGET_SECONDS && budgetExceeded(error)) {
+                return res.status(504).json({ error: 'Latency budget exceeded' });
+            }
             return res.status(500).json({ error: 'Failed to analyze sentiment' });
         }
         if (stderr) console.warn(`Python stderr: ${stderr}`); // Don't treat stderr as an error
 
         try {
-            const sentimentData = JSON.parse(stdout.trim());
-            res.json(sentimentData);
+            res.json(parsePlayStoreOutput(stdout));
         } catch (parseError) {
             console.error(`JSON Parse Error: ${parseError.message}, Output: ${stdout}`);
             res.status(500).json({ error: 'Invalid response from sentiment analysis script' });
@@ -70,7 +133,77 @@ const analyzePlayStoreSentiment = (req, res) => {
     });
 };
 
+// Async job API: submit returns a job id immediately; identical concurrent requests share one job
+const submitSentimentJob = (req, res) => {
+    const ProductName = req.params.platform;
+    const ProductLocation = req.params.location;
+
+    if (!ProductName) {
+        return res.status(400).json({ message: 'Product name is required' });
+    }
+    const budgetEnv = parseBudget(req);
+    if (!budgetEnv) {
+        return invalidBudget(res);
+    }
+
+    const args = ProductLocation ? [ProductName, ProductLocation] : [ProductName];
+    const env = { ...budgetEnv, ...parseFormat(req) };
+    // Requests with different budgets or formats return different results, so they do not coalesce
+    const key = JSON.stringify(['sentiment', ProductName.trim().toLowerCase(), (ProductLocation || '').trim().toLowerCase(), env.SENTIFY_BUDGET_SECONDS || null, env.SENTIFY_RESULT_FORMAT || null]);
+    const { job, coalesced, subscriptionId } = jobManager.submitJob(key, sentimentScriptPath, args, parseSentimentOutput, env, budgetTimeoutMs(budgetEnv));
+    res.status(202).json({ ...job, coalesced, subscriptionId });
+};
+
+const submitPlayStoreJob = (req, res) => {
+    const appName = req.params.appName;
+
+    if (!appName) {
+        return res.status(400).json({ message: 'App name is required' });
+    }
+    const budgetEnv = parseBudget(req);
+    if (!budgetEnv) {
+        return invalidBudget(res);
+    }
+
+    const key = JSON.stringify(['playstore', appName.trim(), budgetEnv.SENTIFY_BUDGET_SECONDS || null]);
+    const { job, coalesced, subscriptionId } = jobManager.submitJob(key, playStoreScriptPath, [appName], parsePlayStoreOutput, budgetEnv, budgetTimeoutMs(budgetEnv));
+    res.status(202).json({ ...job, coalesced, subscriptionId });
+};
+
+const getAnalysisJob = (req, res) => {
+    const job = jobManager.getJob(req.params.jobId);
+    if (!job) {
+        return res.status(404).json({ message: 'Job not found' });
+    }
+    res.json(job);
+};
+
+// Cancellation errors of jobManager.cancelJob -> [HTTP status, message]
+const CANCEL_ERRORS = {
+    not_found: [404, 'Job not found'],
+    unknown_subscription: [403, 'Unknown subscription for this job'],
+    subscription_used: [409, 'This subscription has already been cancelled']
+};
+
+// DELETE /jobs/:jobId?subscriptionId=<id>, with the id returned when the job was submitted or joined
+const cancelAnalysisJob = (req, res) => {
+    const subscriptionId = req.query.subscriptionId;
+    if (!subscriptionId) {
+        return res.status(400).json({ message: 'subscriptionId is required' });
+    }
+    const { job, error } = jobManager.cancelJob(req.params.jobId, subscriptionId);
+    if (error) {
+        const [status, message] = CANCEL_ERRORS[error];
+        return res.status(status).json({ message });
+    }
+    res.json(job);
+};
+
 module.exports = {
     analyzeSentiment,
-    analyzePlayStoreSentiment
-};
\ No newline at end of file
+    analyzePlayStoreSentiment,
+    submitSentimentJob,
+    submitPlayStoreJob,
+    getAnalysisJob,
+    cancelAnalysisJob
+};
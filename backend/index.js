@@ -5,7 +5,7 @@ const { exec } = require('child_process');
 const path = require('path');
 
 const app = express();
-const PORT = 5001;
+const PORT = process.env.PORT || 5001;
 
 //Middleware
 app.use(cors());
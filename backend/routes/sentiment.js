@@ -1,10 +1,28 @@
 const express = require('express');
 const router = express.Router();
-const { analyzeSentiment, analyzePlayStoreSentiment } = require('../controllers/sentimentController');
+const {
+    analyzeSentiment,
+    analyzePlayStoreSentiment,
+    submitSentimentJob,
+    submitPlayStoreJob,
+    getAnalysisJob,
+    cancelAnalysisJob
+} = require('../controllers/sentimentController');
 
 router.post('/analyze-normal/:platform', analyzeSentiment);
 
 router.post('/analyze-with-location/:platform/:location', analyzeSentiment);
 
 router.post('/analyze-playstore/:appName', analyzePlayStoreSentiment);
-module.exports = router;
\ No newline at end of file
+
+// Async jobs: submit, poll progress/result, cancel
+router.post('/jobs/analyze-normal/:platform', submitSentimentJob);
+
+router.post('/jobs/analyze-with-location/:platform/:location', submitSentimentJob);
+
+router.post('/jobs/analyze-playstore/:appName', submitPlayStoreJob);
+
+router.get('/jobs/:jobId', getAnalysisJob);
+
+router.delete('/jobs/:jobId', cancelAnalysisJob);
+module.exports = router;
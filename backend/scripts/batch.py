@@ -0,0 +1,140 @@
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, Iterable, List, Optional, TextIO
+
+
+def read_jobs(path: str) -> List[Dict]:
+    """
+    Read batch jobs from a JSONL file, one JSON object per line.
+
+    Blank lines are skipped. Lines that are not valid JSON objects are kept as
+    jobs carrying a parse error so they show up in the results instead of
+    aborting the whole batch.
+
+    Args:
+        path (str): Path to the JSONL jobs file, or '-' for stdin.
+
+    Returns:
+        List[Dict]: The parsed jobs. Jobs without an 'id' get their line number.
+    """
+    stream = sys.stdin if path == '-' else open(path, 'r', encoding='utf-8')
+    jobs = []
+    try:
+        for line_number, line in enumerate(stream, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                job = json.loads(line)
+                if not isinstance(job, dict):
+                    raise ValueError("job must be a JSON object")
+            except ValueError as e:
+                job = {'_parse_error': f"line {line_number}: {e}"}
+            job.setdefault('id', line_number)
+            jobs.append(job)
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+    return jobs
+
+
+def run_one(handler: Callable[[Dict], Dict], job: Dict) -> Dict:
+    """
+    Run a single job, isolating any error into the job's result record.
+    """
+    started = time.perf_counter()
+    record = {'id': job.get('id')}
+    try:
+        if '_parse_error' in job:
+            raise ValueError(job['_parse_error'])
+        record['result'] = handler(job)
+        record['status'] = 'ok'
+    except Exception as e:
+        record['status'] = 'error'
+        record['error'] = str(e)
+    record['elapsed_seconds'] = round(time.perf_counter() - started, 3)
+    return record
+
+
+def run_batch(jobs: Iterable[Dict], handler: Callable[[Dict], Dict], output: TextIO,
+              concurrency: int = 4, serialize: Optional[Callable[[Dict], Dict]] = None) -> Dict:
+    """
+    Run jobs through a shared handler with bounded concurrency.
+
+    Each job produces exactly one JSONL record on `output`, written as soon as
+    the job finishes. A failing job only affects its own record.
+
+    Args:
+        jobs (Iterable[Dict]): The jobs to run.
+        handler (Callable[[Dict], Dict]): Function analyzing a single job.
+        output (TextIO): Stream receiving one JSON line per job.
+        concurrency (int): Maximum number of jobs in flight at once.
+        serialize (Callable[[Dict], Dict], optional): Hook applied to each record before writing.
+
+    Returns:
+        Dict: Throughput summary for the batch.
+    """
+    jobs = list(jobs)
+    started = time.perf_counter()
+    succeeded = failed = 0
+    job_seconds = []
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        futures = [executor.submit(run_one, handler, job) for job in jobs]
+        for future in as_completed(futures):
+            record = future.result()
+            if record['status'] == 'ok':
+                succeeded += 1
+            else:
+                failed += 1
+            job_seconds.append(record['elapsed_seconds'])
+
+            if serialize is not None:
+                record = serialize(record)
+            output.write(json.dumps(record) + '\n')
+            output.flush()
+
+    wall_seconds = time.perf_counter() - started
+    return {
+        'jobs': len(jobs),
+        'succeeded': succeeded,
+        'failed': failed,
+        'concurrency': concurrency,
+        'wall_seconds': round(wall_seconds, 3),
+        'jobs_per_second': round(len(jobs) / wall_seconds, 3) if wall_seconds > 0 else 0.0,
+        'mean_job_seconds': round(sum(job_seconds) / len(job_seconds), 3) if job_seconds else 0.0,
+        'max_job_seconds': max(job_seconds) if job_seconds else 0.0
+    }
+
+
+def print_summary(summary: Dict, stream: TextIO = sys.stderr):
+    """
+    Print a human-readable throughput summary for a finished batch.
+    """
+    stream.write(
+        f"Batch finished: {summary['succeeded']}/{summary['jobs']} jobs succeeded, "
+        f"{summary['failed']} failed\n"
+        f"Wall time: {summary['wall_seconds']:.2f}s at concurrency {summary['concurrency']} "
+        f"({summary['jobs_per_second']:.2f} jobs/s)\n"
+        f"Per job: mean {summary['mean_job_seconds']:.2f}s, max {summary['max_job_seconds']:.2f}s\n"
+    )
+    worker_memory = [w for w in summary.get('worker_memory', []) if 'pss_kb' in w]
+    if worker_memory:
+        count = len(worker_memory)
+        stream.write(
+            f"Worker memory ({count} processes): mean RSS {sum(w['rss_kb'] for w in worker_memory) / count / 1024:.1f} MB, "
+            f"PSS {sum(w['pss_kb'] for w in worker_memory) / count / 1024:.1f} MB, "
+            f"USS {sum(w['uss_kb'] for w in worker_memory) / count / 1024:.1f} MB\n"
+        )
+    stream.flush()
+
+
+def open_output(path: Optional[str]) -> TextIO:
+    """
+    Open the results stream: a file path, or the real stdout when omitted.
+    """
+    if not path or path == '-':
+        return sys.__stdout__
+    return open(path, 'w', encoding='utf-8')
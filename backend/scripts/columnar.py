@@ -0,0 +1,287 @@
+import math
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Sentiment labels by code, in score order
+LABELS = ('Negative', 'Neutral', 'Positive')
+LABEL_CODES = {label: code for code, label in enumerate(LABELS)}
+
+# Code of a missing emotion (item not run through the emotion model)
+NO_EMOTION = -1
+
+
+def float_or_none(value) -> Optional[float]:
+    """
+    A NumPy aggregate as a JSON-ready float, None for NaN.
+    """
+    value = float(value)
+    return None if math.isnan(value) else value
+
+
+def _parse_timestamp(value) -> np.datetime64:
+    """
+    ISO 8601 timestamp (NewsAPI's publishedAt) as datetime64[s]; NaT when absent or unparseable.
+    """
+    if not value:
+        return np.datetime64('NaT')
+    try:
+        parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        return np.datetime64('NaT')
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return np.datetime64(parsed, 's')
+
+
+class ColumnarResults:
+    """
+    Analyzed content items stored column by column.
+
+    Scores, label and emotion codes, timestamps and the item x aspect score matrix
+    live in NumPy arrays, so aggregates are vectorized and a large result set costs
+    a few bytes per value instead of a nested dict per item. Missing values are NaN
+    (or NO_EMOTION / NaT) and come out as null when serialized.
+
+    Args:
+        aspects (Sequence[str]): Aspect names, the columns of the aspect matrix.
+        fields (Sequence[str]): Item metadata copied into each record, in order.
+        track_sampled (bool): Keep the per-item 'sampled' flag (fast mode).
+        capacity (int): Initial number of rows to allocate.
+    """
+
+    def __init__(self, aspects: Sequence[str], fields: Sequence[str] = ('source', 'title', 'url'),
+                 track_sampled: bool = False, capacity: int = 64):
+        self.aspects = list(aspects)
+        self.fields = list(fields)
+        self.track_sampled = track_sampled
+        self.size = 0
+
+        self.metadata = {field: [] for field in self.fields}
+        self.emotion_names = []
+        self._emotion_index = {}
+        self.aspect_samples = {}
+        self._allocate(max(1, capacity))
+
+    def _allocate(self, capacity: int):
+        n_aspects = len(self.aspects)
+        self.scores = np.zeros(capacity, dtype=np.int16)
+        self.label_codes = np.zeros(capacity, dtype=np.int8)
+        self.vader = np.full(capacity, np.nan)
+        self.textblob = np.full(capacity, np.nan)
+        self.emotion_codes = np.full(capacity, NO_EMOTION, dtype=np.int16)
+        self.emotion_confidence = np.full(capacity, np.nan)
+        self.timestamps = np.full(capacity, np.datetime64('NaT'), dtype='datetime64[s]')
+        self.sampled = np.zeros(capacity, dtype=bool)
+        self.aspect_scores = np.full((capacity, n_aspects), np.nan)
+        self.aspect_counts = np.zeros((capacity, n_aspects), dtype=np.int32)
+
+    def _grow(self):
+        old = {name: getattr(self, name) for name in (
+            'scores', 'label_codes', 'vader', 'textblob', 'emotion_codes', 'emotion_confidence',
+            'timestamps', 'sampled', 'aspect_scores', 'aspect_counts'
+        )}
+        self._allocate(2 * len(self.scores))
+        for name, column in old.items():
+            getattr(self, name)[:self.size] = column[:self.size]
+
+    def __len__(self) -> int:
+        return self.size
+
+    def _emotion_code(self, emotion: str) -> int:
+        if emotion not in self._emotion_index:
+            self._emotion_index[emotion] = len(self.emotion_names)
+            self.emotion_names.append(emotion)
+        return self._emotion_index[emotion]
+
+    def append(self, item: Dict, sentiment: Dict, emotions: Optional[Dict], aspect_sentiments: Dict,
+               sampled: bool = True) -> int:
+        """
+        Add one analyzed item.
+
+        Args:
+            item (Dict): The content item (metadata fields and optional 'published_at').
+            sentiment (Dict): {'score', 'label', 'raw_scores'} as returned by the analyzers.
+            emotions (Dict, optional): {'emotion', 'confidence'}, or None if not analyzed.
+            aspect_sentiments (Dict): {aspect: {'score', 'count', 'sample_text'}} for the aspects found.
+            sampled (bool): Whether the item went through the full models (fast mode).
+
+        Returns:
+            int: The row of the new item.
+        """
+        if self.size == len(self.scores):
+            self._grow()
+        row = self.size
+
+        for field in self.fields:
+            self.metadata[field].append(item.get(field, ''))
+        self.scores[row] = sentiment['score']
+        self.label_codes[row] = LABEL_CODES.get(sentiment['label'], LABEL_CODES['Neutral'])
+        raw_scores = sentiment.get('raw_scores', {})
+        self.vader[row] = raw_scores.get('vader', np.nan)
+        self.textblob[row] = raw_scores.get('textblob', np.nan)
+        if emotions:
+            self.emotion_codes[row] = self._emotion_code(emotions['emotion'])
+            self.emotion_confidence[row] = emotions['confidence']
+        self.timestamps[row] = _parse_timestamp(item.get('published_at'))
+        self.sampled[row] = sampled
+        for column, aspect in enumerate(self.aspects):
+            if aspect in aspect_sentiments:
+                found = aspect_sentiments[aspect]
+                self.aspect_scores[row, column] = found['score']
+                self.aspect_counts[row, column] = found['count']
+                self.aspect_samples[(row, column)] = found.get('sample_text')
+
+        self.size += 1
+        return row
+
+    def _rows(self, rows: Optional[np.ndarray]) -> np.ndarray:
+        """
+        Boolean mask over the filled rows; all of them by default.
+        """
+        if rows is None:
+            return np.ones(self.size, dtype=bool)
+        return np.asarray(rows[:self.size], dtype=bool)
+
+    def mean_score(self, rows: Optional[np.ndarray] = None) -> float:
+        """
+        Mean sentiment score (NaN when there are no rows).
+        """
+        selected = self.scores[:self.size][self._rows(rows)]
+        return float(selected.mean()) if selected.size else math.nan
+
+    def label_counts(self, rows: Optional[np.ndarray] = None) -> Dict[str, int]:
+        counts = np.bincount(self.label_codes[:self.size][self._rows(rows)], minlength=len(LABELS))
+        return {label: int(count) for label, count in zip(LABELS, counts)}
+
+    def emotion_counts(self, rows: Optional[np.ndarray] = None) -> Dict[str, int]:
+        codes = self.emotion_codes[:self.size][self._rows(rows)]
+        counts = np.bincount(codes[codes != NO_EMOTION], minlength=len(self.emotion_names))
+        return {emotion: int(count) for emotion, count in zip(self.emotion_names, counts)}
+
+    def dominant_emotion(self, rows: Optional[np.ndarray] = None, default: str = 'neutral') -> str:
+        """
+        Most frequent emotion, ties going to the emotion seen first; `default` when none was analyzed.
+        """
+        codes = self.emotion_codes[:self.size][self._rows(rows)]
+        codes = codes[codes != NO_EMOTION]
+        if not codes.size:
+            return default
+        return self.emotion_names[int(np.bincount(codes).argmax())]
+
+    def aspect_means(self, min_score: Optional[float] = None,
+                     rows: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Mean score and number of items per aspect, over the items that mention it.
+
+        Args:
+            min_score (float, optional): Only count aspect scores above this value.
+            rows (np.ndarray, optional): Boolean mask of the rows to aggregate.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Means (NaN for aspects no item mentions) and counts.
+        """
+        matrix = self.aspect_scores[:self.size][self._rows(rows)]
+        valid = ~np.isnan(matrix)
+        if min_score is not None:
+            valid &= np.where(valid, matrix, min_score) > min_score
+        counts = valid.sum(axis=0)
+        totals = np.where(valid, matrix, 0.0).sum(axis=0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = totals / counts
+        return means, counts
+
+    def timeline(self, rows: Optional[np.ndarray] = None) -> List[Optional[int]]:
+        """
+        Item timestamps as Unix seconds, None where unknown.
+        """
+        stamps = self.timestamps[:self.size][self._rows(rows)]
+        seconds = stamps.astype('int64')
+        return [None if missing else int(value) for missing, value in zip(np.isnat(stamps), seconds)]
+
+    def to_records(self) -> List[Dict]:
+        """
+        One dict per item, in the shape of 'analyzed_content'.
+        """
+        scores = self.scores[:self.size].tolist()
+        vader = self.vader[:self.size].tolist()
+        textblob = self.textblob[:self.size].tolist()
+        emotion_codes = self.emotion_codes[:self.size].tolist()
+        confidence = self.emotion_confidence[:self.size].tolist()
+        aspect_scores = self.aspect_scores[:self.size].tolist()
+        aspect_counts = self.aspect_counts[:self.size].tolist()
+
+        records = []
+        for row in range(self.size):
+            raw_scores = {'vader': vader[row]}
+            if not math.isnan(textblob[row]):
+                raw_scores['textblob'] = textblob[row]
+            emotions = None
+            if emotion_codes[row] != NO_EMOTION:
+                emotions = {'emotion': self.emotion_names[emotion_codes[row]], 'confidence': confidence[row]}
+            aspect_sentiments = {
+                aspect: {
+                    'score': aspect_scores[row][column],
+                    'count': aspect_counts[row][column],
+                    'sample_text': self.aspect_samples.get((row, column))
+                }
+                for column, aspect in enumerate(self.aspects)
+                if not math.isnan(aspect_scores[row][column])
+            }
+
+            record = {field: self.metadata[field][row] for field in self.fields}
+            record.update({
+                'sentiment': {
+                    'score': scores[row],
+                    'label': LABELS[self.label_codes[row]],
+                    'raw_scores': raw_scores
+                },
+                'emotions': emotions,
+                'aspect_sentiments': aspect_sentiments
+            })
+            if self.track_sampled:
+                record['sampled'] = bool(self.sampled[row])
+            records.append(record)
+        return records
+
+    def to_columns(self) -> Dict:
+        """
+        Compact column-oriented form: one list per column, categorical columns as codes
+        into a vocabulary, null for missing values.
+
+        'label_counts' and 'aspect_averages' are ready to pass as SentimentChart data
+        (pie and bar charts respectively).
+        """
+        means, counts = self.aspect_means()
+        label_counts = self.label_counts()
+        columns = {
+            'count': self.size,
+            'labels': list(LABELS),
+            'label_codes': self.label_codes[:self.size].tolist(),
+            'scores': self.scores[:self.size].tolist(),
+            'emotions': list(self.emotion_names),
+            'emotion_codes': [None if code == NO_EMOTION else code
+                              for code in self.emotion_codes[:self.size].tolist()],
+            'timestamps': self.timeline(),
+            'aspects': list(self.aspects),
+            'aspect_scores': [[None if math.isnan(score) else score for score in row]
+                              for row in self.aspect_scores[:self.size].tolist()],
+            'label_counts': {label.lower(): count for label, count in label_counts.items()},
+            'aspect_averages': {aspect: float_or_none(mean) for aspect, mean in zip(self.aspects, means)},
+            'aspect_counts': {aspect: int(count) for aspect, count in zip(self.aspects, counts)}
+        }
+        columns.update({field: self.metadata[field] for field in self.fields})
+        if self.track_sampled:
+            columns['sampled'] = self.sampled[:self.size].tolist()
+        return columns
+
+
+def content_fields(table: ColumnarResults, result_format: str = 'records') -> Dict:
+    """
+    Response fields for the analyzed content: 'analyzed_content' records (the default),
+    or the compact 'columns' form when result_format is 'columns'.
+    """
+    if result_format == 'columns':
+        return {'columns': table.to_columns()}
+    return {'analyzed_content': table.to_records()}
@@ -0,0 +1,381 @@
+import contextlib
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Analysis levels, richest first, with rough single-thread seconds per item on a
+# laptop CPU (rescaled by measurement). Each level drops one more stage.
+LEVEL_COSTS = {
+    'full': 0.12,
+    'no_aspects': 0.09,
+    'vader_only': 0.002,
+}
+
+# Stages a level skips, for reporting
+SKIPPED_AT_LEVEL = {
+    'full': [],
+    'no_aspects': ['aspect_analysis'],
+    'vader_only': ['aspect_analysis', 'emotion_analysis', 'textblob_scoring'],
+}
+
+# Time kept back for the Gemini summary, and for the cheap fallback summary
+SUMMARY_RESERVE_SECONDS = 5.0
+FALLBACK_RESERVE_SECONDS = 0.2
+
+# Where LLM summaries are kept for reuse across processes: the API server starts a
+# Python process per request, so an in-process cache alone would never be hit there.
+# Set SENTIFY_SUMMARY_CACHE_DIR to an empty string to keep the cache in memory.
+DEFAULT_SUMMARY_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '.summary_cache')
+
+
+class Deadline:
+    """
+    Tracks a latency budget across pipeline stages and records what was degraded.
+
+    A Deadline without a budget never runs out, so the pipeline can call it
+    unconditionally. `started_at` (Unix time) backdates the start, e.g. to when the
+    API server spawned the process, so interpreter start-up and model loading count
+    against the budget too.
+    """
+
+    def __init__(self, budget_seconds: Optional[float] = None, clock: Callable[[], float] = time.monotonic,
+                 started_at: Optional[float] = None):
+        self.budget_seconds = budget_seconds
+        self.clock = clock
+        self.started = clock()
+        if started_at is not None:
+            self.started -= max(0.0, time.time() - started_at)
+        self.skipped_stages = []
+        self.degradations = []
+
+    @property
+    def enabled(self) -> bool:
+        return self.budget_seconds is not None
+
+    def elapsed(self) -> float:
+        return self.clock() - self.started
+
+    def remaining(self) -> float:
+        if self.budget_seconds is None:
+            return math.inf
+        return max(0.0, self.budget_seconds - self.elapsed())
+
+    def has_time(self, seconds: float) -> bool:
+        return self.remaining() >= seconds
+
+    def timeout(self, cap: float) -> float:
+        """
+        Timeout for a blocking call: the remaining budget, at most `cap`, at least a moment.
+        """
+        return max(0.5, min(cap, self.remaining()))
+
+    def skip(self, stage: str):
+        if stage not in self.skipped_stages:
+            self.skipped_stages.append(stage)
+
+    def degrade(self, stage: str, **details):
+        self.degradations.append({'stage': stage, **details})
+
+    def report(self) -> Dict:
+        """
+        What the caller needs to know about a budgeted run.
+        """
+        return {
+            'budget_seconds': self.budget_seconds,
+            'elapsed_seconds': round(self.elapsed(), 3),
+            'partial': bool(self.skipped_stages or self.degradations),
+            'skipped_stages': self.skipped_stages,
+            'degradations': self.degradations
+        }
+
+
+class CostModel:
+    """
+    Per-item cost of each analysis level: the defaults, rescaled by measured items.
+    """
+
+    def __init__(self, level_costs: Optional[Dict[str, float]] = None):
+        self.level_costs = dict(level_costs or LEVEL_COSTS)
+        self.expected_seconds = 0.0
+        self.observed_seconds = 0.0
+
+    @property
+    def levels(self) -> List[str]:
+        return list(self.level_costs)
+
+    def observe(self, level: str, seconds: float):
+        """
+        Record how long one item at `level` took.
+        """
+        self.expected_seconds += self.level_costs[level]
+        self.observed_seconds += seconds
+
+    def item_cost(self, level: str) -> float:
+        scale = self.observed_seconds / self.expected_seconds if self.expected_seconds else 1.0
+        return self.level_costs[level] * scale
+
+
+def plan_analysis(n_items: int, seconds: float, costs: CostModel, parallelism: int = 1,
+                  min_items: int = 10) -> Tuple[str, int]:
+    """
+    Pick the analysis level and item count that fit in `seconds`.
+
+    Degrades in order: first analyze fewer items (down to `min_items`) at the richest
+    level, then try each cheaper level in turn, analyzing fewer items again only when
+    even the cheapest does not fit.
+
+    Args:
+        n_items (int): Items still to analyze.
+        seconds (float): Time available for them.
+        costs (CostModel): Per-item cost estimates.
+        parallelism (int): Items analyzed concurrently.
+        min_items (int): Fewest items worth keeping before dropping stages.
+
+    Returns:
+        Tuple[str, int]: The level and the number of items that fit at that level.
+    """
+    levels = costs.levels
+    if math.isinf(seconds):
+        return levels[0], n_items
+    floor = min(n_items, min_items)
+    for level in levels:
+        fits = int(seconds * parallelism / costs.item_cost(level))
+        if fits >= floor:
+            return level, min(n_items, fits)
+    return levels[-1], max(0, min(n_items, int(seconds * parallelism / costs.item_cost(levels[-1]))))
+
+
+class BudgetedAnalysis:
+    """
+    Chooses the analysis level item by item so that the remaining items fit the budget.
+
+    Every item re-plans with costs calibrated on the items measured so far, so a slow
+    machine degrades early and a fast one keeps full depth. Thread-safe, so executor
+    threads can pull levels from one shared instance.
+
+    Args:
+        deadline (Deadline): The request's deadline.
+        n_items (int): Items available for analysis.
+        reserve (float): Seconds to keep back for the stages after analysis.
+        parallelism (int): Items analyzed concurrently.
+        min_items (int): Fewest items worth keeping before dropping stages.
+        level_costs (Dict[str, float], optional): Default cost per level, richest first.
+        skipped (Dict[str, List[str]], optional): Stages each level skips, for reporting.
+    """
+
+    def __init__(self, deadline: Deadline, n_items: int, reserve: float = 0.0, parallelism: int = 1,
+                 min_items: int = 10, level_costs: Optional[Dict[str, float]] = None,
+                 skipped: Optional[Dict[str, List[str]]] = None):
+        self.deadline = deadline
+        self.n_items = n_items
+        self.reserve = reserve
+        self.parallelism = max(1, parallelism)
+        self.min_items = min_items
+        self.costs = CostModel(level_costs)
+        self.skipped = skipped or SKIPPED_AT_LEVEL
+        self.started = 0
+        self.levels = Counter()
+        self._lock = threading.Lock()
+
+    def next_level(self) -> Optional[str]:
+        """
+        Level for the next item, or None when the budget leaves no room for it.
+        """
+        with self._lock:
+            if not self.deadline.enabled:
+                level = self.costs.levels[0]
+            else:
+                level, fits = plan_analysis(
+                    self.n_items - self.started,
+                    self.deadline.remaining() - self.reserve,
+                    self.costs,
+                    self.parallelism,
+                    # Past the minimum, keep going one item at a time at whatever level fits
+                    max(1, self.min_items - self.started)
+                )
+                if fits <= 0:
+                    return None
+            self.started += 1
+            self.levels[level] += 1
+            return level
+
+    def observe(self, level: str, seconds: float):
+        with self._lock:
+            self.costs.observe(level, seconds)
+
+    def finish(self):
+        """
+        Record the items and stages that were dropped on the deadline.
+        """
+        if self.started < self.n_items:
+            self.deadline.degrade('items', analyzed=self.started, available=self.n_items)
+        for level in self.levels:
+            for stage in self.skipped[level]:
+                self.deadline.skip(stage)
+
+
+def summary_reserve(deadline: Deadline) -> float:
+    """
+    Seconds to keep back for the summary stage, given what the budget allows.
+    """
+    if not deadline.enabled:
+        return 0.0
+    return SUMMARY_RESERVE_SECONDS if deadline.remaining() > 2 * SUMMARY_RESERVE_SECONDS else FALLBACK_RESERVE_SECONDS
+
+
+def use_llm_summary(deadline: Deadline, expected_wait: float = 0.0) -> bool:
+    """
+    Whether there is still time for a Gemini summary, including the time queued
+    behind its rate limit; records the skip otherwise.
+    """
+    if deadline.has_time(SUMMARY_RESERVE_SECONDS + expected_wait):
+        return True
+    deadline.skip('gemini_summary')
+    return False
+
+
+class SummaryCache:
+    """
+    LLM summaries reused when the budget rules out a new one: an in-process LRU,
+    backed by one JSON file per key in `directory` when given, so that separate
+    processes (e.g. one per API request) share it.
+
+    Args:
+        max_entries (int): Summaries kept, in memory and on disk.
+        directory (str, optional): Directory of the on-disk cache; None keeps it in memory only.
+        max_age_seconds (float): Older summaries on disk are ignored and replaced.
+    """
+
+    def __init__(self, max_entries: int = 128, directory: Optional[str] = None,
+                 max_age_seconds: float = 24 * 3600):
+        self.max_entries = max_entries
+        self.directory = directory
+        self.max_age_seconds = max_age_seconds
+        self.entries = OrderedDict()
+
+    def _path(self, key) -> str:
+        digest = hashlib.sha256(json.dumps(key, default=str).encode()).hexdigest()
+        return os.path.join(self.directory, f"{digest}.json")
+
+    def get(self, key) -> Optional[str]:
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            return self.entries[key]
+        if not self.directory:
+            return None
+        try:
+            with open(self._path(key)) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if time.time() - entry.get('created', 0) > self.max_age_seconds:
+            return None
+        return entry.get('summary')
+
+    def put(self, key, summary: str):
+        self.entries[key] = summary
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        if self.directory:
+            try:
+                self._write(key, summary)
+            except OSError:
+                # The disk cache is only a fallback; never fail the request over it
+                pass
+
+    def _write(self, key, summary: str):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(key)
+        # Write then rename, so a concurrent reader never sees a partial file
+        temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporary, 'w') as f:
+            json.dump({'created': time.time(), 'summary': summary}, f)
+        os.replace(temporary, path)
+
+        files = [os.path.join(self.directory, name) for name in os.listdir(self.directory) if name.endswith('.json')]
+        if len(files) > self.max_entries:
+            files.sort(key=lambda file: os.stat(file).st_mtime)
+            for file in files[:len(files) - self.max_entries]:
+                with contextlib.suppress(OSError):
+                    os.remove(file)
+
+
+def get_summary_cache() -> SummaryCache:
+    """
+    A summary cache in SENTIFY_SUMMARY_CACHE_DIR (default backend/.summary_cache),
+    shared by every analysis process on the host.
+    """
+    return SummaryCache(directory=os.getenv('SENTIFY_SUMMARY_CACHE_DIR', DEFAULT_SUMMARY_CACHE_DIR) or None)
+
+
+def extractive_summary(texts: Sequence[str], max_sentences: int = 3) -> str:
+    """
+    Pick the most representative sentences by word frequency across all texts.
+
+    Args:
+        texts (Sequence[str]): The content to summarize.
+        max_sentences (int): Sentences to keep, in their original order.
+
+    Returns:
+        str: The summary, or an empty string if there is no usable text.
+    """
+    sentences = []
+    for text in texts:
+        if isinstance(text, str):
+            sentences.extend(s.strip() for s in re.split(r'(?<=[.!?])\s+', text) if len(s.split()) >= 4)
+    if not sentences:
+        return ""
+
+    words = lambda sentence: [w for w in re.findall(r'[a-z]+', sentence.lower()) if len(w) > 3]
+    frequency = Counter(w for sentence in sentences for w in words(sentence))
+    scored = []
+    seen = set()
+    for position, sentence in enumerate(sentences):
+        if sentence.lower() in seen:
+            continue
+        seen.add(sentence.lower())
+        tokens = words(sentence)
+        if tokens:
+            scored.append((sum(frequency[w] for w in tokens) / len(tokens), position, sentence))
+
+    best = sorted(scored, reverse=True)[:max_sentences]
+    return " ".join(sentence for _, _, sentence in sorted(best, key=lambda entry: entry[1]))
+
+
+def time_call(fn: Callable, *args, **kwargs):
+    """
+    Call fn and return (result, seconds taken).
+    """
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+
+def parse_started_at(value) -> Optional[float]:
+    """
+    Parse the Unix time at which the API server spawned this process
+    (SENTIFY_STARTED_AT); missing or invalid values mean unknown.
+    """
+    try:
+        return float(value) if value not in (None, '') else None
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_budget(value) -> Optional[float]:
+    """
+    Parse a latency budget in seconds (a number or a string, e.g. from the environment);
+    empty, invalid or non-positive values mean no budget.
+    """
+    try:
+        budget = float(value) if value not in (None, '') else None
+    except (TypeError, ValueError):
+        return None
+    return budget if budget and budget > 0 else None
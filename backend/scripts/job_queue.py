@@ -0,0 +1,554 @@
+import abc
+import argparse
+import hashlib
+import json
+import os
+import signal
+import socket
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+import batch
+import rate_limiter
+
+# Queue location when none is given, e.g. "sqlite:///var/lib/sentify/queue.db"
+DEFAULT_QUEUE_URL = os.getenv('SENTIFY_QUEUE_URL', 'sqlite:///sentify-queue.db')
+
+# Job states: queued (waiting or scheduled for a retry), running (leased to a worker), done, failed
+QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+
+
+def job_key(payload: Dict) -> str:
+    """
+    Idempotency key of a job: its 'key' field, or a hash of its content.
+
+    The batch 'id' is left out of the hash, so the same query enqueued again under
+    another id is still the same job.
+    """
+    if payload.get('key'):
+        return str(payload['key'])
+    content = {k: v for k, v in payload.items() if k not in ('id', 'key')}
+    return hashlib.sha256(json.dumps(content, sort_keys=True).encode()).hexdigest()
+
+
+class QueueBackend(abc.ABC):
+    """
+    A durable job queue shared by any number of worker processes.
+
+    A claimed job is leased to its worker for a visibility timeout. The worker must
+    complete it, fail it, or extend the lease before the timeout runs out; otherwise
+    the job becomes visible again and another worker picks it up. Every claim counts
+    as an attempt, and a job is failed for good after `max_attempts` of them.
+    Completing or failing requires the lease token of the current attempt, so a
+    worker whose lease expired cannot overwrite the outcome of a later attempt.
+
+    Jobs are plain dicts with id, key, queue, payload, status, attempts, max_attempts,
+    lease, worker, result and error.
+    """
+
+    @abc.abstractmethod
+    def enqueue(self, payload: Dict, queue: str = 'default', key: Optional[str] = None,
+                max_attempts: int = 3) -> Tuple[Dict, bool]:
+        """
+        Add a job unless one with the same key exists in the queue.
+
+        Args:
+            payload (Dict): The job, as accepted by the script's run_job.
+            queue (str): Queue name; workers of each script consume their own queue.
+            key (str, optional): Idempotency key; defaults to job_key(payload).
+            max_attempts (int): Attempts before the job is failed for good.
+
+        Returns:
+            Tuple[Dict, bool]: The job, and whether it was newly created.
+        """
+
+    @abc.abstractmethod
+    def claim(self, queue: str, worker: str, visibility_timeout: float) -> Optional[Dict]:
+        """
+        Lease the next available job to `worker`; None if no job is available.
+        """
+
+    @abc.abstractmethod
+    def extend(self, job_id: int, lease: str, visibility_timeout: float) -> bool:
+        """
+        Push back the lease expiry of a running job; False if the lease was lost.
+        """
+
+    @abc.abstractmethod
+    def complete(self, job_id: int, lease: str, result: Dict, elapsed_seconds: Optional[float] = None) -> bool:
+        """
+        Store the result of a running job; False if the lease was lost.
+        """
+
+    @abc.abstractmethod
+    def fail(self, job_id: int, lease: str, error: str, retry_delay: float = 0.0,
+             elapsed_seconds: Optional[float] = None) -> Optional[str]:
+        """
+        Record a failed attempt: the job is queued again after `retry_delay` seconds,
+        or failed if it has no attempts left.
+
+        Returns:
+            str: The job's new status, or None if the lease was lost.
+        """
+
+    @abc.abstractmethod
+    def get(self, job_id: int) -> Optional[Dict]:
+        """
+        The job with this id, or None.
+        """
+
+    @abc.abstractmethod
+    def counts(self, queue: Optional[str] = None) -> Dict[str, int]:
+        """
+        Number of jobs per status.
+        """
+
+    @abc.abstractmethod
+    def finished(self, queue: Optional[str] = None) -> Iterator[Dict]:
+        """
+        Done and failed jobs, in the order they were enqueued.
+        """
+
+    def close(self):
+        """
+        Release connections; backends without any can keep this default.
+        """
+
+
+class SQLiteQueue(QueueBackend):
+    """
+    QueueBackend in a single SQLite file, so it needs no external service.
+
+    Claims run in an immediate (write-locking) transaction, so concurrent workers in
+    any number of processes never lease the same job twice. WAL mode lets readers
+    proceed while a worker writes. Workers on several machines can share the file
+    only over a filesystem with working POSIX locks; SQLite over NFS is not one.
+
+    Args:
+        path (str): Database file; created with its schema if missing.
+        busy_timeout (float): Seconds to wait for another process's write lock.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            queue TEXT NOT NULL,
+            key TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            priority INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL,
+            available_at REAL NOT NULL,
+            lease TEXT,
+            lease_expires REAL,
+            worker TEXT,
+            result TEXT,
+            error TEXT,
+            elapsed_seconds REAL,
+            created_at REAL NOT NULL,
+            finished_at REAL,
+            UNIQUE (queue, key)
+        );
+        CREATE INDEX IF NOT EXISTS jobs_available ON jobs (queue, status, priority, available_at);
+    """
+
+    def __init__(self, path: str, busy_timeout: float = 30.0, clock: Callable[[], float] = time.time):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        # Wall-clock time: leases are compared across processes and machines
+        self.clock = clock
+        self._local = threading.local()
+        self._connection().executescript(self.SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        """
+        One connection per thread, in autocommit mode with explicit transactions.
+        """
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None)
+            connection.row_factory = sqlite3.Row
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+        return connection
+
+    @contextmanager
+    def _transaction(self):
+        """
+        A write transaction, taking the database write lock up front.
+        """
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            yield connection
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+
+    @staticmethod
+    def _job(row: Optional[sqlite3.Row]) -> Optional[Dict]:
+        if row is None:
+            return None
+        job = dict(row)
+        job['payload'] = json.loads(job['payload'])
+        job['result'] = json.loads(job['result']) if job['result'] is not None else None
+        return job
+
+    def enqueue(self, payload: Dict, queue: str = 'default', key: Optional[str] = None,
+                max_attempts: int = 3) -> Tuple[Dict, bool]:
+        key = key or job_key(payload)
+        now = self.clock()
+        with self._transaction() as connection:
+            cursor = connection.execute(
+                "INSERT OR IGNORE INTO jobs (queue, key, payload, priority, status, max_attempts, available_at, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (queue, key, json.dumps(payload), int(payload.get('priority', rate_limiter.PRIORITY_NORMAL)),
+                 QUEUED, max(1, max_attempts), now, now)
+            )
+            created = cursor.rowcount == 1
+            row = connection.execute("SELECT * FROM jobs WHERE queue = ? AND key = ?", (queue, key)).fetchone()
+        return self._job(row), created
+
+    def claim(self, queue: str, worker: str, visibility_timeout: float) -> Optional[Dict]:
+        now = self.clock()
+        lease = uuid.uuid4().hex
+        with self._transaction() as connection:
+            # Jobs whose last lease ran out with no attempts left are not retried
+            connection.execute(
+                "UPDATE jobs SET status = ?, error = COALESCE(error, 'visibility timeout expired'), "
+                "lease = NULL, finished_at = ? "
+                "WHERE queue = ? AND status = ? AND lease_expires <= ? AND attempts >= max_attempts",
+                (FAILED, now, queue, RUNNING, now)
+            )
+            row = connection.execute(
+                "SELECT id FROM jobs WHERE queue = ? AND ("
+                "(status = ? AND available_at <= ?) OR (status = ? AND lease_expires <= ?)"
+                ") ORDER BY priority, available_at, id LIMIT 1",
+                (queue, QUEUED, now, RUNNING, now)
+            ).fetchone()
+            if row is None:
+                return None
+            connection.execute(
+                "UPDATE jobs SET status = ?, attempts = attempts + 1, lease = ?, lease_expires = ?, worker = ? "
+                "WHERE id = ?",
+                (RUNNING, lease, now + visibility_timeout, worker, row['id'])
+            )
+            return self._job(connection.execute("SELECT * FROM jobs WHERE id = ?", (row['id'],)).fetchone())
+
+    def extend(self, job_id: int, lease: str, visibility_timeout: float) -> bool:
+        with self._transaction() as connection:
+            cursor = connection.execute(
+                "UPDATE jobs SET lease_expires = ? WHERE id = ? AND lease = ? AND status = ?",
+                (self.clock() + visibility_timeout, job_id, lease, RUNNING)
+            )
+            return cursor.rowcount == 1
+
+    def complete(self, job_id: int, lease: str, result: Dict, elapsed_seconds: Optional[float] = None) -> bool:
+        with self._transaction() as connection:
+            cursor = connection.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = NULL, lease = NULL, elapsed_seconds = ?, "
+                "finished_at = ? WHERE id = ? AND lease = ? AND status = ?",
+                (DONE, json.dumps(result), elapsed_seconds, self.clock(), job_id, lease, RUNNING)
+            )
+            return cursor.rowcount == 1
+
+    def fail(self, job_id: int, lease: str, error: str, retry_delay: float = 0.0,
+             elapsed_seconds: Optional[float] = None) -> Optional[str]:
+        now = self.clock()
+        with self._transaction() as connection:
+            row = connection.execute(
+                "SELECT attempts, max_attempts FROM jobs WHERE id = ? AND lease = ? AND status = ?",
+                (job_id, lease, RUNNING)
+            ).fetchone()
+            if row is None:
+                return None
+            status = QUEUED if row['attempts'] < row['max_attempts'] else FAILED
+            connection.execute(
+                "UPDATE jobs SET status = ?, error = ?, lease = NULL, lease_expires = NULL, available_at = ?, "
+                "elapsed_seconds = ?, finished_at = ? WHERE id = ?",
+                (status, error, now + retry_delay, elapsed_seconds, now if status == FAILED else None, job_id)
+            )
+            return status
+
+    def get(self, job_id: int) -> Optional[Dict]:
+        return self._job(self._connection().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone())
+
+    def counts(self, queue: Optional[str] = None) -> Dict[str, int]:
+        counts = {QUEUED: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+        query = "SELECT status, COUNT(*) AS n FROM jobs"
+        params = ()
+        if queue is not None:
+            query += " WHERE queue = ?"
+            params = (queue,)
+        for row in self._connection().execute(query + " GROUP BY status", params):
+            counts[row['status']] = row['n']
+        return counts
+
+    def finished(self, queue: Optional[str] = None) -> Iterator[Dict]:
+        query = "SELECT * FROM jobs WHERE status IN (?, ?)"
+        params = [DONE, FAILED]
+        if queue is not None:
+            query += " AND queue = ?"
+            params.append(queue)
+        for row in self._connection().execute(query + " ORDER BY id", params):
+            yield self._job(row)
+
+    def close(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+
+# URL scheme -> factory taking the rest of the URL; register other backends here
+BACKENDS = {
+    'sqlite': SQLiteQueue,
+}
+
+
+def open_queue(url: Optional[str] = None) -> QueueBackend:
+    """
+    Open the queue at `url`: "sqlite:///path/to/queue.db", or a bare file path.
+    """
+    url = url or DEFAULT_QUEUE_URL
+    scheme, separator, location = url.partition('://')
+    if not separator:
+        scheme, location = 'sqlite', url
+    elif scheme == 'sqlite':
+        # sqlite:///relative.db and sqlite:////absolute.db, as in SQLAlchemy URLs
+        location = location[1:] if location.startswith('/') else location
+    if scheme not in BACKENDS:
+        raise ValueError(f"unknown queue backend '{scheme}' (known: {', '.join(sorted(BACKENDS))})")
+    return BACKENDS[scheme](location)
+
+
+def run_worker(backend: QueueBackend, queue: str, handler: Callable[[Dict], Dict], worker: Optional[str] = None,
+               concurrency: int = 1, visibility_timeout: float = 300.0, poll_interval: float = 1.0,
+               retry_delay: float = 5.0, max_jobs: Optional[int] = None, exit_when_idle: bool = False) -> Dict:
+    """
+    Pull jobs from `queue` and run them through `handler` until stopped.
+
+    Each job runs through batch.run_one, so a failing job only affects its own
+    record. Its lease is extended in the background while it runs, so long analyses
+    are not handed to another worker. Failed attempts are retried after an
+    exponential backoff starting at `retry_delay`. SIGTERM and SIGINT stop claiming
+    new jobs and let the running ones finish.
+
+    Args:
+        backend (QueueBackend): The shared queue.
+        queue (str): Queue name to consume.
+        handler (Callable[[Dict], Dict]): Function analyzing a single job payload.
+        worker (str, optional): Worker name recorded on claimed jobs (default: host:pid).
+        concurrency (int): Jobs run at once by this process.
+        visibility_timeout (float): Seconds a claimed job stays invisible to other workers without a heartbeat.
+        poll_interval (float): Seconds to wait before polling an empty queue again.
+        retry_delay (float): Delay before the first retry of a failed job.
+        max_jobs (int, optional): Stop after this many jobs.
+        exit_when_idle (bool): Stop as soon as no job is available instead of polling.
+
+    Returns:
+        Dict: Throughput summary in the batch summary format.
+    """
+    worker = worker or f"{socket.gethostname()}:{os.getpid()}"
+    stop = threading.Event()
+    lock = threading.Lock()
+    leases = {}
+    claimed = succeeded = failed = retried = lost = 0
+    job_seconds = []
+
+    def next_job():
+        nonlocal claimed
+        with lock:
+            if max_jobs is not None and claimed >= max_jobs:
+                return None
+            claimed += 1
+        job = backend.claim(queue, worker, visibility_timeout)
+        if job is None:
+            with lock:
+                claimed -= 1
+        return job
+
+    def work():
+        nonlocal succeeded, failed, retried, lost
+        while not stop.is_set():
+            job = next_job()
+            if job is None:
+                if exit_when_idle or (max_jobs is not None and claimed >= max_jobs):
+                    return
+                stop.wait(poll_interval)
+                continue
+
+            with lock:
+                leases[job['id']] = job['lease']
+            record = batch.run_one(handler, job['payload'])
+            with lock:
+                del leases[job['id']]
+                job_seconds.append(record['elapsed_seconds'])
+
+            if record['status'] == 'ok':
+                kept = backend.complete(job['id'], job['lease'], record['result'], record['elapsed_seconds'])
+                outcome = DONE if kept else None
+            else:
+                delay = retry_delay * (2 ** (job['attempts'] - 1))
+                outcome = backend.fail(job['id'], job['lease'], record['error'], delay, record['elapsed_seconds'])
+            with lock:
+                if outcome is None:
+                    # The lease expired mid-job and another worker owns the job now
+                    lost += 1
+                elif outcome == DONE:
+                    succeeded += 1
+                elif outcome == QUEUED:
+                    retried += 1
+                else:
+                    failed += 1
+
+    def heartbeat():
+        interval = max(0.1, visibility_timeout / 3)
+        while not stop.wait(interval):
+            with lock:
+                held = list(leases.items())
+            for job_id, lease in held:
+                backend.extend(job_id, lease, visibility_timeout)
+
+    def request_stop(signum, frame):
+        stop.set()
+
+    previous_handlers = {}
+    if threading.current_thread() is threading.main_thread():
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            previous_handlers[signum] = signal.signal(signum, request_stop)
+
+    started = time.perf_counter()
+    heartbeat_thread = threading.Thread(target=heartbeat, daemon=True)
+    heartbeat_thread.start()
+    threads = [threading.Thread(target=work, daemon=True) for _ in range(max(1, concurrency))]
+    for thread in threads:
+        thread.start()
+    try:
+        # Join with a timeout so the main thread keeps handling signals
+        for thread in threads:
+            while thread.is_alive():
+                thread.join(0.5)
+    finally:
+        stop.set()
+        heartbeat_thread.join()
+        for signum, previous in previous_handlers.items():
+            signal.signal(signum, previous)
+
+    wall_seconds = time.perf_counter() - started
+    finished = succeeded + failed + retried + lost
+    return {
+        'worker': worker,
+        'queue': queue,
+        'jobs': finished,
+        'succeeded': succeeded,
+        'failed': failed,
+        'retried': retried,
+        'lost_leases': lost,
+        'concurrency': concurrency,
+        'wall_seconds': round(wall_seconds, 3),
+        'jobs_per_second': round(finished / wall_seconds, 3) if wall_seconds > 0 else 0.0,
+        'mean_job_seconds': round(sum(job_seconds) / len(job_seconds), 3) if job_seconds else 0.0,
+        'max_job_seconds': max(job_seconds) if job_seconds else 0.0
+    }
+
+
+def add_worker_arguments(parser: argparse.ArgumentParser, queue: str):
+    """
+    Command-line options of the scripts' --worker mode.
+    """
+    parser.add_argument('--queue-url', default=DEFAULT_QUEUE_URL, help="Queue location (default: SENTIFY_QUEUE_URL)")
+    parser.add_argument('--queue', default=queue, help="Queue name to consume")
+    parser.add_argument('--concurrency', '-c', type=int, default=1, help="Jobs run at once by this worker")
+    parser.add_argument('--visibility-timeout', type=float, default=300.0,
+                        help="Seconds before a job held by an unresponsive worker is handed to another")
+    parser.add_argument('--retry-delay', type=float, default=5.0, help="Seconds before the first retry of a failed job")
+    parser.add_argument('--poll-interval', type=float, default=1.0, help="Seconds between polls of an empty queue")
+    parser.add_argument('--max-jobs', type=int, help="Exit after this many jobs")
+    parser.add_argument('--exit-when-idle', action='store_true', help="Exit once the queue has no available job")
+    parser.add_argument('--quota-share', type=int,
+                        help="Hosts (or processes without shared rate-limit state) using the same API keys; "
+                             "this host gets 1/N of every rate limit, shared by its workers")
+    parser.add_argument('--quota-index', type=int,
+                        help="This host's slot among --quota-share hosts; only slot 0 keeps the API bursts")
+    parser.add_argument('--torch-threads', type=int, help="Torch intra-op threads")
+
+
+def worker_from_args(args: argparse.Namespace, handler: Callable[[Dict], Dict]) -> Dict:
+    """
+    Run a worker configured by add_worker_arguments options; returns its summary.
+    """
+    # Every worker calls the same external APIs, so they split the quotas between them:
+    # an explicit --quota-share splits across hosts, whose bucket state is not shared
+    scheduler = rate_limiter.get_scheduler()
+    if args.quota_share:
+        scheduler.share_quota(args.quota_share, args.quota_index, across_hosts=True)
+    else:
+        scheduler.share_quota(int(os.getenv('SENTIFY_WORKERS', '1')))
+    backend = open_queue(args.queue_url)
+    try:
+        return run_worker(
+            backend, args.queue, handler,
+            concurrency=args.concurrency,
+            visibility_timeout=args.visibility_timeout,
+            poll_interval=args.poll_interval,
+            retry_delay=args.retry_delay,
+            max_jobs=args.max_jobs,
+            exit_when_idle=args.exit_when_idle
+        )
+    finally:
+        backend.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the durable job queue used by the analysis workers.")
+    parser.add_argument('--queue-url', default=DEFAULT_QUEUE_URL, help="Queue location (default: SENTIFY_QUEUE_URL)")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    enqueue = commands.add_parser('enqueue', help="Add the jobs of a JSONL file; jobs already queued are skipped")
+    enqueue.add_argument('jobs', help="JSONL file of jobs ('-' for stdin)")
+    enqueue.add_argument('--queue', default='sentiment', help="'sentiment' or 'playstore' for the script workers")
+    enqueue.add_argument('--max-attempts', type=int, default=3)
+
+    status = commands.add_parser('status', help="Print the number of jobs per status")
+    status.add_argument('--queue')
+
+    results = commands.add_parser('results', help="Write finished jobs as batch-style JSONL records")
+    results.add_argument('--queue')
+    results.add_argument('--output', '-o', help="JSONL results file (default: stdout)")
+    args = parser.parse_args()
+
+    backend = open_queue(args.queue_url)
+    if args.command == 'enqueue':
+        created = 0
+        jobs = batch.read_jobs(args.jobs)
+        for job in jobs:
+            created += backend.enqueue(job, args.queue, max_attempts=args.max_attempts)[1]
+        print(json.dumps({'jobs': len(jobs), 'created': created, 'duplicates': len(jobs) - created}))
+    elif args.command == 'status':
+        print(json.dumps(backend.counts(args.queue)))
+    else:
+        output = batch.open_output(args.output)
+        for job in backend.finished(args.queue):
+            record = {'id': job['payload'].get('id'), 'key': job['key'], 'attempts': job['attempts']}
+            if job['status'] == DONE:
+                record.update({'status': 'ok', 'result': job['result']})
+            else:
+                record.update({'status': 'error', 'error': job['error']})
+            record['elapsed_seconds'] = job['elapsed_seconds']
+            output.write(json.dumps(record) + '\n')
+        if output is not sys.__stdout__:
+            output.close()
+    backend.close()
+
+
+if __name__ == "__main__":
+    main()
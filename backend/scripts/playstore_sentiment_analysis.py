@@ -8,8 +8,29 @@ import json
 import sys
 from dotenv import load_dotenv, find_dotenv
 import os
-from typing import List, Dict
+from typing import List, Dict, Optional
 from concurrent.futures import ThreadPoolExecutor
+import argparse
+import contextlib
+import io
+
+import batch
+import deadline
+import job_queue
+import prefork
+import progress
+import resources
+import sampling
+import rate_limiter
+
+# Gemini endpoint override, e.g. a local stub for load testing (see benchmarks/load_test.py)
+GEMINI_API_ENDPOINT = os.getenv('GEMINI_API_ENDPOINT')
+
+# Review scoring levels for a latency budget, richest first: the VADER/TextBlob
+# ensemble, or VADER alone
+LEVEL_COSTS = {'full': 0.01, 'vader_only': 0.002}
+SKIPPED_AT_LEVEL = {'full': [], 'vader_only': ['textblob_scoring']}
+
 
 class GooglePlaySentimentAnalyzer:
     """
@@ -23,10 +44,21 @@ class GooglePlaySentimentAnalyzer:
         Args:
             gemini_api_key (str): API key for Google Gemini.
         """
+        # Size BLAS and executor threads; no torch model here, so torch is not imported for it
+        resources.get_plan(uses_torch=False)
         self.vader = SentimentIntensityAnalyzer()
         self.nlp = spacy.load('en_core_web_sm')
-        genai.configure(api_key=gemini_api_key)
+        if GEMINI_API_ENDPOINT:
+            genai.configure(api_key=gemini_api_key, transport='rest',
+                            client_options={'api_endpoint': GEMINI_API_ENDPOINT})
+        else:
+            genai.configure(api_key=gemini_api_key)
         self.gemini_model = genai.GenerativeModel("gemini-1.5-flash")
+        # All outbound API calls go through the shared rate-limit-aware scheduler
+        self.scheduler = rate_limiter.get_scheduler()
+        # Last Gemini summary per app, the fallback when a budget rules out a new one
+        # (on disk, so the per-request processes of the API server share it)
+        self.summary_cache = deadline.get_summary_cache()
 
     def clean_text(self, text: str) -> str:
         """
@@ -83,12 +115,38 @@ class GooglePlaySentimentAnalyzer:
             'raw_scores': {'vader': vader_compound, 'textblob': textblob_score}
         }
 
-    def generate_summary(self, reviews_data: List[Dict]) -> str:
+    def get_vader_sentiment(self, text: str) -> Dict:
+        """
+        Cheap sentiment score from VADER alone, on the same 0-100 scale and labels.
+
+        Args:
+            text (str): The input text to analyze.
+
+        Returns:
+            Dict: A dictionary containing the normalized sentiment score, label, and raw VADER score.
+        """
+        vader_compound = self.vader.polarity_scores(self.clean_text(text))['compound']
+        normalized_score = int((vader_compound + 1) * 50)
+
+        sentiment_label = "Neutral"
+        if normalized_score < 35:
+            sentiment_label = "Negative"
+        elif normalized_score > 65:
+            sentiment_label = "Positive"
+
+        return {
+            'score': normalized_score,
+            'label': sentiment_label,
+            'raw_scores': {'vader': vader_compound}
+        }
+
+    def generate_summary(self, reviews_data: List[Dict], timeout: Optional[float] = None) -> str:
         """
         Generate a summary of the reviews using Google Gemini.
 
         Args:
             reviews_data (List[Dict]): A list of reviews with their content.
+            timeout (float, optional): Timeout for the Gemini request, in seconds.
 
         Returns:
             str: A concise summary of the reviews.
@@ -106,7 +164,9 @@ class GooglePlaySentimentAnalyzer:
                 "If the input is not relevant or if the summary is too short, respond with 'Error: Irrelevant content'."
                 f"\n\n{truncated_text}"
             )
-            response = self.gemini_model.generate_content(prompt)
+            request_options = {'timeout': timeout} if timeout else None
+            response = self.scheduler.call('gemini', self.gemini_model.generate_content, prompt,
+                                           request_options=request_options)
             summary = response.text.strip()
 
             # Validate summary length and relevance
@@ -126,6 +186,34 @@ class GooglePlaySentimentAnalyzer:
         except Exception as e:
             return f"Error generating summary: {str(e)}"
 
+    def summarize(self, app_id: str, reviews_data: List[Dict], time_budget: deadline.Deadline) -> str:
+        """
+        Summarize the reviews with Gemini while the budget allows it, otherwise reuse the
+        app's cached Gemini summary or fall back to an extractive one.
+
+        Args:
+            app_id (str): The Google Play Store app ID, keying the summary cache.
+            reviews_data (List[Dict]): A list of reviews with their content.
+            time_budget (deadline.Deadline): The request's deadline.
+
+        Returns:
+            str: A concise summary of the reviews.
+        """
+        if deadline.use_llm_summary(time_budget, self.scheduler.expected_wait('gemini')):
+            summary = self.generate_summary(reviews_data, time_budget.timeout(60) if time_budget.enabled else None)
+            if not summary.startswith("Error"):
+                self.summary_cache.put(app_id, summary)
+            return summary
+
+        cached = self.summary_cache.get(app_id)
+        if cached:
+            time_budget.degrade('summary', used='cached')
+            return cached
+
+        time_budget.degrade('summary', used='extractive')
+        return deadline.extractive_summary([review['content'] for review in reviews_data]) or \
+            "Error: Summary is too short or irrelevant."
+
 
 def fetch_reviews_as_dict(app_id: str, num_reviews: int = 50) -> List[Dict]:
     """
@@ -136,12 +224,16 @@ def fetch_reviews_as_dict(app_id: str, num_reviews: int = 50) -> List[Dict]:
         num_reviews (int): The number of reviews to fetch.
 
     Returns:
-        List[Dict]: A list of reviews with their content.
+        List[Dict]: A list of reviews with their content and star rating.
     """
-    result, _ = reviews(app_id, count=num_reviews)
-    return [{'content': r['content']} for r in result if r['content'] and len(r['content']) > 10]
-
-def analyze_google_play_reviews(app_id: str, gemini_api_key: str, num_reviews: int = 50) -> Dict:
+    result, _ = rate_limiter.get_scheduler().call('playstore', reviews, app_id, count=num_reviews)
+    return [{'content': r['content'], 'rating': r.get('score')}
+            for r in result if r['content'] and len(r['content']) > 10]
+
+def analyze_google_play_reviews(app_id: str, gemini_api_key: str, num_reviews: int = 50,
+                                analyzer: Optional[GooglePlaySentimentAnalyzer] = None,
+                                fast: bool = False, precision: float = 0.05,
+                                budget: Optional[float] = None, started_at: Optional[float] = None) -> Dict:
     """
     Analyze sentiment and generate a summary for Google Play Store reviews.
 
@@ -149,33 +241,115 @@ def analyze_google_play_reviews(app_id: str, gemini_api_key: str, num_reviews: i
         app_id (str): The Google Play Store app ID.
         gemini_api_key (str): API key for Google Gemini.
         num_reviews (int): The number of reviews to analyze.
+        analyzer (GooglePlaySentimentAnalyzer, optional): A shared analyzer to reuse loaded models.
+        fast (bool): Score every review with VADER only and run the full ensemble on a
+            sample stratified by star rating; aggregates come with confidence intervals.
+            The ensemble only adds TextBlob to VADER, so this saves little time.
+        precision (float): Target confidence-interval half-width for fast mode, as a fraction.
+        budget (float, optional): Latency budget in seconds. Scoring degrades to fit it
+            (fewer reviews, then VADER only) and the summary falls back to a cached or
+            extractive one; what was skipped is reported under 'deadline'.
+        started_at (float, optional): Unix time the budget started, e.g. when the API
+            server spawned this process; defaults to now.
 
     Returns:
         Dict: A dictionary containing the average sentiment, sentiment label, summary, and reviews.
     """
+    time_budget = deadline.Deadline(budget, started_at=started_at)
+
     # Fetch reviews
+    progress.report('fetching')
     reviews_data = fetch_reviews_as_dict(app_id, num_reviews)
     if not reviews_data:
         return {"error": "No reviews fetched."}
 
-    # Initialize sentiment analyzer
-    analyzer = GooglePlaySentimentAnalyzer(gemini_api_key)
-
-    # Parallel sentiment analysis using ThreadPoolExecutor
-    with ThreadPoolExecutor(max_workers=5) as executor:
-        futures = {executor.submit(analyzer.get_combined_sentiment, review['content']): review for review in reviews_data}
+    # Initialize sentiment analyzer unless a shared one was provided
+    if analyzer is None:
+        analyzer = GooglePlaySentimentAnalyzer(gemini_api_key)
+
+    # In fast mode VADER scores every review and the full ensemble only sees a sample
+    to_score = reviews_data
+    if fast:
+        for review in reviews_data:
+            review['sentiment'] = analyzer.get_vader_sentiment(review['content'])
+        strata, sample = sampling.plan_sample(
+            [review.get('rating') for review in reviews_data],
+            [review['sentiment']['score'] for review in reviews_data],
+            precision,
+            pilot_labels=[review['sentiment']['label'] for review in reviews_data]
+        )
+        sampled = sorted(i for indices in sample.values() for i in indices)
+        to_score = [reviews_data[i] for i in sampled]
+        vader_average = sum(review['sentiment']['score'] for review in reviews_data) / len(reviews_data)
+
+    # Parallel sentiment analysis using ThreadPoolExecutor, as deep as the budget allows
+    executor_threads = resources.get_plan().executor_threads
+    analysis = deadline.BudgetedAnalysis(
+        time_budget, len(to_score), deadline.summary_reserve(time_budget), parallelism=executor_threads,
+        level_costs=LEVEL_COSTS, skipped=SKIPPED_AT_LEVEL
+    )
+
+    def score(review):
+        level = analysis.next_level()
+        if level is None:
+            return None
+        scorer = analyzer.get_combined_sentiment if level == 'full' else analyzer.get_vader_sentiment
+        sentiment, seconds = deadline.time_call(scorer, review['content'])
+        analysis.observe(level, seconds)
+        return sentiment
+
+    progress.report('analyzing', 0, len(to_score))
+    scored = []
+    with ThreadPoolExecutor(max_workers=executor_threads) as executor:
+        futures = {executor.submit(score, review): review for review in to_score}
 
         # Retrieve results
-        for future in futures:
+        for processed, future in enumerate(futures, start=1):
             review = futures[future]
-            review['sentiment'] = future.result()
+            sentiment = future.result()
+            if sentiment is not None:
+                review['sentiment'] = sentiment
+                scored.append(review)
+            progress.report('analyzing', processed, len(to_score))
+    analysis.finish()
+
+    # Reviews dropped on the deadline keep their VADER score in fast mode and are left out otherwise
+    if fast:
+        scored_ids = {id(review) for review in scored}
+        sampled = [i for i in sampled if id(reviews_data[i]) in scored_ids]
+        sample = {key: [i for i in indices if id(reviews_data[i]) in scored_ids] for key, indices in sample.items()}
+        to_score = scored
+    else:
+        reviews_data = scored
+        if not reviews_data:
+            return {"error": "Latency budget exhausted before any review was analyzed.",
+                    "deadline": time_budget.report()}
 
     # Generate a summary of all reviews
-    summary = analyzer.generate_summary(reviews_data)
-
-    # Calculate average sentiment
-    sentiment_scores = [review['sentiment']['score'] for review in reviews_data]
-    avg_sentiment = sum(sentiment_scores) / len(sentiment_scores)
+    progress.report('summarizing')
+    summary = analyzer.summarize(app_id, reviews_data, time_budget)
+
+    # Calculate average sentiment (estimated from the sample in fast mode)
+    if fast:
+        estimates = sampling.estimate_aggregates(
+            strata,
+            sample,
+            {i: reviews_data[i]['sentiment']['score'] for i in sampled},
+            {i: reviews_data[i]['sentiment']['label'] for i in sampled}
+        )
+        estimates['target_precision'] = precision
+        estimates['vader_score_all_items'] = vader_average
+        # No stratum kept a scored review: fall back to the VADER average of all reviews
+        avg_sentiment = estimates['score']['estimate']
+        if avg_sentiment is None:
+            avg_sentiment = vader_average
+        for review in reviews_data:
+            review['sampled'] = False
+        for review in to_score:
+            review['sampled'] = True
+    else:
+        sentiment_scores = [review['sentiment']['score'] for review in reviews_data]
+        avg_sentiment = sum(sentiment_scores) / len(sentiment_scores)
 
     # Determine overall sentiment label
     sentiment_label = "Neutral"
@@ -185,12 +359,131 @@ def analyze_google_play_reviews(app_id: str, gemini_api_key: str, num_reviews: i
         sentiment_label = "Positive"
 
     # Return results
-    return {
+    results = {
         'average_sentiment': avg_sentiment,
         'sentiment_label': sentiment_label,
         'review_summary': summary,
         'reviews': reviews_data
     }
+    if fast:
+        results['estimates'] = estimates
+    if time_budget.enabled:
+        results['deadline'] = time_budget.report()
+    return results
+
+
+def run_job(analyzer: GooglePlaySentimentAnalyzer, job: Dict) -> Dict:
+    """
+    Analyze a single batch job with a shared analyzer.
+
+    Args:
+        analyzer (GooglePlaySentimentAnalyzer): The shared, already initialized analyzer.
+        job (Dict): A job with 'app_id' and optional 'num_reviews', 'priority', 'budget', 'fast' and 'precision'.
+
+    Returns:
+        Dict: The analysis result for the job.
+    """
+    app_id = job.get('app_id')
+    if not app_id:
+        raise ValueError("job is missing 'app_id'")
+
+    num_reviews = int(job.get('num_reviews', 50))
+    with analyzer.scheduler.priority(int(job.get('priority', rate_limiter.PRIORITY_NORMAL))):
+        return analyze_google_play_reviews(
+            app_id, None, num_reviews, analyzer=analyzer,
+            fast=bool(job.get('fast', False)), precision=float(job.get('precision', 0.05)),
+            budget=deadline.parse_budget(job.get('budget'))
+        )
+
+
+def batch_main(argv: List[str]):
+    """
+    Analyze many apps from a JSONL jobs file with one shared analyzer.
+
+    Args:
+        argv (List[str]): Command-line arguments following '--batch'.
+    """
+    parser = argparse.ArgumentParser(description="Batch Play Store review analysis over a JSONL jobs file.")
+    parser.add_argument('jobs', help="JSONL file of jobs ('-' for stdin)")
+    parser.add_argument('--output', '-o', help="JSONL results file (default: stdout)")
+    parser.add_argument('--concurrency', '-c', type=int, default=4, help="Maximum jobs in flight")
+    parser.add_argument('--prefork', type=int, metavar='N',
+                        help="Fork N worker processes sharing the loaded models instead of using threads")
+    parser.add_argument('--max-jobs-per-worker', type=int, default=100, help="Recycle a forked worker after this many jobs")
+    parser.add_argument('--torch-threads', type=int, help="Torch intra-op threads (per worker with --prefork)")
+    args = parser.parse_args(argv)
+
+    load_dotenv(find_dotenv())
+    gemini_api_key = os.getenv('GEMINI_API_KEY')
+
+    if not gemini_api_key:
+        print(json.dumps({"error": "GEMINI_API_KEY not found in environment variables."}))
+        return
+
+    jobs = batch.read_jobs(args.jobs)
+    output = batch.open_output(args.output)
+
+    # Suppress library noise; results go to the captured output stream
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        # Share the CPUs between the jobs in flight; forked workers re-plan for their own share
+        resources.set_plan(resources.plan_resources(
+            concurrent_jobs=1 if args.prefork else args.concurrency,
+            torch_threads=args.torch_threads,
+            uses_torch=False
+        ))
+        analyzer = GooglePlaySentimentAnalyzer(gemini_api_key)
+        if args.prefork:
+            summary = prefork.run_prefork(
+                jobs,
+                lambda job: run_job(analyzer, job),
+                output,
+                workers=args.prefork,
+                max_jobs_per_worker=args.max_jobs_per_worker,
+                torch_threads=args.torch_threads
+            )
+        else:
+            summary = batch.run_batch(
+                jobs,
+                lambda job: run_job(analyzer, job),
+                output,
+                concurrency=args.concurrency
+            )
+
+    if output is not sys.__stdout__:
+        output.close()
+    batch.print_summary(summary)
+
+
+def worker_main(argv: List[str]):
+    """
+    Serve Play Store jobs from the durable queue (see job_queue.py) until stopped.
+
+    Args:
+        argv (List[str]): Command-line arguments following '--worker'.
+    """
+    parser = argparse.ArgumentParser(description="Play Store review analysis worker consuming a durable job queue.")
+    job_queue.add_worker_arguments(parser, queue='playstore')
+    args = parser.parse_args(argv)
+
+    load_dotenv(find_dotenv())
+    gemini_api_key = os.getenv('GEMINI_API_KEY')
+
+    if not gemini_api_key:
+        print(json.dumps({"error": "GEMINI_API_KEY not found in environment variables."}))
+        return
+
+    # Suppress library noise; results are written to the queue
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        resources.set_plan(resources.plan_resources(
+            workers=int(os.getenv('SENTIFY_WORKERS', '1')),
+            concurrent_jobs=args.concurrency,
+            torch_threads=args.torch_threads,
+            uses_torch=False
+        ))
+        analyzer = GooglePlaySentimentAnalyzer(gemini_api_key)
+        summary = job_queue.worker_from_args(args, lambda job: run_job(analyzer, job))
+
+    batch.print_summary(summary)
 
 
 def main(query: str):
@@ -207,12 +500,21 @@ def main(query: str):
         print(json.dumps({"error": "GEMINI_API_KEY not found in environment variables."}))
         return
     
-    # Analyze reviews and print results
-    result = analyze_google_play_reviews(query, gemini_api_key)
+    # Analyze reviews and print results, within the latency budget set by the API server
+    budget = deadline.parse_budget(os.getenv('SENTIFY_BUDGET_SECONDS'))
+    started_at = deadline.parse_started_at(os.getenv('SENTIFY_STARTED_AT'))
+    result = analyze_google_play_reviews(query, gemini_api_key, budget=budget, started_at=started_at)
     print(json.dumps(result, indent=4))
 
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == '--batch':
+        batch_main(sys.argv[2:])
+        sys.exit(0)
+    if len(sys.argv) > 1 and sys.argv[1] == '--worker':
+        worker_main(sys.argv[2:])
+        sys.exit(0)
+
     # Get app ID from command-line arguments or use a default
     query = sys.argv[1] if len(sys.argv) > 1 else "com.facebook.katana"
     main(query)
\ No newline at end of file
@@ -0,0 +1,230 @@
+import gc
+import json
+import multiprocessing
+import os
+import time
+from typing import Callable, Dict, Iterable, Optional, TextIO
+
+import batch
+import rate_limiter
+import resources
+
+
+def memory_usage(pid='self') -> Dict[str, int]:
+    """
+    Memory usage of a process in kB, read from /proc.
+
+    RSS counts pages shared copy-on-write with the parent in full; PSS splits them
+    between the sharers and USS counts only the process's private pages, so PSS/USS
+    are the numbers that show what a forked worker really costs.
+
+    Args:
+        pid: Process id, or 'self'.
+
+    Returns:
+        Dict[str, int]: rss_kb, pss_kb, uss_kb and shared_kb (empty if /proc is unavailable).
+    """
+    fields = {}
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0].endswith(':') and parts[1].isdigit():
+                    fields[parts[0][:-1]] = int(parts[1])
+    except OSError:
+        try:
+            with open(f'/proc/{pid}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        return {'rss_kb': int(line.split()[1])}
+        except OSError:
+            pass
+        return {}
+
+    return {
+        'rss_kb': fields.get('Rss', 0),
+        'pss_kb': fields.get('Pss', 0),
+        'uss_kb': fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0),
+        'shared_kb': fields.get('Shared_Clean', 0) + fields.get('Shared_Dirty', 0)
+    }
+
+
+def _worker_main(handler: Callable[[Dict], Dict], tasks, results, current, max_jobs: Optional[int],
+                 plan: resources.ResourcePlan, slot: int = 0):
+    """
+    Worker loop: run jobs from `tasks` until the sentinel, or until recycled after `max_jobs`.
+
+    `current` is shared memory holding the index of the job being run, so the parent
+    can tell which job was lost if this worker dies. `slot` is the worker's position
+    in the pool; a replacement worker takes over the slot of the one it replaces.
+    """
+    # Size torch, BLAS and the analysis executors for this worker's share of the CPUs
+    resources.set_plan(plan)
+    # Keep the combined request rate of all workers within each API's quota
+    rate_limiter.get_scheduler().share_quota(plan.workers, slot)
+
+    pid = os.getpid()
+    done = 0
+    while max_jobs is None or done < max_jobs:
+        task = tasks.get()
+        if task is None:
+            break
+        index, job = task
+        current.value = index
+        results.put(('result', pid, index, batch.run_one(handler, job)))
+        done += 1
+
+    results.put(('exit', pid, None, {'jobs': done, **memory_usage()}))
+
+
+def run_prefork(jobs: Iterable[Dict], handler: Callable[[Dict], Dict], output: TextIO, workers: int = 2,
+                max_jobs_per_worker: Optional[int] = 100, torch_threads: Optional[int] = None,
+                serialize: Optional[Callable[[Dict], Dict]] = None) -> Dict:
+    """
+    Run jobs on N forked workers that share the parent's loaded models copy-on-write.
+
+    The caller loads its models (e.g. an EnhancedContentAnalyzer) before calling this,
+    and must not run inference or open network connections in the parent: torch/OpenMP
+    thread pools and gRPC channels do not survive fork. Workers are recycled after
+    `max_jobs_per_worker` jobs to bound memory growth from pages that drift away from
+    the shared copy. A job whose worker dies is reported as failed.
+
+    Args:
+        jobs (Iterable[Dict]): The jobs to run.
+        handler (Callable[[Dict], Dict]): Function analyzing a single job, closed over the loaded models.
+        output (TextIO): Stream receiving one JSON line per job.
+        workers (int): Number of worker processes.
+        max_jobs_per_worker (int, optional): Recycle a worker after this many jobs (None = never).
+        torch_threads (int, optional): Intra-op threads per worker; defaults to the resource plan's choice.
+        serialize (Callable[[Dict], Dict], optional): Hook applied to each record before writing.
+
+    Returns:
+        Dict: Throughput summary, including memory usage of every worker that exited.
+    """
+    jobs = list(jobs)
+    workers = max(1, workers)
+    plan = resources.plan_resources(workers=workers, torch_threads=torch_threads,
+                                    uses_torch=resources.get_plan().uses_torch)
+
+    context = multiprocessing.get_context('fork')
+    tasks = context.Queue()
+    # Results are written synchronously by the worker itself: a worker dying with an
+    # mp.Queue feeder thread mid-write would leave the shared write lock held forever
+    results = context.SimpleQueue()
+    for index, job in enumerate(jobs):
+        tasks.put((index, job))
+
+    # Move everything loaded so far out of the GC's reach, so collections in the
+    # workers do not touch (and thereby copy) the parent's object pages
+    gc.collect()
+    gc.freeze()
+    os.environ.setdefault('TOKENIZERS_PARALLELISM', 'false')
+
+    def spawn():
+        # Take the lowest free slot, so exactly one live worker holds slot 0
+        slot = min(set(range(workers)) - {slot for _, _, slot in processes.values()})
+        current = context.RawValue('q', -1)
+        process = context.Process(
+            target=_worker_main,
+            args=(handler, tasks, results, current, max_jobs_per_worker, plan, slot),
+            daemon=True
+        )
+        process.start()
+        processes[process.pid] = (process, current, slot)
+
+    started = time.perf_counter()
+    processes = {}
+    for _ in range(min(workers, len(jobs))):
+        spawn()
+
+    pending = len(jobs)
+    succeeded = failed = recycled = 0
+    job_seconds = []
+    completed = set()
+    worker_stats = []
+
+    def write(record):
+        if serialize is not None:
+            record = serialize(record)
+        output.write(json.dumps(record) + '\n')
+        output.flush()
+
+    def handle(kind, pid, index, payload):
+        nonlocal pending, succeeded, failed
+        if kind == 'result':
+            completed.add(index)
+            pending -= 1
+            if payload['status'] == 'ok':
+                succeeded += 1
+            else:
+                failed += 1
+            job_seconds.append(payload['elapsed_seconds'])
+            write(payload)
+        elif kind == 'exit':
+            worker_stats.append({'pid': pid, **payload})
+
+    def receive(timeout):
+        deadline = time.monotonic() + timeout
+        while results.empty():
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        handle(*results.get())
+        return True
+
+    def drain(timeout):
+        while receive(timeout):
+            pass
+
+    try:
+        while pending:
+            receive(0.5)
+
+            # Reap workers that exited (recycled or crashed) and replace them while work remains
+            for pid, (process, current, _) in list(processes.items()):
+                if process.is_alive():
+                    continue
+                process.join()
+                del processes[pid]
+                if process.exitcode == 0:
+                    recycled += 1
+                else:
+                    # Read whatever the worker sent before dying, then fail its unfinished job
+                    drain(0.2)
+                    index = current.value
+                    if index >= 0 and index not in completed:
+                        completed.add(index)
+                        pending -= 1
+                        failed += 1
+                        write({'id': jobs[index].get('id'), 'status': 'error',
+                               'error': f"worker {pid} exited with code {process.exitcode}"})
+                if len(processes) < min(workers, pending):
+                    spawn()
+    finally:
+        for _ in processes:
+            tasks.put(None)
+        deadline = time.monotonic() + 10
+        for process, _, _ in processes.values():
+            process.join(max(0.0, deadline - time.monotonic()))
+        # Collect exit stats of the workers that were still running at the end
+        drain(0.1)
+        gc.unfreeze()
+
+    wall_seconds = time.perf_counter() - started
+    return {
+        'jobs': len(jobs),
+        'succeeded': succeeded,
+        'failed': failed,
+        'concurrency': workers,
+        'workers': workers,
+        'torch_threads_per_worker': plan.torch_threads,
+        'executor_threads_per_worker': plan.executor_threads,
+        'max_jobs_per_worker': max_jobs_per_worker,
+        'recycled_workers': recycled,
+        'wall_seconds': round(wall_seconds, 3),
+        'jobs_per_second': round(len(jobs) / wall_seconds, 3) if wall_seconds > 0 else 0.0,
+        'mean_job_seconds': round(sum(job_seconds) / len(job_seconds), 3) if job_seconds else 0.0,
+        'max_job_seconds': max(job_seconds) if job_seconds else 0.0,
+        'parent_memory': memory_usage(),
+        'worker_memory': worker_stats
+    }
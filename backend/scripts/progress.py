@@ -0,0 +1,43 @@
+import json
+import os
+import sys
+import threading
+from typing import Optional
+
+# Lines starting with this prefix on stderr are progress events for the Node job API
+PROGRESS_PREFIX = 'SENTIFY_PROGRESS '
+
+_lock = threading.Lock()
+
+
+def enabled() -> bool:
+    """
+    Progress events are only emitted when the caller asked for them.
+    """
+    return os.getenv('SENTIFY_PROGRESS') == '1'
+
+
+def report(stage: str, processed: Optional[int] = None, total: Optional[int] = None):
+    """
+    Report the current pipeline stage and how many items it has processed.
+
+    Writes one prefixed JSON line to the real stderr, which the scripts otherwise
+    keep free of library noise by redirecting sys.stderr.
+
+    Args:
+        stage (str): Pipeline stage, e.g. 'fetching', 'analyzing', 'summarizing'.
+        processed (int, optional): Items processed so far in this stage.
+        total (int, optional): Items this stage will process.
+    """
+    if not enabled():
+        return
+
+    event = {'stage': stage}
+    if processed is not None:
+        event['processed'] = processed
+    if total is not None:
+        event['total'] = total
+
+    with _lock:
+        sys.__stderr__.write(PROGRESS_PREFIX + json.dumps(event) + '\n')
+        sys.__stderr__.flush()
@@ -0,0 +1,437 @@
+import heapq
+import itertools
+import json
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: no flock, buckets stay per process
+    fcntl = None
+
+# Lower value = served first
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 5
+PRIORITY_LOW = 10
+
+# (requests per second, burst) per external API. Override with SENTIFY_RATE_LIMITS,
+# e.g. "newsapi=0.5/2,gemini=0.25/1", to match the plan you are on.
+DEFAULT_LIMITS = {
+    'newsapi': (1.0, 5),
+    'reddit': (100 / 60, 10),   # PRAW OAuth clients: 100 requests per minute
+    'nominatim': (1.0, 1),      # Nominatim usage policy: at most 1 request per second
+    'gemini': (15 / 60, 1),     # gemini-1.5-flash free tier: 15 requests per minute
+    'playstore': (2.0, 5),
+}
+
+# Where the bucket state shared by all analysis processes on this host lives. The API
+# server starts a Python process per request, so per-process buckets alone would let
+# concurrent requests exceed the quotas together. Set SENTIFY_RATE_STATE_DIR to an
+# empty string to keep the buckets per process.
+DEFAULT_STATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '.ratelimit')
+
+
+class RateLimitedError(Exception):
+    """
+    Raised when an API answers with HTTP 429 (or an equivalent throttling error).
+    """
+
+    def __init__(self, message: str = "rate limited", retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """
+    A token bucket allowing `burst` requests at once and `rate` requests per second on average.
+
+    A bucket with burst 0 never stores a token: it starts one request in debt and
+    admits the next request only once the previous one is paid off, so it sends at
+    `rate` but never two requests back to back. share_quota gives it to the
+    workers that must not add to the combined burst.
+
+    Not thread-safe on its own; ApiScheduler guards it with its condition lock.
+    """
+
+    def __init__(self, rate: float, burst: int, clock: Callable[[], float] = time.monotonic):
+        if rate <= 0 or burst < 0:
+            raise ValueError("rate must be positive and burst not negative")
+        self.rate = float(rate)
+        self.burst = int(burst)
+        self.clock = clock
+        # Tokens needed to admit a request: a whole one, or a settled debt without burst
+        self.threshold = 1.0 if self.burst >= 1 else 0.0
+        self.tokens = float(burst) if self.burst >= 1 else -1.0
+        self.updated = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self) -> float:
+        """
+        Seconds until a token is available (0 if one is available now).
+        """
+        self._refill()
+        if self.tokens >= self.threshold:
+            return 0.0
+        return (self.threshold - self.tokens) / self.rate
+
+    def take(self):
+        """
+        Consume one token. Call only after wait_time() returned 0.
+        """
+        self.tokens -= 1
+
+    def try_take(self) -> float:
+        """
+        Consume a token if one is available; returns 0 if taken, else the seconds to wait.
+        """
+        wait = self.wait_time()
+        if wait <= 0:
+            self.take()
+        return wait
+
+    def drain(self):
+        """
+        Empty the bucket, e.g. after the server reported throttling.
+        """
+        self._refill()
+        self.tokens = min(self.tokens, self.threshold - 1)
+
+
+class SharedTokenBucket:
+    """
+    A token bucket whose state lives in a file, shared by every process using the same path.
+
+    Each operation locks the file (flock), refills from the elapsed time, updates the
+    state and writes it back, so concurrent processes together stay within `rate` and
+    `burst`. Time is CLOCK_MONOTONIC, which is system-wide on Linux; the file must not
+    be shared between hosts. Burst 0 works as in TokenBucket.
+
+    Args:
+        path (str): State file; created on first use.
+        rate (float): Requests per second.
+        burst (int): Maximum requests at once.
+    """
+
+    def __init__(self, path: str, rate: float, burst: int, clock: Callable[[], float] = time.monotonic):
+        if rate <= 0 or burst < 0:
+            raise ValueError("rate must be positive and burst not negative")
+        self.path = path
+        self.rate = float(rate)
+        self.burst = int(burst)
+        self.clock = clock
+        self.threshold = 1.0 if self.burst >= 1 else 0.0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    @contextmanager
+    def _state(self):
+        """
+        Lock the state file and yield the refilled state dict, written back on exit.
+        """
+        with open(self.path, 'a+') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                now = self.clock()
+                try:
+                    state = json.loads(f.read())
+                    # A state from before a reboot has a meaningless timestamp
+                    if state['updated'] > now:
+                        raise ValueError("stale state")
+                except (ValueError, KeyError, TypeError):
+                    state = {'tokens': float(self.burst) if self.burst >= 1 else -1.0, 'updated': now}
+                state['tokens'] = min(self.burst, state['tokens'] + (now - state['updated']) * self.rate)
+                state['updated'] = now
+                yield state
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps(state))
+                f.flush()
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def wait_time(self) -> float:
+        with self._state() as state:
+            return 0.0 if state['tokens'] >= self.threshold else (self.threshold - state['tokens']) / self.rate
+
+    def try_take(self) -> float:
+        """
+        Atomically consume a token if one is available; returns 0 if taken, else the seconds to wait.
+        """
+        with self._state() as state:
+            if state['tokens'] >= self.threshold:
+                state['tokens'] -= 1
+                return 0.0
+            return (self.threshold - state['tokens']) / self.rate
+
+    def drain(self):
+        with self._state() as state:
+            state['tokens'] = min(state['tokens'], self.threshold - 1)
+
+
+def parse_limits(spec: Optional[str]) -> Dict[str, Tuple[float, int]]:
+    """
+    Parse a "name=rate/burst,..." specification into a limits dict.
+
+    Args:
+        spec (str): The specification, e.g. "newsapi=0.5/2,nominatim=1/1".
+
+    Returns:
+        Dict[str, Tuple[float, int]]: Parsed (rate, burst) per API name.
+    """
+    limits = {}
+    if not spec:
+        return limits
+    for entry in spec.split(','):
+        entry = entry.strip()
+        if not entry:
+            continue
+        name, _, value = entry.partition('=')
+        rate, _, burst = value.partition('/')
+        limits[name.strip()] = (float(rate), int(burst or 1))
+    return limits
+
+
+def is_rate_limited(exc: BaseException) -> bool:
+    """
+    Recognize throttling errors raised by requests, PRAW, geopy, Gemini and urllib.
+    """
+    if isinstance(exc, RateLimitedError):
+        return True
+    if type(exc).__name__ in ('TooManyRequests', 'ResourceExhausted', 'GeocoderRateLimited'):
+        return True
+    if getattr(exc, 'code', None) == 429:
+        return True
+    response = getattr(exc, 'response', None)
+    return getattr(response, 'status_code', None) == 429
+
+
+def retry_after_seconds(exc: BaseException) -> Optional[float]:
+    """
+    Extract a server-provided retry delay from a throttling error, if any.
+    """
+    retry_after = getattr(exc, 'retry_after', None)
+    if retry_after is None:
+        response = getattr(exc, 'response', None)
+        headers = getattr(response, 'headers', None) or getattr(exc, 'headers', None) or {}
+        retry_after = headers.get('Retry-After') if hasattr(headers, 'get') else None
+    try:
+        return float(retry_after) if retry_after is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def checked_get(session, url: str, **kwargs):
+    """
+    Issue a GET request and turn an HTTP 429 response into RateLimitedError.
+
+    Args:
+        session: A requests.Session (or anything with a compatible get()).
+        url (str): The URL to fetch.
+
+    Returns:
+        The response object.
+    """
+    response = session.get(url, **kwargs)
+    if response.status_code == 429:
+        raise RateLimitedError(f"429 from {url}", retry_after_seconds(response))
+    return response
+
+
+class ApiScheduler:
+    """
+    Coordinates every outbound API call through per-API token buckets.
+
+    Callers of one process waiting on the same API are served by priority (lower
+    first), then in arrival order. With a `state_dir` the buckets are
+    SharedTokenBucket files, so all processes on the host using that directory
+    (per-request script runs, pre-fork and queue workers) share one quota per API;
+    without it each process has its own. Throttling errors are retried with
+    exponential backoff and jitter, honouring Retry-After when the server sends it.
+    """
+
+    def __init__(self, limits: Optional[Dict[str, Tuple[float, int]]] = None, max_retries: int = 3,
+                 backoff_base: float = 1.0, backoff_max: float = 30.0,
+                 clock: Callable[[], float] = time.monotonic, sleep: Callable[[float], None] = time.sleep,
+                 state_dir: Optional[str] = None):
+        self.limits = dict(DEFAULT_LIMITS)
+        self.limits.update(limits or {})
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.clock = clock
+        self.sleep = sleep
+        self.state_dir = state_dir if fcntl is not None else None
+
+        self._lock = threading.Lock()
+        self._apis = {}
+        self._sequence = itertools.count()
+        self._local = threading.local()
+        self.stats = {}
+
+    def _api(self, name: str):
+        with self._lock:
+            if name not in self._apis:
+                rate, burst = self.limits.get(name, (1.0, 1))
+                if self.state_dir:
+                    bucket = SharedTokenBucket(os.path.join(self.state_dir, f"{name}.json"), rate, burst)
+                else:
+                    bucket = TokenBucket(rate, burst, self.clock)
+                self._apis[name] = (bucket, threading.Condition(), [])
+                self.stats[name] = {'calls': 0, 'throttled': 0, 'retries': 0, 'waited_seconds': 0.0}
+            return self._apis[name]
+
+    def share_quota(self, parts: int, index: Optional[int] = None, across_hosts: bool = False):
+        """
+        Give this process an equal share of every API's quota, for `parts` processes
+        (or, with `across_hosts`, for `parts` hosts).
+
+        Each process gets 1/parts of the rate. The configured bursts must not add up
+        to more than the original. Nominatim's burst of 1, for example, cannot be
+        split. So the process with `index` 0 keeps the whole burst and every other
+        process gets burst 0 (see TokenBucket). A burst-0 process that has sat idle
+        can still send one request without waiting. Only shared bucket state
+        (`state_dir`) bounds the combined burst exactly, so splitting is the fallback
+        for processes that cannot share it, such as queue workers on other hosts.
+
+        Meant to be called in a freshly forked worker, so locks and buckets are rebuilt
+        rather than reused from the parent. With shared bucket state the processes
+        on this host already draw from one quota, so the limits are left as they are,
+        unless `across_hosts` says the parts do not share that state (the state file
+        is host-local). Then the limits are split anyway, and every process on this
+        host draws from the host's share through the shared buckets.
+
+        Args:
+            parts (int): Number of processes (or hosts) sharing the quota.
+            index (int, optional): This process's (or host's) slot; only slot 0 keeps the burst.
+            across_hosts (bool): The parts do not share this process's bucket state.
+        """
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._apis = {}
+        self.stats = {}
+        if parts > 1 and (across_hosts or not self.state_dir):
+            self.limits = {name: (rate / parts, burst if index == 0 else 0)
+                           for name, (rate, burst) in self.limits.items()}
+
+    @contextmanager
+    def priority(self, level: int):
+        """
+        Set the default priority for calls made by the current thread.
+        """
+        previous = getattr(self._local, 'priority', PRIORITY_NORMAL)
+        self._local.priority = level
+        try:
+            yield
+        finally:
+            self._local.priority = previous
+
+    def expected_wait(self, api: str) -> float:
+        """
+        Rough seconds a new caller would wait for `api`: the current token wait plus
+        one token interval per caller already queued.
+        """
+        bucket, condition, waiting = self._api(api)
+        with condition:
+            return bucket.wait_time() + len(waiting) / bucket.rate
+
+    def acquire(self, api: str, priority: Optional[int] = None):
+        """
+        Block until the caller may issue one request to `api`.
+
+        Args:
+            api (str): The API name, e.g. 'newsapi'.
+            priority (int, optional): Queue priority; defaults to the thread's priority.
+        """
+        if priority is None:
+            priority = getattr(self._local, 'priority', PRIORITY_NORMAL)
+        bucket, condition, waiting = self._api(api)
+        ticket = (priority, next(self._sequence))
+        started = time.monotonic()
+
+        with condition:
+            heapq.heappush(waiting, ticket)
+            # Let a sleeping head-of-line waiter re-check whether it is still first
+            condition.notify_all()
+            while True:
+                if waiting[0] == ticket:
+                    # Check and take atomically: a shared bucket may be drained by other processes
+                    wait = bucket.try_take()
+                    if wait <= 0:
+                        heapq.heappop(waiting)
+                        condition.notify_all()
+                        break
+                    condition.wait(wait)
+                else:
+                    condition.wait()
+
+            stats = self.stats[api]
+            stats['calls'] += 1
+            stats['waited_seconds'] += time.monotonic() - started
+
+    def _backoff(self, attempt: int, retry_after: Optional[float]) -> float:
+        if retry_after is not None:
+            return min(retry_after, self.backoff_max)
+        delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        return delay * (0.5 + random.random() / 2)
+
+    def call(self, api: str, fn: Callable, *args, priority: Optional[int] = None, **kwargs):
+        """
+        Call `fn(*args, **kwargs)` once the API's quota allows it, retrying on throttling.
+
+        Args:
+            api (str): The API name the call counts against.
+            fn (Callable): The function performing the request.
+            priority (int, optional): Queue priority; defaults to the thread's priority.
+
+        Returns:
+            Whatever `fn` returns. The last throttling error is re-raised once retries run out.
+        """
+        attempt = 0
+        while True:
+            self.acquire(api, priority)
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:
+                if not is_rate_limited(e):
+                    raise
+                bucket, condition, _ = self._api(api)
+                with condition:
+                    # The server disagrees with our accounting: stop issuing until tokens refill
+                    bucket.drain()
+                    self.stats[api]['throttled'] += 1
+                if attempt >= self.max_retries:
+                    raise
+                with condition:
+                    self.stats[api]['retries'] += 1
+                self.sleep(self._backoff(attempt, retry_after_seconds(e)))
+                attempt += 1
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> ApiScheduler:
+    """
+    Return the process-wide scheduler, configured from SENTIFY_RATE_LIMITS on first use.
+
+    Its buckets are shared with every other analysis process on the host through
+    SENTIFY_RATE_STATE_DIR (default backend/.ratelimit).
+    """
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = ApiScheduler(
+                parse_limits(os.getenv('SENTIFY_RATE_LIMITS')),
+                max_retries=int(os.getenv('SENTIFY_RATE_MAX_RETRIES', '3')),
+                state_dir=os.getenv('SENTIFY_RATE_STATE_DIR', DEFAULT_STATE_DIR) or None
+            )
+        return _scheduler
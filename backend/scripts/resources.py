@@ -0,0 +1,352 @@
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence
+
+
+def available_cpus() -> int:
+    """
+    CPUs this process may actually use: its affinity mask, further limited by a
+    cgroup CPU quota (containers) when one is set.
+    """
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+
+    quota = None
+    try:
+        # cgroup v2: "max 100000" or "<quota> <period>"
+        with open('/sys/fs/cgroup/cpu.max') as f:
+            limit, period = f.read().split()[:2]
+            if limit != 'max':
+                quota = int(limit) / int(period)
+    except (OSError, ValueError):
+        try:
+            # cgroup v1
+            with open('/sys/fs/cgroup/cpu/cpu.cfs_quota_us') as f:
+                limit = int(f.read())
+            with open('/sys/fs/cgroup/cpu/cpu.cfs_period_us') as f:
+                period = int(f.read())
+            if limit > 0:
+                quota = limit / period
+        except (OSError, ValueError):
+            pass
+
+    if quota:
+        cpus = min(cpus, max(1, int(quota)))
+    return max(1, cpus)
+
+
+class ResourcePlan:
+    """
+    How one analysis process uses its share of the CPUs.
+
+    Every item analyzed concurrently can run a torch model with `torch_threads`
+    intra-op threads, so `concurrent_jobs * executor_threads * torch_threads` is
+    kept at about the CPUs available to the process. BLAS follows torch. spaCy
+    parses a job's texts in one batch before the executors start, so each job in
+    flight may use its share of the CPUs for parser processes (see spacy_processes).
+
+    `uses_torch` is False for scripts without a torch model, which then skip
+    importing torch just to size its thread pools.
+    """
+
+    def __init__(self, cpus: int, workers: int = 1, concurrent_jobs: int = 1,
+                 torch_threads: Optional[int] = None, executor_threads: Optional[int] = None,
+                 spacy_n_process: Optional[int] = None, spacy_batch_size: int = 32, uses_torch: bool = True):
+        self.cpus = cpus
+        self.workers = max(1, workers)
+        self.concurrent_jobs = max(1, concurrent_jobs)
+        self.cpus_per_worker = max(1, cpus // self.workers)
+
+        # Small DistilRoBERTa inputs gain little from many intra-op threads; prefer
+        # running more items at once with few threads each
+        if torch_threads is None:
+            torch_threads = 1 if self.cpus_per_worker < 4 else 2
+        self.torch_threads = max(1, min(torch_threads, self.cpus_per_worker))
+        if executor_threads is None:
+            executor_threads = self.cpus_per_worker // (self.torch_threads * self.concurrent_jobs)
+        self.executor_threads = max(1, executor_threads)
+        self.blas_threads = self.torch_threads
+        # Inter-op parallelism would run on top of the executors; keep it to one thread
+        self.interop_threads = 1
+        if spacy_n_process is None:
+            spacy_n_process = self.cpus_per_worker // self.concurrent_jobs
+        self.spacy_n_process = max(1, spacy_n_process)
+        self.spacy_batch_size = spacy_batch_size
+        self.uses_torch = uses_torch
+
+    def to_dict(self) -> Dict:
+        return {
+            'cpus': self.cpus,
+            'workers': self.workers,
+            'concurrent_jobs': self.concurrent_jobs,
+            'cpus_per_worker': self.cpus_per_worker,
+            'torch_threads': self.torch_threads,
+            'executor_threads': self.executor_threads,
+            'blas_threads': self.blas_threads,
+            'interop_threads': self.interop_threads,
+            'spacy_n_process': self.spacy_n_process,
+            'spacy_batch_size': self.spacy_batch_size
+        }
+
+    def spacy_processes(self, num_texts: int) -> int:
+        """
+        spaCy parser processes for a batch of `num_texts`: one unless every process
+        gets at least a full batch (starting one costs more than a small batch), and
+        always one in a daemonic process (e.g. a pre-forked worker), which may not
+        have children.
+        """
+        if multiprocessing.current_process().daemon:
+            return 1
+        return max(1, min(self.spacy_n_process, num_texts // self.spacy_batch_size))
+
+    def apply(self):
+        """
+        Apply the thread limits to this process (torch, OpenMP/BLAS pools and the
+        environment inherited by child processes).
+
+        Call it before loading the models: torch is imported here so that its
+        intra-op and inter-op pools are sized before the first model creates them.
+        """
+        for var in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'NUMEXPR_NUM_THREADS'):
+            os.environ[var] = str(self.blas_threads)
+
+        torch = sys.modules.get('torch')
+        if torch is None and self.uses_torch:
+            try:
+                import torch
+            except ImportError:
+                pass
+        if torch is not None:
+            torch.set_num_threads(self.torch_threads)
+            try:
+                # Only allowed once, before torch has run any inter-op parallel work
+                # (a forked worker inherits the parent's setting)
+                torch.set_num_interop_threads(self.interop_threads)
+            except RuntimeError:
+                pass
+
+        try:
+            from threadpoolctl import threadpool_limits
+            threadpool_limits(limits=self.blas_threads, user_api='blas')
+        except ImportError:
+            pass
+
+
+def load_tuned(path: Optional[str], cpus_per_worker: int, uses_torch: bool = True) -> Dict:
+    """
+    Read an autotune result, ignoring it when it was measured for a different CPU share.
+
+    A result tuned without a torch model never swept torch_threads, so its value is
+    dropped for a process that runs one. Results without 'uses_torch' predate it and
+    are taken as tuned with torch.
+    """
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        tuned = json.load(f)
+    if tuned.get('cpus_per_worker') != cpus_per_worker:
+        return {}
+    if tuned.get('uses_torch', True) != uses_torch:
+        tuned = {k: v for k, v in tuned.items() if k != 'torch_threads'}
+    return tuned
+
+
+def plan_resources(workers: int = 1, concurrent_jobs: int = 1, cpus: Optional[int] = None,
+                   torch_threads: Optional[int] = None, uses_torch: bool = True) -> ResourcePlan:
+    """
+    Build the resource plan for one of `workers` processes sharing this host.
+
+    Explicit settings win over the autotune file (SENTIFY_RESOURCE_CONFIG), which wins
+    over the built-in heuristic: SENTIFY_TORCH_THREADS, SENTIFY_EXECUTOR_THREADS.
+
+    Args:
+        workers (int): Analysis processes sharing the host's CPUs.
+        concurrent_jobs (int): Jobs each process analyzes at the same time.
+        cpus (int, optional): CPU count to plan for; defaults to the CPUs available here.
+        torch_threads (int, optional): Explicit torch intra-op threads, overriding everything else.
+        uses_torch (bool): Whether the process runs a torch model.
+
+    Returns:
+        ResourcePlan: The plan for one process.
+    """
+    cpus = cpus or available_cpus()
+    tuned = load_tuned(os.getenv('SENTIFY_RESOURCE_CONFIG'), max(1, cpus // max(1, workers)), uses_torch)
+    torch_threads = torch_threads or os.getenv('SENTIFY_TORCH_THREADS') or tuned.get('torch_threads')
+    executor_threads = os.getenv('SENTIFY_EXECUTOR_THREADS') or tuned.get('executor_threads')
+    if executor_threads and not os.getenv('SENTIFY_EXECUTOR_THREADS'):
+        # Tuned for a single job at a time; split the executor between concurrent jobs
+        executor_threads = max(1, int(executor_threads) // max(1, concurrent_jobs))
+
+    return ResourcePlan(
+        cpus,
+        workers=workers,
+        concurrent_jobs=concurrent_jobs,
+        torch_threads=int(torch_threads) if torch_threads else None,
+        executor_threads=int(executor_threads) if executor_threads else None,
+        uses_torch=uses_torch
+    )
+
+
+_plan = None
+_plan_lock = threading.Lock()
+
+
+def get_plan(uses_torch: bool = True) -> ResourcePlan:
+    """
+    Return the process-wide resource plan, planned for a single process on first use.
+
+    Args:
+        uses_torch (bool): Whether the process runs a torch model (only used when planning).
+    """
+    global _plan
+    with _plan_lock:
+        if _plan is None:
+            _plan = plan_resources(workers=int(os.getenv('SENTIFY_WORKERS', '1')), uses_torch=uses_torch)
+            _plan.apply()
+        return _plan
+
+
+def set_plan(plan: ResourcePlan) -> ResourcePlan:
+    """
+    Replace and apply the process-wide plan, e.g. in a forked worker or for a batch run.
+    """
+    global _plan
+    with _plan_lock:
+        _plan = plan
+        _plan.apply()
+        return _plan
+
+
+def candidate_plans(cpus: int, workers: int = 1, uses_torch: bool = True) -> List[ResourcePlan]:
+    """
+    Plans to try when autotuning: powers of two for torch and executor threads whose
+    product stays within twice the CPUs per worker. Without a torch model only the
+    executor threads vary.
+    """
+    cpus_per_worker = max(1, cpus // workers)
+    powers = [1]
+    while powers[-1] * 2 <= cpus_per_worker:
+        powers.append(powers[-1] * 2)
+
+    plans = []
+    for torch_threads in powers if uses_torch else [1]:
+        for executor_threads in powers + [cpus_per_worker * 2 // torch_threads]:
+            if torch_threads * executor_threads <= 2 * cpus_per_worker:
+                plan = ResourcePlan(cpus, workers, torch_threads=torch_threads, executor_threads=executor_threads,
+                                    uses_torch=uses_torch)
+                if all((p.torch_threads, p.executor_threads) != (plan.torch_threads, plan.executor_threads) for p in plans):
+                    plans.append(plan)
+    return plans
+
+
+def autotune(analyze_item: Callable[[str], object], texts: Sequence[str], cpus: Optional[int] = None,
+             workers: int = 1, rounds: int = 2, log: Callable[[str], None] = lambda message: None,
+             uses_torch: bool = True) -> Dict:
+    """
+    Measure analysis throughput under each candidate plan and return the best one.
+
+    Args:
+        analyze_item (Callable[[str], object]): Full per-item analysis (sentiment, emotions, aspects).
+        texts (Sequence[str]): Representative texts to analyze.
+        cpus (int, optional): CPUs to plan for; defaults to the CPUs available here.
+        workers (int): Processes that will share the host.
+        rounds (int): Timed passes per candidate; the best pass counts.
+        log (Callable[[str], None]): Receives one progress line per candidate.
+        uses_torch (bool): Whether `analyze_item` runs a torch model; if not, torch threads are not tuned.
+
+    Returns:
+        Dict: The winning plan plus items_per_second, and every candidate's measurement.
+    """
+    cpus = cpus or available_cpus()
+    # Warm up models and lazy initialization outside the timed runs
+    for text in texts[:2]:
+        analyze_item(text)
+
+    results = []
+    for plan in candidate_plans(cpus, workers, uses_torch):
+        plan.apply()
+        best = 0.0
+        for _ in range(rounds):
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=plan.executor_threads) as executor:
+                list(executor.map(analyze_item, texts))
+            best = max(best, len(texts) / (time.perf_counter() - started))
+        results.append({**plan.to_dict(), 'items_per_second': round(best, 3)})
+        log(f"torch_threads={plan.torch_threads} executor_threads={plan.executor_threads}: {best:.2f} items/s")
+
+    winner = max(results, key=lambda r: r['items_per_second'])
+    return {**winner, 'uses_torch': uses_torch, 'candidates': results,
+            'tuned_at': time.strftime('%Y-%m-%dT%H:%M:%S')}
+
+
+SAMPLE_TEXTS = [
+    "The battery life on this phone is fantastic and the price is fair for the features.",
+    "Customer support never answered my emails, really disappointing service overall.",
+    "Shipping was quick but the build quality feels cheap and the screen scratches easily.",
+    "Honestly the best purchase I made this year, reliable and easy to use every day.",
+    "Local officials responded slowly and residents voiced serious concerns about the impact.",
+    "The update broke several features and the app keeps crashing since yesterday.",
+    "Public opinion seems split: some praise the new policy, others worry about prices.",
+    "Great value, solid reliability, and the support team fixed my issue within an hour.",
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pick CPU thread settings for the analysis scripts on this host.")
+    parser.add_argument('--autotune', action='store_true', help="Benchmark candidate settings (loads the models)")
+    parser.add_argument('--script', choices=['sentiment', 'playstore'], default='sentiment')
+    parser.add_argument('--workers', type=int, default=int(os.getenv('SENTIFY_WORKERS', '1')),
+                        help="Analysis processes that will share this host")
+    parser.add_argument('--texts', help="File with one sample text per line (default: built-in samples)")
+    parser.add_argument('--repeat', type=int, default=8, help="Repeat the sample texts this many times")
+    parser.add_argument('--output', '-o', help="Write the chosen settings here (use as SENTIFY_RESOURCE_CONFIG)")
+    args = parser.parse_args()
+
+    if not args.autotune:
+        print(json.dumps(plan_resources(workers=args.workers).to_dict(), indent=4))
+        return
+
+    if args.texts:
+        with open(args.texts) as f:
+            texts = [line.strip() for line in f if line.strip()]
+    else:
+        texts = SAMPLE_TEXTS
+    texts = texts * args.repeat
+
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        if args.script == 'sentiment':
+            import sentiment
+            analyzer = sentiment.EnhancedContentAnalyzer(*sentiment.load_credentials())
+            aspects = ["price", "features", "reliability", "support"]
+
+            def analyze_item(text):
+                analyzer.get_combined_sentiment(text)
+                analyzer.analyze_emotions(text)
+                analyzer.get_aspect_based_sentiment(text, aspects)
+        else:
+            # Play Store scoring is VADER + TextBlob: no transformer, so only the executor is tuned
+            import playstore_sentiment_analysis as playstore
+            analyzer = playstore.GooglePlaySentimentAnalyzer(os.getenv('GEMINI_API_KEY'))
+            analyze_item = analyzer.get_combined_sentiment
+
+    tuned = autotune(analyze_item, texts, workers=args.workers, uses_torch=args.script == 'sentiment',
+                     log=lambda message: print(message, file=sys.stderr))
+    tuned['script'] = args.script
+    print(json.dumps({k: v for k, v in tuned.items() if k != 'candidates'}, indent=4))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(tuned, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,312 @@
+import math
+import random
+from collections import Counter
+from statistics import NormalDist
+from typing import Dict, Hashable, List, Optional, Sequence
+
+
+# Pilot label shares are clamped to [floor, 1 - floor] when sizing a sample
+PILOT_SHARE_FLOOR = 0.1
+
+
+def z_value(confidence: float = 0.95) -> float:
+    """
+    Two-sided normal critical value for a confidence level (1.96 for 95%).
+    """
+    return NormalDist().inv_cdf(0.5 + confidence / 2)
+
+
+def _variance(values: Sequence[float]) -> float:
+    if len(values) < 2:
+        return 0.0
+    mean = sum(values) / len(values)
+    return sum((v - mean) ** 2 for v in values) / (len(values) - 1)
+
+
+def group_strata(keys: Sequence[Hashable]) -> Dict[Hashable, List[int]]:
+    """
+    Group item indices by their stratum key.
+
+    Args:
+        keys (Sequence[Hashable]): The stratum key of every item, in item order.
+
+    Returns:
+        Dict[Hashable, List[int]]: Item indices per stratum.
+    """
+    strata = {}
+    for index, key in enumerate(keys):
+        strata.setdefault(key, []).append(index)
+    return strata
+
+
+def required_sample_size(strata: Dict[Hashable, List[int]], pilot_scores: Sequence[float], precision: float,
+                         confidence: float = 0.95, score_range: float = 100.0,
+                         pilot_labels: Optional[Sequence[str]] = None) -> int:
+    """
+    Sample size needed so that both the mean score and the label shares are
+    estimated within +/- `precision` at the given confidence.
+
+    The score variance per stratum comes from the cheap scores available for every
+    item. Label shares use the variance p(1 - p) of the most uncertain label in the
+    cheap labels (p clamped to PILOT_SHARE_FLOOR), or the worst case p = 0.5 without
+    them. Both assume proportional
+    allocation and include the finite population correction. Emotion shares are not
+    part of the sizing; their intervals are simply as wide as the sample makes them.
+
+    Args:
+        strata (Dict[Hashable, List[int]]): Item indices per stratum.
+        pilot_scores (Sequence[float]): Cheap score of every item, on a 0..score_range scale.
+        precision (float): Target CI half-width, as a fraction (0.05 = 5 points on a 0-100 score, 5% of a share).
+        confidence (float): Confidence level of the intervals.
+        score_range (float): Width of the score scale.
+        pilot_labels (Sequence[str], optional): Cheap label of every item.
+
+    Returns:
+        int: The total sample size.
+    """
+    population = sum(len(indices) for indices in strata.values())
+    if population == 0:
+        return 0
+
+    z = z_value(confidence)
+    within_variance = sum(
+        len(indices) / population * _variance([pilot_scores[i] for i in indices])
+        for indices in strata.values()
+    )
+    n_score = z ** 2 * within_variance / (precision * score_range) ** 2
+    share_variance = 0.25
+    if pilot_labels:
+        shares = [count / len(pilot_labels) for count in Counter(pilot_labels).values()]
+        # The cheap labels only approximate the final ones, so no share is taken as near-certain
+        share_variance = max(p * (1 - p) for p in
+                             (min(1 - PILOT_SHARE_FLOOR, max(PILOT_SHARE_FLOOR, share)) for share in shares))
+    n_share = z ** 2 * share_variance / precision ** 2
+    n0 = max(n_score, n_share)
+
+    return min(population, math.ceil(n0 / (1 + n0 / population)))
+
+
+def allocate(strata: Dict[Hashable, List[int]], sample_size: int, min_per_stratum: int = 2) -> Dict[Hashable, int]:
+    """
+    Proportional allocation of a sample across strata, with a per-stratum minimum
+    (so every stratum's variance can be estimated) capped at the stratum size.
+
+    With many small strata (e.g. source x day) the minimum alone would exceed the
+    sample size, so it is lowered to what the sample size can afford, but never
+    below one item per stratum. Fractional shares are rounded by largest remainder,
+    so the allocation adds up to the sample size instead of overshooting it.
+    """
+    population = sum(len(indices) for indices in strata.values())
+    if not population:
+        return {key: 0 for key in strata}
+    min_per_stratum = min(min_per_stratum, max(1, sample_size // len(strata)))
+    targets = {
+        key: min(len(indices), max(min_per_stratum, sample_size * len(indices) / population))
+        for key, indices in strata.items()
+    }
+    allocation = {key: math.floor(target) for key, target in targets.items()}
+    leftover = sample_size - sum(allocation.values())
+    for key in sorted(targets, key=lambda key: allocation[key] - targets[key]):
+        if leftover <= 0:
+            break
+        if allocation[key] < targets[key]:
+            allocation[key] += 1
+            leftover -= 1
+    return allocation
+
+
+def draw_sample(strata: Dict[Hashable, List[int]], allocation: Dict[Hashable, int],
+                seed: Optional[int] = None) -> Dict[Hashable, List[int]]:
+    """
+    Draw a simple random sample of the allocated size within each stratum.
+    """
+    rng = random.Random(seed)
+    return {key: sorted(rng.sample(indices, allocation[key])) for key, indices in strata.items()}
+
+
+def _interval(estimate: float, std_error: float, z: float, low: float, high: float,
+              missing_weight: float = 0.0) -> Dict:
+    """
+    Confidence interval of an estimate over the sampled strata, widened for the strata
+    without any sampled item.
+
+    The estimate assumes the unsampled strata (`missing_weight` of the population)
+    resemble the sampled ones. The interval makes no such assumption: it spans every
+    value the unsampled strata could take, from `low` to `high`.
+    """
+    if missing_weight <= 0:
+        return {
+            'estimate': estimate,
+            'ci_low': max(low, estimate - z * std_error),
+            'ci_high': min(high, estimate + z * std_error),
+            'std_error': std_error
+        }
+    covered = 1 - missing_weight
+    return {
+        'estimate': estimate,
+        'ci_low': covered * max(low, estimate - z * std_error) + missing_weight * low,
+        'ci_high': covered * min(high, estimate + z * std_error) + missing_weight * high,
+        'std_error': std_error,
+        'unsampled_weight': missing_weight
+    }
+
+
+def _unavailable() -> Dict:
+    """
+    An estimate that cannot be made because no stratum has a sampled item.
+    """
+    return {'estimate': None, 'ci_low': None, 'ci_high': None, 'std_error': None, 'unsampled_weight': 1.0}
+
+
+def _sampled_weight(strata: Dict[Hashable, List[int]], sample: Dict[Hashable, List[int]]) -> float:
+    """
+    Population share of the strata with at least one sampled item.
+    """
+    population = sum(len(indices) for indices in strata.values())
+    covered = sum(len(indices) for key, indices in strata.items() if sample.get(key))
+    return covered / population if population else 0.0
+
+
+def stratified_mean(strata: Dict[Hashable, List[int]], sample: Dict[Hashable, List[int]],
+                    values: Dict[int, float], confidence: float = 0.95, low: float = 0.0,
+                    high: float = 100.0) -> Dict:
+    """
+    Stratified estimate of the population mean with a confidence interval.
+
+    Strata left without sampled items (e.g. dropped on a deadline) are left out of
+    the estimate: the weights are renormalized over the sampled strata, and the
+    interval is widened to cover any mean the unsampled strata could have (see
+    _interval). With no sampled stratum at all the estimate is unavailable (None).
+
+    Args:
+        strata (Dict[Hashable, List[int]]): Item indices per stratum (the population).
+        sample (Dict[Hashable, List[int]]): Sampled item indices per stratum.
+        values (Dict[int, float]): Measured value of every sampled item.
+        confidence (float): Confidence level of the interval.
+        low (float): Lower bound of the value scale, for clamping the interval.
+        high (float): Upper bound of the value scale, for clamping the interval.
+
+    Returns:
+        Dict: estimate, ci_low, ci_high and std_error (plus unsampled_weight when strata are missing).
+    """
+    covered = sum(len(indices) for key, indices in strata.items() if sample.get(key))
+    if not covered:
+        return _unavailable()
+    estimate = variance = 0.0
+    for key, indices in strata.items():
+        sampled = [values[i] for i in sample.get(key, [])]
+        if not sampled:
+            continue
+        weight = len(indices) / covered
+        fpc = 1 - len(sampled) / len(indices)
+        estimate += weight * sum(sampled) / len(sampled)
+        variance += weight ** 2 * fpc * _variance(sampled) / len(sampled)
+    return _interval(estimate, math.sqrt(variance), z_value(confidence), low, high,
+                     1 - _sampled_weight(strata, sample))
+
+
+def stratified_proportions(strata: Dict[Hashable, List[int]], sample: Dict[Hashable, List[int]],
+                           labels: Dict[int, str], confidence: float = 0.95) -> Dict[str, Dict]:
+    """
+    Stratified estimate of each label's share of the population, with confidence intervals.
+
+    Strata without sampled items are handled as in stratified_mean.
+
+    Args:
+        strata (Dict[Hashable, List[int]]): Item indices per stratum (the population).
+        sample (Dict[Hashable, List[int]]): Sampled item indices per stratum.
+        labels (Dict[int, str]): Observed label of every sampled item.
+        confidence (float): Confidence level of the intervals.
+
+    Returns:
+        Dict[str, Dict]: estimate, ci_low, ci_high and std_error per label.
+    """
+    covered = sum(len(indices) for key, indices in strata.items() if sample.get(key))
+    missing_weight = 1 - _sampled_weight(strata, sample)
+    categories = sorted(set(labels.values()))
+    z = z_value(confidence)
+    result = {}
+    for category in categories:
+        estimate = variance = 0.0
+        for key, indices in strata.items():
+            sampled = sample.get(key, [])
+            if not sampled:
+                continue
+            weight = len(indices) / covered
+            fpc = 1 - len(sampled) / len(indices)
+            share = Counter(labels[i] for i in sampled)[category] / len(sampled)
+            estimate += weight * share
+            if len(sampled) > 1:
+                variance += weight ** 2 * fpc * share * (1 - share) / (len(sampled) - 1)
+            elif fpc > 0:
+                # A single draw says nothing about spread; assume the worst case
+                variance += weight ** 2 * 0.25
+        result[category] = _interval(estimate, math.sqrt(variance), z, 0.0, 1.0, missing_weight)
+    return result
+
+
+def plan_sample(keys: Sequence[Hashable], pilot_scores: Sequence[float], precision: float = 0.05,
+                confidence: float = 0.95, seed: Optional[int] = None,
+                pilot_labels: Optional[Sequence[str]] = None):
+    """
+    Stratify items, size the sample for the target precision and draw it.
+
+    Args:
+        keys (Sequence[Hashable]): The stratum key of every item.
+        pilot_scores (Sequence[float]): Cheap 0-100 score of every item, used to size the sample.
+        precision (float): Target CI half-width as a fraction.
+        confidence (float): Confidence level of the intervals.
+        seed (int, optional): Seed for a reproducible sample.
+        pilot_labels (Sequence[str], optional): Cheap label of every item, used to size the sample.
+
+    Returns:
+        Tuple[Dict, Dict]: Item indices per stratum, and sampled indices per stratum.
+    """
+    strata = group_strata(keys)
+    size = required_sample_size(strata, pilot_scores, precision, confidence, pilot_labels=pilot_labels)
+    sample = draw_sample(strata, allocate(strata, size), seed)
+    return strata, sample
+
+
+def describe(strata: Dict[Hashable, List[int]], sample: Dict[Hashable, List[int]]) -> Dict:
+    """
+    Population and sample sizes, overall and per stratum, for reporting.
+    """
+    return {
+        'population': sum(len(indices) for indices in strata.values()),
+        'sample_size': sum(len(indices) for indices in sample.values()),
+        'strata': {
+            str(key): {'population': len(indices), 'sample': len(sample.get(key, []))}
+            for key, indices in strata.items()
+        }
+    }
+
+
+def estimate_aggregates(strata: Dict[Hashable, List[int]], sample: Dict[Hashable, List[int]],
+                        scores: Dict[int, float], labels: Dict[int, str],
+                        emotions: Optional[Dict[int, str]] = None, confidence: float = 0.95) -> Dict:
+    """
+    Aggregate score, label distribution and dominant emotion estimated from a sample.
+
+    Args:
+        strata (Dict[Hashable, List[int]]): Item indices per stratum (the population).
+        sample (Dict[Hashable, List[int]]): Sampled item indices per stratum.
+        scores (Dict[int, float]): 0-100 score of every sampled item.
+        labels (Dict[int, str]): Sentiment label of every sampled item.
+        emotions (Dict[int, str], optional): Emotion of every sampled item.
+        confidence (float): Confidence level of the intervals.
+
+    Returns:
+        Dict: Sample description plus the estimates, each with a confidence interval.
+    """
+    estimates = describe(strata, sample)
+    estimates['confidence'] = confidence
+    estimates['score'] = stratified_mean(strata, sample, scores, confidence)
+    estimates['label_distribution'] = stratified_proportions(strata, sample, labels, confidence)
+
+    if emotions:
+        distribution = stratified_proportions(strata, sample, emotions, confidence)
+        dominant = max(distribution, key=lambda emotion: distribution[emotion]['estimate'])
+        estimates['emotion_distribution'] = distribution
+        estimates['dominant_emotion'] = {'emotion': dominant, **distribution[dominant]}
+    return estimates
@@ -4,6 +4,7 @@ from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
 from textblob import TextBlob
 from transformers import pipeline
 import praw
+import prawcore
 import requests
 import spacy
 from datetime import datetime, timedelta
@@ -19,19 +20,60 @@ import sys
 import json
 import contextlib
 import io
-import math
+import argparse
+import logging
+import threading
 from dotenv import load_dotenv, find_dotenv
 import os
 from concurrent.futures import ThreadPoolExecutor 
 
+import batch
+import columnar
+import deadline
+import job_queue
+import prefork
+import progress
+import resources
+import sampling
+import rate_limiter
+
+# External endpoints; overridable to point the scripts at local stubs (see benchmarks/load_test.py)
+NEWS_API_URL = os.getenv('NEWS_API_URL', 'https://newsapi.org/v2/everything')
+NOMINATIM_DOMAIN = os.getenv('NOMINATIM_DOMAIN', 'nominatim.openstreetmap.org')
+NOMINATIM_SCHEME = os.getenv('NOMINATIM_SCHEME', 'https')
+GEMINI_API_ENDPOINT = os.getenv('GEMINI_API_ENDPOINT')
+
+logger = logging.getLogger(__name__)
+
+# Errors of a content request that leave the analysis running on the other sources
+FETCH_ERRORS = (rate_limiter.RateLimitedError, requests.RequestException, prawcore.PrawcoreException, ValueError)
+
+def source_failure(source, error):
+    """
+    Describe a content source that failed, once the scheduler's retries ran out,
+    for the 'source_failures' of a result.
+    """
+    reason = 'throttled' if rate_limiter.is_rate_limited(error) else 'request_failed'
+    logger.warning("%s fetch failed (%s): %s", source, reason, error)
+    return {'source': source, 'reason': reason, 'error': str(error)}
+
 class EnhancedContentAnalyzer:
     def __init__(self, reddit_credentials, news_api_key, gemini_api_key):
         """
         Initialize the EnhancedContentAnalyzer with necessary credentials and models.
         """
         self.vader = SentimentIntensityAnalyzer()
-        self.reddit = praw.Reddit(**reddit_credentials)
+        self.reddit_credentials = reddit_credentials
         self.news_api_key = news_api_key
+        # Reddit client and HTTP session per thread (see the reddit and session properties)
+        self._clients = threading.local()
+        # All outbound API calls go through the shared rate-limit-aware scheduler
+        self.scheduler = rate_limiter.get_scheduler()
+        # Size torch/BLAS threads before the models spin up their thread pools
+        resources.get_plan()
+        # Last Gemini summary per request, the fallback when a budget rules out a new one
+        # (on disk, so the per-request processes of the API server share it)
+        self.summary_cache = deadline.get_summary_cache()
         self.nlp = spacy.load('en_core_web_sm')
         
         # Initialize models
@@ -45,9 +87,33 @@ class EnhancedContentAnalyzer:
             range(35, 65): "Neutral",
             range(65, 101): "Positive"
         }
-        genai.configure(api_key=gemini_api_key)
+        if GEMINI_API_ENDPOINT:
+            genai.configure(api_key=gemini_api_key, transport='rest',
+                            client_options={'api_endpoint': GEMINI_API_ENDPOINT})
+        else:
+            genai.configure(api_key=gemini_api_key)
         self.gemini_model = genai.GenerativeModel("gemini-1.5-flash")
 
+    @property
+    def reddit(self):
+        """
+        This thread's PRAW client. praw.Reddit is not thread-safe (its rate-limit state
+        and OAuth token refresh are shared), so the threads of a batch or queue worker
+        each get their own, while still sharing the models.
+        """
+        if not hasattr(self._clients, 'reddit'):
+            self._clients.reddit = praw.Reddit(**self.reddit_credentials)
+        return self._clients.reddit
+
+    @property
+    def session(self):
+        """
+        This thread's HTTP session, reusing connections across the jobs the thread runs.
+        """
+        if not hasattr(self._clients, 'session'):
+            self._clients.session = requests.Session()
+        return self._clients.session
+
     def clean_text(self, text):
         """
         Clean and preprocess text by removing URLs, mentions, hashtags, and retaining important tokens.
@@ -102,11 +168,35 @@ class EnhancedContentAnalyzer:
             }
         }
 
-    def get_aspect_based_sentiment(self, text, aspects):
+    def get_vader_sentiment(self, text):
+        """
+        Cheap sentiment score from VADER alone, on the same 0-100 scale and labels.
+        """
+        vader_compound = self.vader.polarity_scores(self.clean_text(text))['compound']
+        normalized_score = int((vader_compound + 1) * 50)
+        
+        sentiment_label = next(
+            (label for range_obj, label in self.sentiment_labels.items() 
+             if normalized_score in range_obj),
+            "Neutral"
+        )
+        
+        return {
+            'score': normalized_score,
+            'label': sentiment_label,
+            'raw_scores': {
+                'vader': vader_compound
+            }
+        }
+
+    def get_aspect_based_sentiment(self, text, aspects, doc=None):
         """
         Perform aspect-based sentiment analysis on the given text.
+
+        Pass `doc` when the text was already parsed (e.g. in a batch by parse_texts).
         """
-        doc = self.nlp(text)
+        if doc is None:
+            doc = self.nlp(text)
         aspect_sentiments = {}
         
         for aspect in aspects:
@@ -130,6 +220,26 @@ class EnhancedContentAnalyzer:
         
         return aspect_sentiments
 
+    def analyze_item(self, text, aspects, doc=None, level='full'):
+        """
+        Sentiment, emotions and aspect sentiments of one text, down to the given level
+        (see deadline.LEVEL_COSTS): 'no_aspects' skips aspects, 'vader_only' also skips
+        TextBlob and the emotion model.
+        """
+        if level == 'vader_only':
+            return self.get_vader_sentiment(text), None, {}
+        sentiment = self.get_combined_sentiment(text)
+        emotions = self.analyze_emotions(text)
+        aspect_sentiments = self.get_aspect_based_sentiment(text, aspects, doc) if level == 'full' else {}
+        return sentiment, emotions, aspect_sentiments
+
+    def parse_texts(self, texts):
+        """
+        Parse texts with spaCy in batches, sized by the process resource plan.
+        """
+        plan = resources.get_plan()
+        return list(self.nlp.pipe(texts, n_process=plan.spacy_processes(len(texts)), batch_size=plan.spacy_batch_size))
+
     def analyze_emotions(self, text):
         """
         Analyze emotions in the given text using a pre-trained emotion classification model.
@@ -173,11 +283,14 @@ class EnhancedContentAnalyzer:
         
         return unique_indices
 
-    def fetch_news(self, query, days=7):
+    def fetch_news(self, query, days=7, timeout=None, failures=None):
         """
         Fetch news articles from NewsAPI for the given query.
+
+        A failed request (throttled past the retries, or a network error) yields no
+        articles and is appended to `failures` (see source_failure).
         """
-        url = 'https://newsapi.org/v2/everything'
+        url = NEWS_API_URL
         date_from = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
         
         params = {
@@ -189,7 +302,8 @@ class EnhancedContentAnalyzer:
         }
         
         try:
-            response = requests.get(url, params=params)
+            response = self.scheduler.call('newsapi', rate_limiter.checked_get, self.session, url,
+                                           params=params, timeout=timeout)
             articles = response.json().get('articles', [])
             return [{
                 'source': 'news',
@@ -198,7 +312,9 @@ class EnhancedContentAnalyzer:
                 'url': article['url'],
                 'published_at': article['publishedAt']
             } for article in articles[:10]]
-        except:
+        except FETCH_ERRORS as e:
+            if failures is not None:
+                failures.append(source_failure('newsapi', e))
             return []
 
     def fetch_reddit_posts(self, query, limit=10):
@@ -208,7 +324,9 @@ class EnhancedContentAnalyzer:
         posts = []
         subreddit = self.reddit.subreddit('all')
         
-        for post in subreddit.search(query, sort='relevance', limit=limit):
+        # PRAW listings are lazy; materialize them inside the scheduled call
+        results = self.scheduler.call('reddit', lambda: list(subreddit.search(query, sort='relevance', limit=limit)))
+        for post in results:
             posts.append({
                 'source': 'reddit',
                 'title': post.title,
@@ -219,15 +337,31 @@ class EnhancedContentAnalyzer:
             
         return posts
         
-    def fetch_content(self, query, limit=50):
+    def fetch_content(self, query, limit=50, time_budget=None, failures=None):
         """
         Fetch and aggregate content from multiple sources (NewsAPI and Reddit).
+
+        With a `time_budget` (deadline.Deadline) the NewsAPI request is bounded by the
+        remaining time and Reddit is skipped when its rate limit would queue past it.
+        Sources that failed are appended to `failures`, and the others are used alone.
         """
+        time_budget = time_budget or deadline.Deadline()
+        
         # Fetch news articles
-        news_articles = self.fetch_news(query)
+        news_articles = self.fetch_news(query, timeout=time_budget.timeout(10) if time_budget.enabled else None,
+                                        failures=failures)
         
         # Fetch Reddit posts
-        reddit_posts = self.fetch_reddit_posts(query, limit=limit)
+        if time_budget.has_time(self.scheduler.expected_wait('reddit') + deadline.SUMMARY_RESERVE_SECONDS):
+            try:
+                reddit_posts = self.fetch_reddit_posts(query, limit=limit)
+            except FETCH_ERRORS as e:
+                if failures is not None:
+                    failures.append(source_failure('reddit', e))
+                reddit_posts = []
+        else:
+            time_budget.skip('reddit_fetch')
+            reddit_posts = []
         
         # Combine all content
         all_content = news_articles + reddit_posts
@@ -266,9 +400,13 @@ class EnhancedContentAnalyzer:
             'confidence': confidence
         }
 
-    def generate_summary(self, content_items):
+    def generate_summary(self, content_items, analyzed=None, timeout=None, rows=None):
         """
         Generate a summary of the content using Google Gemini.
+
+        Pass `analyzed` (a columnar.ColumnarResults of the items, optionally restricted
+        to `rows`) to reuse their scores instead of re-running the models, and `timeout`
+        to bound the Gemini request.
         """
         if not content_items:  # Handle empty input
             return "No content available for summary generation."
@@ -287,86 +425,190 @@ class EnhancedContentAnalyzer:
                 "Ensure the summary is concise and covers the main aspects of the text."
                 f"\n\n{truncated_text}"
             )
-            response = self.gemini_model.generate_content(prompt)
+            request_options = {'timeout': timeout} if timeout else None
+            response = self.scheduler.call('gemini', self.gemini_model.generate_content, prompt,
+                                           request_options=request_options)
             initial_summary = response.text.strip()
 
-            # Analyze emotions in the content
-            emotions = [self.analyze_emotions(item['text']) for item in content_items]
-            dominant_emotion = Counter(
-                [e['emotion'] for e in emotions]
-            ).most_common(1)[0][0]
-            
-            # Calculate overall sentiment
-            sentiments = [self.get_combined_sentiment(item['text'])['score'] 
-                        for item in content_items]
-            avg_sentiment = np.mean(sentiments)
-            
-            sentiment_label = next(
-                (label for range_obj, label in self.sentiment_labels.items() 
-                 if int(avg_sentiment) in range_obj),
-                "Neutral"
-            )
-            
             # Enhanced summary with insights
-            enhanced_summary = (
-                f"{initial_summary}\n\n"
-                f"Overall Sentiment: {sentiment_label} ({avg_sentiment:.1f}/100)\n"
-                f"Dominant Emotion: {dominant_emotion.title()}"
-            )
-            
-            return enhanced_summary
+            return f"{initial_summary}\n\n{self.summary_insights(content_items, analyzed, rows)}"
             
         except Exception as e:
             return f"Error generating summary: {str(e)}"
+
+    def summary_insights(self, content_items, analyzed=None, rows=None):
+        """
+        Overall sentiment and dominant emotion lines for a summary.
+        """
+        if analyzed is None:
+            # Analyze emotions and overall sentiment in the content
+            emotions = [self.analyze_emotions(item['text'])['emotion'] for item in content_items]
+            dominant_emotion = Counter(emotions).most_common(1)[0][0]
+            avg_sentiment = np.mean([self.get_combined_sentiment(item['text'])['score'] 
+                                     for item in content_items])
+        else:
+            dominant_emotion = analyzed.dominant_emotion(rows)
+            avg_sentiment = analyzed.mean_score(rows)
         
-    def analyze_query(self, query, aspects=None):
+        sentiment_label = next(
+            (label for range_obj, label in self.sentiment_labels.items() 
+             if int(avg_sentiment) in range_obj),
+            "Neutral"
+        )
+        
+        return (
+            f"Overall Sentiment: {sentiment_label} ({avg_sentiment:.1f}/100)\n"
+            f"Dominant Emotion: {dominant_emotion.title()}"
+        )
+
+    def summarize(self, content_items, analyzed, time_budget, cache_key, rows=None):
+        """
+        Summary of the analyzed items: from Gemini while the budget allows it, otherwise
+        the cached Gemini summary of the same request or an extractive one.
+        """
+        if not content_items:
+            return "No content available for summary generation."
+        
+        if deadline.use_llm_summary(time_budget, self.scheduler.expected_wait('gemini')):
+            timeout = time_budget.timeout(60) if time_budget.enabled else None
+            summary = self.generate_summary(content_items, analyzed, timeout, rows)
+            if not summary.startswith("Error generating summary"):
+                self.summary_cache.put(cache_key, summary)
+            return summary
+        
+        cached = self.summary_cache.get(cache_key)
+        if cached:
+            time_budget.degrade('summary', used='cached')
+            return cached
+        
+        time_budget.degrade('summary', used='extractive')
+        extract = deadline.extractive_summary([item['text'] for item in content_items])
+        return f"{extract}\n\n{self.summary_insights(content_items, analyzed, rows)}"
+        
+    def get_stratum(self, item):
+        """
+        Sampling stratum of a content item: its source, and its publication day where known.
+        """
+        published_at = item.get('published_at') or ''
+        return f"{item['source']}/{published_at[:10]}" if published_at else item['source']
+
+    def analyze_query(self, query, aspects=None, fast=False, precision=0.05, budget=None,
+                      result_format='records', started_at=None):
         """
         Analyze content for the given query and aspects.
+
+        With fast=True the emotion and aspect models only run on a stratified sample
+        sized for the target precision, and the aggregates are reported with
+        confidence intervals under 'estimates'.
+
+        With a latency `budget` in seconds the pipeline degrades to fit it: fewer
+        items, then no aspect analysis, then VADER-only scoring, then a cached or
+        extractive summary instead of Gemini. What was skipped is reported under
+        'deadline'. `started_at` (Unix time) starts the budget clock earlier, e.g.
+        when the API server spawned this process.
+
+        result_format='columns' returns the items in the compact column-oriented form
+        under 'columns' instead of 'analyzed_content' records.
         """
         if aspects is None:
             aspects = ["price", "quality", "features", "service"]
+        time_budget = deadline.Deadline(budget, started_at=started_at)
         
         # Fetch and analyze content
-        content_items = self.fetch_content(query)
-        
-        # Analyze each piece of content
-        analyzed_content = []
-        for item in content_items:
-            sentiment = self.get_combined_sentiment(item['text'])
-            emotions = self.analyze_emotions(item['text'])
-            aspect_sentiments = self.get_aspect_based_sentiment(item['text'], aspects)
-            
-            analyzed_content.append({
-                'source': item['source'],
-                'title': item.get('title', ''),
-                'url': item.get('url', ''),
-                'sentiment': sentiment,
-                'emotions': emotions,
-                'aspect_sentiments': aspect_sentiments
-            })
+        progress.report('fetching')
+        source_failures = []
+        content_items = self.fetch_content(query, time_budget=time_budget, failures=source_failures)
+        
+        # In fast mode VADER scores every item and the expensive models see only a sample
+        sampled = set(range(len(content_items)))
+        if fast and content_items:
+            pilot = [self.get_vader_sentiment(item['text']) for item in content_items]
+            strata, sample = sampling.plan_sample(
+                [self.get_stratum(item) for item in content_items],
+                [p['score'] for p in pilot],
+                precision,
+                pilot_labels=[p['label'] for p in pilot]
+            )
+            sampled = {i for indices in sample.values() for i in indices}
+        
+        # Analyze each piece of content, as deeply as the budget allows
+        selected = sorted(sampled)
+        analysis = deadline.BudgetedAnalysis(time_budget, len(selected), deadline.summary_reserve(time_budget))
+        # Under a budget, parse lazily so that dropped items are never parsed
+        docs = {} if time_budget.enabled else dict(zip(selected, self.parse_texts([content_items[i]['text'] for i in selected])))
+        results_by_index = {}
+        progress.report('analyzing', 0, len(selected))
+        for index in selected:
+            level = analysis.next_level()
+            if level is None:
+                break
+            results_by_index[index], seconds = deadline.time_call(
+                self.analyze_item, content_items[index]['text'], aspects, docs.get(index), level
+            )
+            analysis.observe(level, seconds)
+            progress.report('analyzing', len(results_by_index), len(selected))
+        analysis.finish()
+        
+        # Collect the results column by column; records are only built for the response
+        table = columnar.ColumnarResults(aspects, track_sampled=fast, capacity=len(content_items))
+        for index, item in enumerate(content_items):
+            if index in results_by_index:
+                table.append(item, *results_by_index[index])
+            elif fast:
+                table.append(item, pilot[index], None, {}, sampled=False)
+            # Otherwise the item was dropped on the deadline
         
         # Generate overall summary
-        summary = self.generate_summary(content_items)
+        progress.report('summarizing')
+        analyzed = sorted(results_by_index)
+        summary = self.summarize(
+            [content_items[i] for i in analyzed],
+            table,
+            time_budget,
+            ('query', query),
+            rows=table.sampled if fast else None
+        )
         
-        # Calculate aggregated metrics
-        sentiments = [item['sentiment']['score'] for item in analyzed_content]
+        # Calculate aggregated metrics (on the uniform VADER scores in fast mode)
+        if fast and content_items:
+            sentiments = np.array([p['score'] for p in pilot])
+        else:
+            sentiments = table.scores[:len(table)]
         trend = self.predict_trend(sentiments)
+        aspect_means, _ = table.aspect_means()
         
-        return {
+        results = {
             'summary': summary,
-            'analyzed_content': analyzed_content,
+            **columnar.content_fields(table, result_format),
             'trend': trend,
             'aspects': {
-                aspect: {
-                    'avg_score': np.mean([
-                        content['aspect_sentiments'].get(aspect, {}).get('score', 0)
-                        for content in analyzed_content
-                        if aspect in content['aspect_sentiments']
-                    ])
-                }
-                for aspect in aspects
+                aspect: {'avg_score': columnar.float_or_none(mean)}
+                for aspect, mean in zip(aspects, aspect_means)
             }
         }
+        
+        if fast and content_items:
+            # Items dropped on the deadline leave the sample; strata left empty widen the intervals
+            sample = {key: [i for i in indices if i in results_by_index] for key, indices in sample.items()}
+            emotions = {i: results_by_index[i][1]['emotion'] for i in analyzed if results_by_index[i][1]}
+            results['estimates'] = sampling.estimate_aggregates(
+                strata,
+                sample,
+                {i: results_by_index[i][0]['score'] for i in analyzed},
+                {i: results_by_index[i][0]['label'] for i in analyzed},
+                emotions if len(emotions) == len(analyzed) else None
+            )
+            results['estimates']['target_precision'] = precision
+            results['estimates']['vader_score_all_items'] = float(np.mean(sentiments))
+        
+        if source_failures:
+            # Missing sources skew the sentiment; do not let them pass for "no news"
+            results['degraded'] = True
+            results['source_failures'] = source_failures
+        if time_budget.enabled:
+            results['deadline'] = time_budget.report()
+        
+        return results
 
 class LocationBasedAnalyzer(EnhancedContentAnalyzer):
     def __init__(self, reddit_credentials, news_api_key, gemini_api_key):
@@ -374,7 +616,7 @@ class LocationBasedAnalyzer(EnhancedContentAnalyzer):
         Initialize the LocationBasedAnalyzer with geolocation capabilities.
         """
         super().__init__(reddit_credentials, news_api_key, gemini_api_key)
-        self.geocoder = Nominatim(user_agent="AI-lluminati-location")
+        self.geocoder = Nominatim(user_agent="AI-lluminati-location", domain=NOMINATIM_DOMAIN, scheme=NOMINATIM_SCHEME)
         
     def get_location_info(self, location: str) -> Dict:
         """
@@ -382,7 +624,7 @@ class LocationBasedAnalyzer(EnhancedContentAnalyzer):
         """
         try:
             # Geocode the location
-            location_data = self.geocoder.geocode(location, language='en')
+            location_data = self.scheduler.call('nominatim', self.geocoder.geocode, location, language='en')
             if not location_data:
                 return None
             
@@ -455,14 +697,17 @@ class LocationBasedAnalyzer(EnhancedContentAnalyzer):
                 
         return list(set(subreddits))
 
-    def fetch_location_news(self, query: str, location_info: Dict, days: int = 7) -> List[Dict]:
+    def fetch_location_news(self, query: str, location_info: Dict, days: int = 7,
+                            timeout: Optional[float] = None, failures: Optional[List[Dict]] = None) -> List[Dict]:
         """
         Fetch news articles specific to a location.
+
+        A failed request yields no articles and is appended to `failures`, as in fetch_news.
         """
         if not location_info:
             return []
             
-        url = 'https://newsapi.org/v2/everything'
+        url = NEWS_API_URL
         date_from = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
         
         # Create location-specific query
@@ -488,7 +733,8 @@ class LocationBasedAnalyzer(EnhancedContentAnalyzer):
         }
         
         try:
-            response = requests.get(url, params=params)
+            response = self.scheduler.call('newsapi', rate_limiter.checked_get, self.session, url,
+                                           params=params, timeout=timeout)
             articles = response.json().get('articles', [])
             return [{
                 'source': 'news',
@@ -498,23 +744,36 @@ class LocationBasedAnalyzer(EnhancedContentAnalyzer):
                 'published_at': article['publishedAt'],
                 'location': location_info['formatted_address']
             } for article in articles[:15] if article.get('description')]
-        except Exception as e:
+        except FETCH_ERRORS as e:
+            if failures is not None:
+                failures.append(source_failure('newsapi', e))
             return []
 
-    def fetch_location_reddit_content(self, query: str, location_info: Dict, limit: int = 15) -> List[Dict]:
+    def fetch_location_reddit_content(self, query: str, location_info: Dict, limit: int = 15,
+                                      time_budget: Optional[deadline.Deadline] = None,
+                                      failures: Optional[List[Dict]] = None) -> List[Dict]:
         """
         Fetch Reddit content specific to a location.
+
+        With a `time_budget` the remaining subreddits are skipped once the Reddit rate
+        limit would queue past it. Guessed subreddits that do not exist are skipped;
+        throttled searches are appended to `failures`.
         """
         if not location_info:
             return []
             
+        time_budget = time_budget or deadline.Deadline()
         location_subreddits = self.get_location_subreddits(location_info)
         posts = []
         
-        for subreddit_name in location_subreddits:
+        for searched, subreddit_name in enumerate(location_subreddits):
+            if not time_budget.has_time(self.scheduler.expected_wait('reddit') + deadline.SUMMARY_RESERVE_SECONDS):
+                time_budget.degrade('reddit_fetch', searched=searched, available=len(location_subreddits))
+                break
             try:
                 subreddit = self.reddit.subreddit(subreddit_name)
-                for post in subreddit.search(query, sort='relevance', limit=limit):
+                results = self.scheduler.call('reddit', lambda: list(subreddit.search(query, sort='relevance', limit=limit)))
+                for post in results:
                     posts.append({
                         'source': 'reddit',
                         'subreddit': subreddit_name,
@@ -525,29 +784,54 @@ class LocationBasedAnalyzer(EnhancedContentAnalyzer):
                         'location': location_info['formatted_address']
                     })
             except Exception as e:
+                if rate_limiter.is_rate_limited(e):
+                    if failures is not None:
+                        failures.append(source_failure(f"reddit:{subreddit_name}", e))
+                else:
+                    logger.debug("Skipping r/%s: %s", subreddit_name, e)
                 continue
                 
         return posts
 
-    def analyze_location_insights(self, query: str, location: str, aspects: Optional[List[str]] = None) -> Dict:
+    def analyze_location_insights(self, query: str, location: str, aspects: Optional[List[str]] = None,
+                                  budget: Optional[float] = None, result_format: str = 'records',
+                                  started_at: Optional[float] = None) -> Dict:
         """
         Analyze content for a specific location.
+
+        With a latency `budget` in seconds the pipeline degrades to fit it, as in
+        analyze_query, and reports what was skipped under 'deadline'. result_format
+        and started_at are as in analyze_query.
         """
         if aspects is None:
             aspects = ["impact", "local_response", "public_opinion", "concerns"]
+        time_budget = deadline.Deadline(budget, started_at=started_at)
             
         # Get location information
+        progress.report('geocoding')
         location_info = self.get_location_info(location)
         if not location_info:
             return {"error": f"Could not find location information for {location}"}
             
         # Fetch location-specific content
-        news_articles = self.fetch_location_news(query, location_info)
-        reddit_posts = self.fetch_location_reddit_content(query, location_info)
+        progress.report('fetching')
+        source_failures = []
+        news_articles = self.fetch_location_news(
+            query, location_info, timeout=time_budget.timeout(10) if time_budget.enabled else None,
+            failures=source_failures
+        )
+        reddit_posts = self.fetch_location_reddit_content(query, location_info, time_budget=time_budget,
+                                                          failures=source_failures)
         
         # Combine and deduplicate content
         all_content = news_articles + reddit_posts
         if not all_content:
+            if source_failures:
+                return {
+                    "error": f"Content sources failed for {query} in {location}",
+                    "location_info": location_info,
+                    "source_failures": source_failures
+                }
             return {
                 "error": f"No content found for {query} in {location}",
                 "location_info": location_info
@@ -557,83 +841,80 @@ class LocationBasedAnalyzer(EnhancedContentAnalyzer):
         unique_indices = self.deduplicate_content(unique_texts)
         content_items = [all_content[i] for i in unique_indices]
         
-        with ThreadPoolExecutor(max_workers=5) as executor:
-            futures = {}
-            analyzed_content = []
-            for item in content_items:
-                futures[executor.submit(self.get_combined_sentiment, item['text'])] = ('sentiment', item)
-                futures[executor.submit(self.analyze_emotions, item['text'])] = ('emotions', item)
-                futures[executor.submit(self.get_aspect_based_sentiment, item['text'], aspects)] = ('aspect_sentiments', item)
-
-            for future in futures:
-                analysis_type, item = futures[future]
-                item[analysis_type] = future.result()
-
-                if analysis_type == 'aspect_sentiments':
-                    analyzed_content.append({
-                        'source': item['source'],
-                        'title': item.get('title', ''),
-                        'url': item.get('url', ''),
-                        'location': item.get('location', ''),
-                        'sentiment': item.get('sentiment', {}),
-                        'emotions': item.get('emotions', {}),
-                        'aspect_sentiments': item.get('aspect_sentiments', {})
-                    })
+        progress.report('analyzing', 0, len(content_items))
+        # Parse once in a spaCy batch (lazily under a budget, so dropped items are never
+        # parsed), then size the executor so that concurrent torch inference does not
+        # oversubscribe the CPUs
+        docs = [None] * len(content_items) if time_budget.enabled else self.parse_texts([item['text'] for item in content_items])
+        executor_threads = resources.get_plan().executor_threads
+        analysis = deadline.BudgetedAnalysis(
+            time_budget, len(content_items), deadline.summary_reserve(time_budget), parallelism=executor_threads
+        )
+        
+        def analyze(item, doc):
+            level = analysis.next_level()
+            if level is None:
+                return None
+            result, seconds = deadline.time_call(self.analyze_item, item['text'], aspects, doc, level)
+            analysis.observe(level, seconds)
+            return result
+        
+        table = columnar.ColumnarResults(aspects, fields=('source', 'title', 'url', 'location'),
+                                         capacity=len(content_items))
+        with ThreadPoolExecutor(max_workers=executor_threads) as executor:
+            futures = [executor.submit(analyze, item, doc) for item, doc in zip(content_items, docs)]
+            analyzed_items = []
+            for item, future in zip(content_items, futures):
+                result = future.result()
+                if result is None:
+                    # Dropped on the deadline
+                    continue
+                table.append(item, *result)
+                analyzed_items.append(item)
+                progress.report('analyzing', len(table), len(content_items))
+        analysis.finish()
             
         # Generate location-specific summary
         location_context = (
             f"The following summary is based on content from {location_info['formatted_address']}. "
             f"Consider the local context and perspectives when interpreting the information."
         )
-        summary = self.generate_summary(content_items)
+        progress.report('summarizing')
+        summary = self.summarize(analyzed_items, table, time_budget, ('location', query, location))
         enhanced_summary = f"{location_context}\n\n{summary}"
         
-        # Calculate aspect averages
-        aspect_averages = {}
-        for aspect in aspects:
-            scores = []
-            for content in analyzed_content:
-                if aspect in content['aspect_sentiments']:
-                    aspect_score = content['aspect_sentiments'][aspect].get('score', 0)
-                    if aspect_score > 0:
-                        scores.append(aspect_score)
-            
-            if scores:
-                aspect_averages[aspect] = {
-                    'avg_score': np.mean(scores),
-                    'count': len(scores)
-                }
-            else:
-                aspect_averages[aspect] = {
-                    'avg_score': 0,
-                    'count': 0
-                }
+        # Calculate aspect averages over the positive aspect scores
+        aspect_means, aspect_counts = table.aspect_means(min_score=0)
+        aspect_averages = {
+            aspect: {
+                'avg_score': float(mean) if count else 0,
+                'count': int(count)
+            }
+            for aspect, mean, count in zip(aspects, aspect_means, aspect_counts)
+        }
         
-        return {
+        results = {
             'location_info': location_info,
             'summary': enhanced_summary,
-            'analyzed_content': analyzed_content,
+            **columnar.content_fields(table, result_format),
             'aspects': aspect_averages,
             'sources': {
                 'news_count': len(news_articles),
                 'reddit_count': len(reddit_posts)
             }
         }
+        if source_failures:
+            results['degraded'] = True
+            results['source_failures'] = source_failures
+        if time_budget.enabled:
+            results['deadline'] = time_budget.report()
+        
+        return results
     
-def replace_nan_with_null(data):
-    if isinstance(data, dict):
-        return {k: replace_nan_with_null(v) for k, v in data.items()}
-    elif isinstance(data, list):
-        return [replace_nan_with_null(v) for v in data]
-    elif isinstance(data, float) and math.isnan(data):
-        return None
-    return data
-
-def main(query, location=None):
+def load_credentials():
     """
-    Main function to analyze content for a given query and location.
+    Load API credentials from the environment (.env supported).
     """
-    # Initialize with credentials
     load_dotenv(find_dotenv())
 
     reddit_credentials = {
@@ -641,8 +922,127 @@ def main(query, location=None):
         'client_secret': os.getenv('REDDIT_CLIENT_SECRET'), 
         'user_agent': os.getenv('REDDIT_USER_AGENT')
     }
+    # Alternative Reddit endpoints, e.g. local stubs for load testing
+    for setting, variable in (('oauth_url', 'REDDIT_OAUTH_URL'), ('reddit_url', 'REDDIT_URL')):
+        if os.getenv(variable):
+            reddit_credentials[setting] = os.getenv(variable)
     news_api_key = os.getenv('NEWS_API_KEY')
     gemini_api_key = os.getenv('GEMINI_API_KEY')
+    return reddit_credentials, news_api_key, gemini_api_key
+
+def run_job(analyzer, job):
+    """
+    Analyze a single batch job with an already initialized LocationBasedAnalyzer.
+
+    A job is a dict with 'query' and optional 'location', 'aspects', 'priority'
+    (scheduler priority for its API calls, lower is served first), 'budget'
+    (latency budget in seconds), 'format' ('records' or the compact 'columns'),
+    and 'fast' and 'precision' to estimate the aggregates from a sample (plain
+    queries only).
+    """
+    query = job.get('query')
+    if not query:
+        raise ValueError("job is missing 'query'")
+
+    location = job.get('location')
+    aspects = job.get('aspects')
+    budget = deadline.parse_budget(job.get('budget'))
+    result_format = job.get('format', 'records')
+    with analyzer.scheduler.priority(int(job.get('priority', rate_limiter.PRIORITY_NORMAL))):
+        if location:
+            return analyzer.analyze_location_insights(query, location, aspects, budget=budget,
+                                                      result_format=result_format)
+        return analyzer.analyze_query(
+            query,
+            aspects or ["price", "features", "reliability", "support"],
+            fast=bool(job.get('fast', False)),
+            precision=float(job.get('precision', 0.05)),
+            budget=budget,
+            result_format=result_format
+        )
+
+def batch_main(argv):
+    """
+    Run many queries from a JSONL jobs file through one shared set of models.
+    """
+    parser = argparse.ArgumentParser(description="Batch sentiment analysis over a JSONL jobs file.")
+    parser.add_argument('jobs', help="JSONL file of jobs ('-' for stdin)")
+    parser.add_argument('--output', '-o', help="JSONL results file (default: stdout)")
+    parser.add_argument('--concurrency', '-c', type=int, default=4, help="Maximum jobs in flight")
+    parser.add_argument('--prefork', type=int, metavar='N',
+                        help="Fork N worker processes sharing the loaded models instead of using threads")
+    parser.add_argument('--max-jobs-per-worker', type=int, default=100, help="Recycle a forked worker after this many jobs")
+    parser.add_argument('--torch-threads', type=int, help="Torch intra-op threads (per worker with --prefork)")
+    args = parser.parse_args(argv)
+
+    jobs = batch.read_jobs(args.jobs)
+    output = batch.open_output(args.output)
+    reddit_credentials, news_api_key, gemini_api_key = load_credentials()
+
+    # Suppress library noise; results go to the captured output stream
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        # Share the CPUs between the jobs in flight; forked workers re-plan for their own share
+        resources.set_plan(resources.plan_resources(
+            concurrent_jobs=1 if args.prefork else args.concurrency,
+            torch_threads=args.torch_threads
+        ))
+        # LocationBasedAnalyzer serves both plain and location jobs, so models load once
+        analyzer = LocationBasedAnalyzer(reddit_credentials, news_api_key, gemini_api_key)
+        if args.prefork:
+            summary = prefork.run_prefork(
+                jobs,
+                lambda job: run_job(analyzer, job),
+                output,
+                workers=args.prefork,
+                max_jobs_per_worker=args.max_jobs_per_worker,
+                torch_threads=args.torch_threads
+            )
+        else:
+            summary = batch.run_batch(
+                jobs,
+                lambda job: run_job(analyzer, job),
+                output,
+                concurrency=args.concurrency
+            )
+
+    if output is not sys.__stdout__:
+        output.close()
+    batch.print_summary(summary)
+
+def worker_main(argv):
+    """
+    Serve jobs from the durable queue (see job_queue.py) until stopped.
+    """
+    parser = argparse.ArgumentParser(description="Sentiment analysis worker consuming a durable job queue.")
+    job_queue.add_worker_arguments(parser, queue='sentiment')
+    args = parser.parse_args(argv)
+
+    reddit_credentials, news_api_key, gemini_api_key = load_credentials()
+
+    # Suppress library noise; results are written to the queue
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        resources.set_plan(resources.plan_resources(
+            workers=int(os.getenv('SENTIFY_WORKERS', '1')),
+            concurrent_jobs=args.concurrency,
+            torch_threads=args.torch_threads
+        ))
+        analyzer = LocationBasedAnalyzer(reddit_credentials, news_api_key, gemini_api_key)
+        summary = job_queue.worker_from_args(args, lambda job: run_job(analyzer, job))
+
+    batch.print_summary(summary)
+
+def main(query, location=None):
+    """
+    Main function to analyze content for a given query and location.
+    """
+    # Initialize with credentials
+    reddit_credentials, news_api_key, gemini_api_key = load_credentials()
+    # Latency budget in seconds, set per request by the API server
+    budget = deadline.parse_budget(os.getenv('SENTIFY_BUDGET_SECONDS'))
+    # When the API server spawned this process, so start-up counts against the budget
+    started_at = deadline.parse_started_at(os.getenv('SENTIFY_STARTED_AT'))
+    # 'columns' for the compact column-oriented result form
+    result_format = os.getenv('SENTIFY_RESULT_FORMAT', 'records')
 
     results = None
 
@@ -651,21 +1051,28 @@ def main(query, location=None):
         try:
             if location:
                 analyzer = LocationBasedAnalyzer(reddit_credentials, news_api_key, gemini_api_key)
-                results = analyzer.analyze_location_insights(query, location)
+                results = analyzer.analyze_location_insights(query, location, budget=budget,
+                                                             result_format=result_format, started_at=started_at)
             else:
                 analyzer = EnhancedContentAnalyzer(reddit_credentials, news_api_key, gemini_api_key)
                 aspects = ["price", "features", "reliability", "support"]
-                results = analyzer.analyze_query(query, aspects)
+                results = analyzer.analyze_query(query, aspects, budget=budget, result_format=result_format,
+                                                 started_at=started_at)
 
         except Exception as e:
             results = {"error": str(e)}
 
-    results = replace_nan_with_null(results)
-    
     # Print only the JSON output
     print(json.dumps(results, indent=4))
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == '--batch':
+        batch_main(sys.argv[2:])
+        sys.exit(0)
+    if len(sys.argv) > 1 and sys.argv[1] == '--worker':
+        worker_main(sys.argv[2:])
+        sys.exit(0)
+
     query = sys.argv[1] if len(sys.argv) > 1 else "Test"
     location = sys.argv[2] if len(sys.argv) > 2 else None
     main(query, location)
\ No newline at end of file
@@ -0,0 +1,214 @@
+const { spawn } = require('child_process');
+const crypto = require('crypto');
+
+// Lines starting with this prefix on the script's stderr are progress events (see scripts/progress.py)
+const PROGRESS_PREFIX = 'SENTIFY_PROGRESS ';
+// Finished jobs stay fetchable for this long
+const RESULT_TTL_MS = 60 * 60 * 1000;
+// Grace period between SIGTERM and SIGKILL when cancelling
+const KILL_GRACE_MS = 5000;
+
+const jobs = new Map();
+// Coalescing key -> id of the job currently running for it
+const inFlight = new Map();
+
+const toPublicJob = (job) => ({
+    jobId: job.id,
+    status: job.cancelled && job.status === 'running' ? 'cancelling' : job.status,
+    progress: job.progress,
+    requesters: job.subscriptions.size,
+    createdAt: job.createdAt,
+    updatedAt: job.updatedAt,
+    finishedAt: job.finishedAt,
+    ...(job.status === 'completed' && { result: job.result }),
+    ...(job.error && { error: job.error })
+});
+
+const finishJob = (job, status, fields = {}) => {
+    Object.assign(job, fields, { status, finishedAt: new Date().toISOString() });
+    job.updatedAt = job.finishedAt;
+    job.child = null;
+    clearTimeout(job.timer);
+    if (inFlight.get(job.key) === job.id) {
+        inFlight.delete(job.key);
+    }
+    setTimeout(() => jobs.delete(job.id), RESULT_TTL_MS).unref();
+};
+
+const handleStderrLine = (job, line) => {
+    if (!line.startsWith(PROGRESS_PREFIX)) {
+        return;
+    }
+    try {
+        // Each event carries the full progress state: { stage, processed?, total? }
+        job.progress = JSON.parse(line.substring(PROGRESS_PREFIX.length));
+        job.updatedAt = new Date().toISOString();
+    } catch (parseError) {
+        // Ignore malformed progress lines; they never affect the result
+    }
+};
+
+// SIGTERM the script, then SIGKILL it if it is still running after the grace period
+const stopChild = (child) => {
+    child.kill('SIGTERM');
+    setTimeout(() => {
+        if (child.exitCode === null && child.signalCode === null) {
+            child.kill('SIGKILL');
+        }
+    }, KILL_GRACE_MS).unref();
+};
+
+// Each requester of a job gets its own subscription id, the token for withdrawing from it
+const subscribe = (job) => {
+    const subscriptionId = crypto.randomUUID();
+    job.subscriptions.add(subscriptionId);
+    return subscriptionId;
+};
+
+/**
+ * Start a Python analysis as a background job, or join the identical job already running.
+ *
+ * @param {string} key - Coalescing key; concurrent submissions with the same key share one job.
+ * @param {string} scriptPath - Path of the Python script to run.
+ * @param {string[]} args - Script arguments (passed without a shell).
+ * @param {function(string): object} parseOutput - Turns the script's stdout into the result.
+ * @param {object} [env] - Extra environment variables for the script.
+ * @param {number} [timeoutMs] - Stop the script after this long and fail the job (0 = no limit),
+ *     e.g. its latency budget plus a grace period.
+ * @returns {{job: object, coalesced: boolean, subscriptionId: string}} The subscription id is
+ *     needed to cancel; it is only returned to this requester.
+ */
+const submitJob = (key, scriptPath, args, parseOutput, env = {}, timeoutMs = 0) => {
+    const runningId = inFlight.get(key);
+    if (runningId && jobs.has(runningId)) {
+        const running = jobs.get(runningId);
+        const subscriptionId = subscribe(running);
+        return { job: toPublicJob(running), coalesced: true, subscriptionId };
+    }
+
+    const now = new Date().toISOString();
+    const job = {
+        id: crypto.randomUUID(),
+        key,
+        status: 'running',
+        progress: { stage: 'starting' },
+        // Active subscription ids, and the ones already withdrawn
+        subscriptions: new Set(),
+        withdrawn: new Set(),
+        createdAt: now,
+        updatedAt: now,
+        finishedAt: null,
+        result: null,
+        error: null,
+        cancelled: false,
+        timedOut: false,
+        timer: null,
+        child: null
+    };
+    const subscriptionId = subscribe(job);
+    jobs.set(job.id, job);
+    inFlight.set(key, job.id);
+
+    // SENTIFY_STARTED_AT lets the script's budget clock cover its start-up and model loading
+    const child = spawn('python3', [scriptPath, ...args], {
+        env: { ...process.env, ...env, SENTIFY_PROGRESS: '1', SENTIFY_STARTED_AT: String(Date.now() / 1000) }
+    });
+    job.child = child;
+    if (timeoutMs) {
+        job.timer = setTimeout(() => {
+            job.timedOut = true;
+            stopChild(child);
+        }, timeoutMs);
+        job.timer.unref();
+    }
+
+    let stdout = '';
+    let stderrBuffer = '';
+    child.stdout.on('data', (chunk) => {
+        stdout += chunk;
+    });
+    child.stderr.on('data', (chunk) => {
+        stderrBuffer += chunk;
+        const lines = stderrBuffer.split('\n');
+        stderrBuffer = lines.pop();
+        lines.forEach((line) => handleStderrLine(job, line));
+    });
+
+    child.on('error', (error) => {
+        console.error(`Job ${job.id} failed to start: ${error.message}`);
+        finishJob(job, 'failed', { error: 'Failed to start sentiment analysis' });
+    });
+
+    child.on('close', (code, signal) => {
+        if (job.status !== 'running') {
+            return;
+        }
+        if (job.cancelled) {
+            return finishJob(job, 'cancelled');
+        }
+        if (job.timedOut) {
+            console.error(`Job ${job.id} exceeded its latency budget`);
+            return finishJob(job, 'failed', { error: 'Latency budget exceeded' });
+        }
+        if (code !== 0) {
+            console.error(`Job ${job.id} exited with code ${code}${signal ? ` (${signal})` : ''}`);
+            return finishJob(job, 'failed', { error: 'Failed to analyze sentiment' });
+        }
+        try {
+            finishJob(job, 'completed', { result: parseOutput(stdout), progress: { stage: 'done' } });
+        } catch (parseError) {
+            console.error(`Job ${job.id} JSON Parse Error: ${parseError.message}`);
+            finishJob(job, 'failed', { error: 'Invalid response from sentiment analysis script' });
+        }
+    });
+
+    return { job: toPublicJob(job), coalesced: false, subscriptionId };
+};
+
+const getJob = (id) => {
+    const job = jobs.get(id);
+    return job ? toPublicJob(job) : null;
+};
+
+/**
+ * Withdraw one requester from a job; the Python process is stopped once nobody is waiting on it.
+ *
+ * Each subscription id withdraws once, so one client of a coalesced job cannot cancel
+ * it for the others by repeating the request.
+ *
+ * @param {string} id - Job id.
+ * @param {string} subscriptionId - The id returned to this requester by submitJob.
+ * @returns {{job?: object, error?: string}} The job after cancellation, or an error:
+ *     'not_found', 'unknown_subscription' or 'subscription_used'.
+ */
+const cancelJob = (id, subscriptionId) => {
+    const job = jobs.get(id);
+    if (!job) {
+        return { error: 'not_found' };
+    }
+    if (job.withdrawn.has(subscriptionId)) {
+        return { error: 'subscription_used' };
+    }
+    if (!job.subscriptions.has(subscriptionId)) {
+        return { error: 'unknown_subscription' };
+    }
+
+    job.subscriptions.delete(subscriptionId);
+    job.withdrawn.add(subscriptionId);
+    if (job.status !== 'running') {
+        return { job: toPublicJob(job) };
+    }
+    if (job.subscriptions.size === 0) {
+        job.cancelled = true;
+        // Identical requests arriving from now on must start a fresh job
+        inFlight.delete(job.key);
+        stopChild(job.child);
+    }
+    return { job: toPublicJob(job) };
+};
+
+module.exports = {
+    submitJob,
+    getJob,
+    cancelJob
+};